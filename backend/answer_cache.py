@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Hashable, List, Optional
+
+import numpy as np
+
+from metrics import ANSWER_CACHE_LOOKUPS, ANSWER_CACHE_SECONDS_SAVED
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    context: List[str]
+    # Retrieval + completion time it took to produce the answer originally
+    latency: float
+    created_at: float
+    last_used: float
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600.0, max_entries: int = 1000):
+        """
+        In-memory answer cache keyed by query embedding.
+
+        A question whose embedding has cosine similarity >= `threshold` with a
+        cached question returns the cached answer. Entries expire after `ttl`
+        seconds, and the least recently used entry is replaced when full.
+        Query embeddings live in one contiguous float32 matrix so a lookup is
+        a single matrix-vector product.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of cached answers
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._entries: List[Optional[CachedAnswer]] = [None] * max_entries
+
+    def lookup(self, embedding: List[float], version: Optional[Hashable] = None) -> Optional[CachedAnswer]:
+        """
+        Find a cached answer for a query embedding.
+
+        Args:
+            embedding: Query embedding
+            version: Current collection version; a change invalidates the cache
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            entry = None
+            if self._vectors is not None and self._vectors.shape[1] == query.shape[0] and self._valid.any():
+                scores = self._vectors @ query
+                scores[~self._valid] = -np.inf
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.threshold:
+                    candidate = self._entries[slot]
+                    if now - candidate.created_at <= self.ttl:
+                        entry = candidate
+                    else:
+                        self._drop(slot)
+
+            if entry is None:
+                self.misses += 1
+                ANSWER_CACHE_LOOKUPS.inc(result="miss")
+                return None
+
+            entry.last_used = now
+            entry.hits += 1
+            self.hits += 1
+            self.seconds_saved += entry.latency
+        ANSWER_CACHE_LOOKUPS.inc(result="hit")
+        ANSWER_CACHE_SECONDS_SAVED.inc(entry.latency)
+        return entry
+
+    def store(
+        self,
+        embedding: List[float],
+        answer: str,
+        context: List[str],
+        latency: float,
+        version: Optional[Hashable] = None,
+    ):
+        """
+        Cache an answer for a query embedding.
+
+        Answers computed against an older collection version are dropped.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if version != self.version:
+                return
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries = [None] * self.max_entries
+            slot = self._free_slot(now)
+            self._vectors[slot] = query
+            self._valid[slot] = True
+            self._entries[slot] = CachedAnswer(answer, list(context), latency, now, now)
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the collection changed."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": int(self._valid.sum()),
+                "seconds_saved": round(self.seconds_saved, 3),
+            }
+
+    def _check_version(self, version: Optional[Hashable]):
+        if version != self.version:
+            if self._valid.any():
+                logger.info("Collection changed, invalidating answer cache")
+            self._clear()
+            self.version = version
+
+    def _clear(self):
+        self._valid[:] = False
+        self._entries = [None] * self.max_entries
+
+    def _drop(self, slot: int):
+        self._valid[slot] = False
+        self._entries[slot] = None
+
+    def _free_slot(self, now: float) -> int:
+        """An empty or expired slot, else the least recently used one."""
+        free = np.flatnonzero(~self._valid)
+        if free.size:
+            return int(free[0])
+        oldest_slot, oldest_used = 0, float("inf")
+        for slot, entry in enumerate(self._entries):
+            if now - entry.created_at > self.ttl:
+                return slot
+            if entry.last_used < oldest_used:
+                oldest_slot, oldest_used = slot, entry.last_used
+        return oldest_slot
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import UploadedFile
+
+
+@admin.register(UploadedFile)
+class UploadedFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'size', 'chunk_count', 'uploaded_at', 'ingested_at')
+    list_filter = ('status',)
+    search_fields = ('name', 'sha256')
@@ -1,6 +1,49 @@
+import logging
+import os
+import threading
+from typing import Optional
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
+
+def process_uptime() -> Optional[float]:
+    """Seconds since this process started, from /proc on Linux; None elsewhere."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesized command name; starttime is field 22 of the line
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from metrics import STAGE_DURATION
+
+        uptime = process_uptime()
+        if uptime is not None:
+            STAGE_DURATION.observe(uptime, stage="process_startup")
+            logger.info(f"API app ready {uptime:.3f}s after process start")
+
+        # Servers can start warming up the document managers right away without
+        # delaying boot; off by default so management commands stay offline
+        if os.getenv("API_WARMUP", "").strip().lower() in ("1", "true", "yes", "on"):
+            threading.Thread(target=self._warmup, name="api-warmup", daemon=True).start()
+
+    @staticmethod
+    def _warmup():
+        from .managers import warmup
+
+        try:
+            warmup()
+        except Exception as e:
+            # Requests retry the setup on first use
+            logger.error(f"Warmup failed: {str(e)}")
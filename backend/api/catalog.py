@@ -0,0 +1,177 @@
+import logging
+import os
+from datetime import datetime, timezone as dt_timezone
+from typing import Collection, Dict, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from ingest_manifest import IngestManifest, resolve_source
+
+from .models import UploadedFile
+
+logger = logging.getLogger(__name__)
+
+# Uploads with these extensions are ingested; others are only stored
+INGESTED_EXTENSIONS = ('.txt', '.pdf')
+
+# Rows per statement for bulk writes, well under SQLite's variable limit
+BULK_BATCH_SIZE = 500
+
+_SYNCED_FIELDS = ['size', 'sha256', 'status', 'chunk_count', 'error', 'ingested_at', 'job_id']
+
+# Statuses of files waiting on an ingest job
+_PENDING_STATUSES = (UploadedFile.QUEUED, UploadedFile.INGESTING)
+
+
+def record_upload(name: str, size: int, sha256: str):
+    """Add or replace the entry for a file just written to the upload directory."""
+    UploadedFile.objects.update_or_create(name=name, defaults={
+        'size': size,
+        'sha256': sha256,
+        'status': UploadedFile.QUEUED if name.endswith(INGESTED_EXTENSIONS) else UploadedFile.UPLOADED,
+        'chunk_count': None,
+        'error': '',
+        'uploaded_at': timezone.now(),
+        'ingested_at': None,
+        'job_id': '',
+    })
+
+
+def set_job(name: str, job_id: str):
+    """Link a queued file to the ingest job that will ingest it."""
+    UploadedFile.objects.filter(name=name).update(job_id=job_id)
+
+
+def release_job(job_id: str) -> int:
+    """Return the files still queued for a job that will never run, e.g. one cancelled before it started."""
+    return UploadedFile.objects.filter(job_id=job_id, status__in=_PENDING_STATUSES).update(
+        status=UploadedFile.UPLOADED, job_id='', updated_at=timezone.now()
+    )
+
+
+def set_status(name: str, status: str, error: str = ''):
+    UploadedFile.objects.filter(name=name).update(status=status, error=error, updated_at=timezone.now())
+
+
+def record_ingest(name: str, manifest: IngestManifest, source: str, error: str):
+    """
+    Record the outcome of ingesting one file.
+
+    Args:
+        name: File name in the upload directory
+        manifest: The ingest manifest, which records the file if it was ingested
+        source: The file's manifest key
+        error: Message stored if the manifest doesn't record the file
+    """
+    entry = manifest.files.get(source)
+    if entry is None:
+        set_status(name, UploadedFile.FAILED, error)
+        return
+    UploadedFile.objects.filter(name=name).update(
+        sha256=entry['sha256'],
+        status=UploadedFile.INGESTED,
+        chunk_count=len(entry['chunk_ids']),
+        error='',
+        ingested_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def sync(
+    upload_dir: str,
+    manifest: IngestManifest,
+    unrecorded_status: Optional[str] = None,
+    errors: Optional[Dict[str, str]] = None,
+    live_jobs: Collection[str] = (),
+) -> dict:
+    """
+    Bring the catalog in line with the upload directory and the ingest manifest.
+
+    Files the catalog doesn't know are added, entries of files that are gone
+    are removed, and files the manifest records are marked ingested with
+    their chunk counts. Unchanged entries are not written.
+
+    Args:
+        upload_dir: Directory uploads are saved to
+        manifest: The ingest manifest of the collection files are ingested into
+        unrecorded_status: Status for .txt/.pdf files the manifest doesn't record,
+            e.g. FAILED after an ingest run; None keeps their current status
+        errors: Errors of files the run failed to ingest, keyed by manifest key
+        live_jobs: IDs of ingest jobs still queued or running. Queued files keep
+            their status only while their job is one of these; the others get
+            unrecorded_status, or uploaded without one.
+
+    Returns:
+        Number of entries created, updated and deleted
+    """
+    now = timezone.now()
+    on_disk = {}
+    if os.path.isdir(upload_dir):
+        with os.scandir(upload_dir) as entries:
+            for entry in entries:
+                # Skip .DS_Store files and uploads still being written
+                if not entry.name.startswith('.') and entry.is_file():
+                    on_disk[entry.name] = entry
+
+    with transaction.atomic():
+        rows = {row.name: row for row in UploadedFile.objects.all()}
+        created = []
+        updated = []
+        for name, entry in on_disk.items():
+            stat = entry.stat()
+            row = rows.get(name)
+            if row is None:
+                row = UploadedFile(
+                    name=name,
+                    status=UploadedFile.UPLOADED,
+                    uploaded_at=datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc),
+                )
+            before = [getattr(row, field) for field in _SYNCED_FIELDS]
+
+            row.size = stat.st_size
+            source = resolve_source(entry.path)
+            recorded = manifest.files.get(source)
+            if row.status in _PENDING_STATUSES and row.job_id in live_jobs:
+                # Its job records how it went, e.g. a new version of an ingested file
+                pass
+            elif recorded is not None:
+                if row.status != UploadedFile.INGESTED or row.sha256 != recorded['sha256']:
+                    row.ingested_at = now
+                row.sha256 = recorded['sha256']
+                row.status = UploadedFile.INGESTED
+                row.chunk_count = len(recorded['chunk_ids'])
+                row.error = ''
+                row.job_id = ''
+            elif not name.endswith(INGESTED_EXTENSIONS):
+                row.status = UploadedFile.UPLOADED
+            else:
+                row.chunk_count = None
+                row.ingested_at = None
+                if unrecorded_status is not None or row.status in _PENDING_STATUSES:
+                    # Pending files get here when their job was cancelled or lost in a restart
+                    row.status = unrecorded_status or UploadedFile.UPLOADED
+                    row.job_id = ''
+                    if row.status == UploadedFile.FAILED:
+                        row.error = (errors or {}).get(source, 'Not ingested, see server logs')
+                    else:
+                        row.error = ''
+                elif row.status == UploadedFile.INGESTED:
+                    # Its chunks were removed from the collection, e.g. by a clear
+                    row.status = UploadedFile.UPLOADED
+
+            if row.pk is None:
+                created.append(row)
+            elif [getattr(row, field) for field in _SYNCED_FIELDS] != before:
+                row.updated_at = now
+                updated.append(row)
+
+        removed = [name for name in rows if name not in on_disk]
+        UploadedFile.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+        UploadedFile.objects.bulk_update(updated, _SYNCED_FIELDS + ['updated_at'], batch_size=BULK_BATCH_SIZE)
+        for start in range(0, len(removed), BULK_BATCH_SIZE):
+            UploadedFile.objects.filter(name__in=removed[start:start + BULK_BATCH_SIZE]).delete()
+
+    counts = {'created': len(created), 'updated': len(updated), 'deleted': len(removed)}
+    logger.info(f"Synced file catalog with {upload_dir}: {counts}")
+    return counts
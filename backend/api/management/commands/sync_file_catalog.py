@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog import sync
+from api.models import UploadedFile
+from api.views import UPLOAD_DIR
+from ingest_manifest import IngestManifest
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the file catalog served by /api/list-files/ from the upload directory and the ingest "
+        "manifest. Run once after migrating an existing upload directory, or after files were added "
+        "or removed outside the API. Files still queued from a job that no longer runs (e.g. before a "
+        "restart) go back to uploaded, or failed with --mark-failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+        parser.add_argument("--collection", default="documents",
+                            help="Collection whose ingest manifest says which files are ingested")
+        parser.add_argument("--mark-failed", action="store_true",
+                            help="Mark .txt/.pdf files the manifest doesn't record as failed rather than uploaded")
+
+    def handle(self, *args, **options):
+        # Imported here to keep the document manager's dependencies out of other commands
+        from document_manager import manifest_path
+
+        manifest = IngestManifest(manifest_path(options["collection"]))
+        try:
+            counts = sync(
+                options["upload_dir"], manifest, UploadedFile.FAILED if options["mark_failed"] else None
+            )
+        except Exception as e:
+            raise CommandError(f"Catalog sync failed: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['created']} added, {counts['updated']} updated, {counts['deleted']} removed; "
+            f"{UploadedFile.objects.count()} files in the catalog"
+        ))
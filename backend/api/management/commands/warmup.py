@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.managers import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Import the document managers, create their clients, set up the collection and load the tokenizer, "
+        "reporting the time each step takes. Run before routing traffic to check Qdrant and the "
+        "collection, or set API_WARMUP=1 to warm up each server process in the background."
+    )
+
+    def handle(self, *args, **options):
+        try:
+            timings = warmup()
+        except Exception as e:
+            raise CommandError(f"Warmup failed: {e}")
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name:<18} {seconds * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"{'total':<18} {sum(timings.values()) * 1000:9.1f} ms"))
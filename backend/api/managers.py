@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# The document managers pull in langchain, openai and qdrant_client and open
+# clients, so they are imported and built on first use rather than when
+# Django loads the URLconf; `manage.py check`, migrations and worker boot
+# never pay for them, and a Qdrant outage can't stop the process starting.
+_document_manager = None
+_document_manager_lock = threading.Lock()
+
+# Async clients are bound to the event loop they were first used on, so keep
+# one AsyncDocumentManager per loop (a single one under an ASGI server)
+_async_document_managers = weakref.WeakKeyDictionary()
+
+
+def _document_manager_instance():
+    """The shared DocumentManager, created (but not set up) on first use."""
+    global _document_manager
+    if _document_manager is None:
+        with _document_manager_lock:
+            if _document_manager is None:
+                from document_manager import DocumentManager
+                _document_manager = DocumentManager(setup_collection=False)
+    return _document_manager
+
+
+def get_document_manager():
+    """The shared DocumentManager, with its collection set up."""
+    manager = _document_manager_instance()
+    manager.setup()
+    return manager
+
+
+def get_async_document_manager():
+    loop = asyncio.get_running_loop()
+    manager = _async_document_managers.get(loop)
+    if manager is None:
+        from async_document_manager import AsyncDocumentManager
+        manager = AsyncDocumentManager()
+        _async_document_managers[loop] = manager
+    return manager
+
+
+def warmup() -> dict:
+    """
+    Do the work deferred from startup: imports, client creation, collection
+    setup and loading the chat model's tokenizer.
+
+    Returns:
+        Seconds spent per step
+    """
+    from context_builder import token_counter
+    from metrics import STAGE_DURATION
+
+    timings = {}
+
+    def step(name, function):
+        start = time.perf_counter()
+        result = function()
+        timings[name] = time.perf_counter() - start
+        STAGE_DURATION.observe(timings[name], stage=f"warmup_{name}")
+        return result
+
+    def import_managers():
+        import async_document_manager  # noqa: F401
+        import document_manager
+        return document_manager
+
+    module = step("import", import_managers)
+    manager = step("init", _document_manager_instance)
+    step("collection_setup", manager.setup)
+    step("tokenizer", lambda: token_counter(module.CHAT_MODEL))
+    logger.info("Warmup done: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+    return timings
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-17 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='job_id',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,3 +1,43 @@
 from django.db import models
 
-# Create your models here.
+
+class UploadedFile(models.Model):
+    """
+    Catalog entry for a file in the upload directory.
+
+    Kept up to date by the upload, ingest, delete and clear endpoints, so
+    listing files never touches the filesystem.
+    """
+    # Saved, but neither ingested nor queued for ingestion
+    UPLOADED = 'uploaded'
+    QUEUED = 'queued'
+    INGESTING = 'ingesting'
+    INGESTED = 'ingested'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (UPLOADED, 'Uploaded'),
+        (QUEUED, 'Queued'),
+        (INGESTING, 'Ingesting'),
+        (INGESTED, 'Ingested'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(db_index=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=UPLOADED, db_index=True)
+    # Chunks in the vector store; null until the file is ingested
+    chunk_count = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Ingest job of a queued or ingesting file; a row whose job is gone (cancelled, or lost
+    # in a restart) is no longer pending
+    job_id = models.CharField(max_length=32, blank=True)
+    uploaded_at = models.DateTimeField(db_index=True)
+    ingested_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-uploaded_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
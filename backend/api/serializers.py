@@ -0,0 +1,9 @@
+from rest_framework import serializers
+
+from .models import UploadedFile
+
+
+class UploadedFileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadedFile
+        fields = ['name', 'size', 'sha256', 'status', 'chunk_count', 'error', 'uploaded_at', 'ingested_at']
@@ -1,3 +1,912 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from openai import RateLimitError
+
+import context_builder
+import document_manager
+import embedding_engine
+from document_manager import rank_chunks
+from chunk_store import ChunkStore
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine
+from context_builder import ContextBuilder, ContextChunk, merge_overlap, mmr_order
+from ingest_manifest import IngestManifest, resolve_source
+from ingest_jobs import CANCELLED, FAILED, FINISHED_STATUSES, IngestJobRunner
+from ingest_pipeline import IngestProgress
+from metrics import Counter, Histogram, Registry
+from search_filter import SearchFilter
+from sparse_index import SparseHit, SparseIndex, build_match_query, reciprocal_rank_fusion
+from vector_store import AsyncNumpyVectorStore, NumpyVectorStore, SearchHit
+
+from . import catalog, views
+from .models import UploadedFile
+
+EMBEDDING_DIMS = 8
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+
+class ChunkStoreTests(TempDirMixin, SimpleTestCase):
+    def test_second_instance_sees_compaction(self):
+        # Two instances on one directory stand in for two processes
+        writer = ChunkStore(self.tmp, codec="zlib")
+        reader = ChunkStore(self.tmp, codec="zlib")
+        self.addCleanup(writer.close)
+        self.addCleanup(reader.close)
+        ids = [str(i) for i in range(10)]
+        writer.put(ids, [f"text {i} " * 20 for i in range(10)])
+        self.assertEqual(reader.get_many(ids)["3"], "text 3 " * 20)
+
+        writer.delete(ids[:8])
+        self.assertTrue(writer.compact(min_dead_ratio=0))
+        writer.put(["new"], ["brand new text"])
+
+        self.assertEqual(reader.get_many(["8", "9", "new"]), {
+            "8": "text 8 " * 20,
+            "9": "text 9 " * 20,
+            "new": "brand new text",
+        })
+        self.assertEqual(reader.get_many(["0"]), {})
+
+    def test_put_after_compaction_by_another_instance(self):
+        first = ChunkStore(self.tmp, codec="zlib")
+        second = ChunkStore(self.tmp, codec="zlib")
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        first.put(["a", "b"], ["alpha", "beta"])
+        second.get_many(["a"])
+        first.delete(["a"])
+        first.compact(min_dead_ratio=0)
+
+        second.put(["c"], ["gamma"])
+        self.assertEqual(first.get_many(["b", "c"]), {"b": "beta", "c": "gamma"})
+
+    def test_put_waits_for_another_instances_compaction(self):
+        first = ChunkStore(self.tmp, codec="zlib")
+        second = ChunkStore(self.tmp, codec="zlib")
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        first.put(["a", "b"], ["alpha", "beta"])
+        first.delete(["a"])
+
+        # Stands in for a compaction in another process: the lock file is shared, the thread lock isn't
+        locked, release = threading.Event(), threading.Event()
+
+        def compact():
+            with first._writing():
+                locked.set()
+                release.wait(10)
+                first.compact(min_dead_ratio=0)
+
+        compaction = threading.Thread(target=compact)
+        compaction.start()
+        self.assertTrue(locked.wait(10))
+        put = threading.Thread(target=second.put, args=(["c"], ["gamma"]))
+        put.start()
+        put.join(0.2)
+        self.assertTrue(put.is_alive())
+        release.set()
+        compaction.join(10)
+        put.join(10)
+
+        self.assertEqual(first.get_many(["b", "c"]), {"b": "beta", "c": "gamma"})
+        self.assertEqual(second.get_many(["b", "c"]), {"b": "beta", "c": "gamma"})
+
+
+class PrometheusRenderingTests(SimpleTestCase):
+    def test_histogram_buckets_sum_and_count(self):
+        histogram = Histogram("t_duration_seconds", "Time taken.", ["stage"], buckets=(1.0, 0.1))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value, stage="parse")
+        histogram.observe(0.2, stage="embed")
+        self.assertEqual(histogram.render(), [
+            "# HELP t_duration_seconds Time taken.",
+            "# TYPE t_duration_seconds histogram",
+            't_duration_seconds_bucket{stage="embed",le="0.1"} 0',
+            't_duration_seconds_bucket{stage="embed",le="1.0"} 1',
+            't_duration_seconds_bucket{stage="embed",le="+Inf"} 1',
+            't_duration_seconds_sum{stage="embed"} 0.2',
+            't_duration_seconds_count{stage="embed"} 1',
+            # Buckets are cumulative and include their upper bound
+            't_duration_seconds_bucket{stage="parse",le="0.1"} 2',
+            't_duration_seconds_bucket{stage="parse",le="1.0"} 3',
+            't_duration_seconds_bucket{stage="parse",le="+Inf"} 4',
+            't_duration_seconds_sum{stage="parse"} 5.65',
+            't_duration_seconds_count{stage="parse"} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        counter = registry.register(Counter("t_total", "Things.", ["name"]))
+        unlabelled = registry.register(Histogram("t_size", "Sizes.", buckets=(10,)))
+        counter.inc(2, name='say "hi"\\now\nplease')
+        unlabelled.observe(3)
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP t_total Things.",
+            "# TYPE t_total counter",
+            't_total{name="say \\"hi\\"\\\\now\\nplease"} 2',
+            "# HELP t_size Sizes.",
+            "# TYPE t_size histogram",
+            't_size_bucket{le="10"} 1',
+            't_size_bucket{le="+Inf"} 1',
+            "t_size_sum 3.0",
+            "t_size_count 1",
+        ]) + "\n")
+
+
+class FakeEmbeddingsClient:
+    """
+    Stands in for OpenAI().embeddings: rate-limits the first request for one
+    batch, returns each batch's items in reverse, and holds the first batch
+    back until the last one is answered so batches complete out of order.
+    """
+
+    def __init__(self, rate_limited_batch, last_batch, retry_after="2"):
+        self.embeddings = self
+        self.rate_limited_batch = rate_limited_batch
+        self.last_batch = last_batch
+        self.retry_after = retry_after
+        self.last_done = threading.Event()
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def create(self, model, input):
+        with self._lock:
+            self.requests.append(list(input))
+            rate_limited = input[0] == self.rate_limited_batch and self.requests.count(list(input)) == 1
+        if rate_limited:
+            request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+            raise RateLimitError(
+                "Rate limit reached",
+                response=httpx.Response(429, headers={"retry-after": self.retry_after}, request=request),
+                body=None,
+            )
+        if input[0] == self.last_batch:
+            self.last_done.set()
+        else:
+            self.last_done.wait(5)
+        data = [mock.Mock(index=i, embedding=[float(text[1:])]) for i, text in enumerate(input)]
+        return mock.Mock(data=data[::-1], usage=None)
+
+
+class EmbeddingEngineTests(SimpleTestCase):
+    def test_keeps_input_order_through_retries_and_out_of_order_batches(self):
+        texts = [f"t{i}" for i in range(10)]
+        client = FakeEmbeddingsClient(rate_limited_batch="t4", last_batch="t8")
+        engine = EmbeddingEngine(client, batch_size=4, max_workers=3)
+        with mock.patch.object(embedding_engine.time, "sleep") as sleep:
+            embeddings = engine.embed(texts)
+
+        self.assertEqual(embeddings, [[float(i)] for i in range(10)])
+        # The rate-limited batch was sent again after the server's Retry-After
+        self.assertEqual(len(client.requests), 4)
+        self.assertEqual(client.requests.count(["t4", "t5", "t6", "t7"]), 2)
+        sleep.assert_called_once_with(2.0)
+
+    def test_retry_after_is_capped_and_retries_run_out(self):
+        client = FakeEmbeddingsClient(rate_limited_batch="t0", last_batch="t0", retry_after="120")
+        engine = EmbeddingEngine(client, max_backoff=30.0)
+        with mock.patch.object(embedding_engine.time, "sleep") as sleep:
+            self.assertEqual(engine.embed(["t0", "t1"]), [[0.0], [1.0]])
+        sleep.assert_called_once_with(30.0)
+
+        engine = EmbeddingEngine(FakeEmbeddingsClient(rate_limited_batch="t0", last_batch="t0"), max_retries=0)
+        with self.assertRaises(RateLimitError):
+            engine.embed(["t0"])
+
+
+class EmbeddingCacheTests(TempDirMixin, SimpleTestCase):
+    def open_cache(self, **kwargs):
+        cache = EmbeddingCache(os.path.join(self.tmp, "cache.sqlite3"), **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_counts_hits_and_misses(self):
+        cache = self.open_cache()
+        cache.put_many("model@8", {"a": [0.5, 1.0], "b": [2.0, -1.0]})
+        self.assertEqual(cache.get_many("model@8", ["a", "b", "c"]), {"a": [0.5, 1.0], "b": [2.0, -1.0]})
+        self.assertIsNone(cache.get("model@8", "c"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (2, 2, 2))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_keys_are_isolated_by_model_and_dimensions(self):
+        cache = self.open_cache()
+        cache.put_many("text-embedding-3-small@256", {"a": [1.0]})
+        cache.put_many("text-embedding-3-small@1536", {"a": [2.0]})
+        self.assertEqual(cache.get("text-embedding-3-small@256", "a"), [1.0])
+        self.assertEqual(cache.get("text-embedding-3-small@1536", "a"), [2.0])
+        self.assertIsNone(cache.get("text-embedding-3-large@256", "a"))
+
+    def test_evicts_least_recently_used_past_max_entries(self):
+        cache = self.open_cache(max_entries=10)
+        texts = [f"t{i}" for i in range(11)]
+        # A clock that ticks on every read keeps the access order unambiguous
+        with mock.patch("embedding_cache.time.time", side_effect=itertools.count()):
+            for text in texts[:10]:
+                cache.put_many("model@8", {text: [1.0]})
+            cache.get("model@8", "t0")
+            self.assertEqual(cache.stats()["entries"], 10)
+            cache.put_many("model@8", {"t10": [1.0]})
+
+        # Evicted down to 90% of max_entries: the two least recently used go
+        self.assertEqual(sorted(cache.get_many("model@8", texts)), sorted(set(texts) - {"t1", "t2"}))
+        self.assertEqual(cache.stats()["entries"], 9)
+
+        # A reopened cache starts from the stored count
+        cache.close()
+        reopened = self.open_cache(max_entries=10)
+        reopened.put_many("model@8", {"t11": [1.0], "t12": [1.0]})
+        self.assertEqual(reopened.stats()["entries"], 9)
+
+
+class FakeEmbeddingEngine:
+    """Deterministic embeddings; raises for texts containing one of `fail_on`, or after `fail_after` calls."""
+
+    def __init__(self, fail_on=(), fail_after=None):
+        self.fail_on = tuple(fail_on)
+        self.fail_after = fail_after
+        self.calls = 0
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("embeddings API unavailable")
+        if any(marker in text for text in texts for marker in self.fail_on):
+            raise RuntimeError("embedding rejected")
+        self.embedded += len(texts)
+        return [self.embed_one(text) for text in texts]
+
+    def embed_one(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).normal(size=EMBEDDING_DIMS).tolist()
+
+
+def write_corpus(upload_dir, count=3, paragraphs=30):
+    os.makedirs(upload_dir, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(upload_dir, f"doc{i}.txt"), "w") as f:
+            f.write("\n\n".join(
+                f"Document {i} paragraph {p}. " + f"marker{i} lorem ipsum dolor sit amet {p} " * 12
+                for p in range(paragraphs)
+            ))
+
+
+class IngestTestCase(TempDirMixin, SimpleTestCase):
+    """Ingests a small corpus into a NumPy store with a stub embedder."""
+
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = os.path.join(self.tmp, "uploads")
+        write_corpus(self.upload_dir)
+        self.vector_store = NumpyVectorStore(os.path.join(self.tmp, "vectors"), EMBEDDING_DIMS)
+        for patcher in (
+            mock.patch.dict(os.environ, {"OPENAI_API_KEY": "test"}),
+            mock.patch.object(document_manager, "MANIFEST_DIR", self.tmp),
+            mock.patch.object(document_manager, "INGEST_RETRY_DELAY", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_manager(self, engine, **kwargs):
+        manager = document_manager.DocumentManager(
+            embedding_cache_path=None,
+            ingest_batch_size=4,
+            parse_workers=0,
+            vector_store=self.vector_store,
+            sparse_index_dir=None,
+            payload_mode="full",
+            **kwargs,
+        )
+        manager.embedding_engine = engine
+        return manager
+
+    def manifest_chunks(self, manager):
+        return sum(len(entry["chunk_ids"]) for entry in manager.manifest.files.values())
+
+    def file_chunks(self, manager):
+        return {os.path.basename(source): set(entry["chunk_ids"]) for source, entry in manager.manifest.files.items()}
+
+
+class IncrementalIngestTests(IngestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.make_manager(FakeEmbeddingEngine())
+        self.assertTrue(self.first.ingest_documents(self.upload_dir))
+        self.before = self.file_chunks(self.first)
+
+    def stored(self, ids):
+        return {str(point.id) for point in self.vector_store.retrieve(list(ids))}
+
+    def test_unchanged_files_embed_nothing(self):
+        engine = FakeEmbeddingEngine()
+        manager = self.make_manager(engine)
+        self.assertTrue(manager.ingest_documents(self.upload_dir))
+        self.assertEqual(engine.embedded, 0)
+        self.assertEqual(self.file_chunks(manager), self.before)
+        self.assertEqual(self.vector_store.count(), self.manifest_chunks(manager))
+
+    def test_modified_file_replaces_only_its_own_points(self):
+        with open(os.path.join(self.upload_dir, "doc1.txt"), "a") as f:
+            f.write("\n\nA paragraph added later, about something else entirely.")
+        engine = FakeEmbeddingEngine()
+        manager = self.make_manager(engine)
+        self.assertTrue(manager.ingest_documents(self.upload_dir))
+
+        after = self.file_chunks(manager)
+        self.assertEqual(after["doc0.txt"], self.before["doc0.txt"])
+        self.assertEqual(after["doc2.txt"], self.before["doc2.txt"])
+        added = after["doc1.txt"] - self.before["doc1.txt"]
+        replaced = self.before["doc1.txt"] - after["doc1.txt"]
+        self.assertTrue(added)
+        # Chunks the edit didn't touch keep their points and aren't embedded again
+        self.assertEqual(engine.embedded, len(added))
+        self.assertEqual(self.stored(replaced), set())
+        self.assertEqual(self.stored(after["doc1.txt"]), after["doc1.txt"])
+        self.assertEqual(self.vector_store.count(), self.manifest_chunks(manager))
+
+    def test_removed_file_points_are_deleted(self):
+        os.remove(os.path.join(self.upload_dir, "doc2.txt"))
+        engine = FakeEmbeddingEngine()
+        manager = self.make_manager(engine)
+        self.assertTrue(manager.ingest_documents(self.upload_dir))
+
+        self.assertEqual(sorted(self.file_chunks(manager)), ["doc0.txt", "doc1.txt"])
+        self.assertEqual(engine.embedded, 0)
+        self.assertEqual(self.stored(self.before["doc2.txt"]), set())
+        self.assertEqual(self.vector_store.count(), self.manifest_chunks(manager))
+
+
+class IngestCheckpointTests(IngestTestCase):
+    def test_resumes_from_last_upserted_batch(self):
+        first = self.make_manager(FakeEmbeddingEngine(fail_after=3), file_retries=0)
+        self.assertFalse(first.ingest_documents(self.upload_dir))
+        checkpointed = sum(len(first.checkpoint.chunk_ids(source)) for source in first.checkpoint.sources())
+        done_before = self.manifest_chunks(first)
+        self.assertEqual(done_before + checkpointed, 3 * 4)
+        self.assertGreater(checkpointed, 0)
+
+        # A new manager stands in for the next run, reading the checkpoint from disk
+        engine = FakeEmbeddingEngine()
+        second = self.make_manager(engine)
+        self.assertTrue(second.ingest_documents(self.upload_dir))
+        total = self.manifest_chunks(second)
+        self.assertEqual(len(second.manifest.files), 3)
+        self.assertEqual(engine.embedded, total - done_before - checkpointed)
+        self.assertEqual(self.vector_store.count(), total)
+        self.assertEqual(second.checkpoint.sources(), [])
+        self.assertFalse(os.path.exists(second.checkpoint.path))
+
+    def test_gives_up_on_failing_file_and_reports_it(self):
+        engine = FakeEmbeddingEngine(fail_on=["marker1 "])
+        manager = self.make_manager(engine, file_retries=2)
+        progress = IngestProgress()
+        self.assertFalse(manager.ingest_documents(self.upload_dir, progress=progress))
+
+        failed = os.path.join(os.path.realpath(self.upload_dir), "doc1.txt")
+        self.assertEqual(list(progress.failed_files), [failed])
+        self.assertEqual(progress.files_failed, 1)
+        self.assertEqual(progress.to_dict()["failed_files"], [{"file": "doc1.txt", "error": "embedding rejected"}])
+        self.assertEqual(sorted(os.path.basename(source) for source in manager.manifest.files), ["doc0.txt", "doc2.txt"])
+        # Only chunks that were upserted are counted
+        self.assertEqual(progress.points_upserted, self.manifest_chunks(manager))
+        self.assertEqual(self.vector_store.count(), self.manifest_chunks(manager))
+
+    def test_manifest_version_only_changes_with_the_collection(self):
+        manager = self.make_manager(FakeEmbeddingEngine())
+        self.assertTrue(manager.ingest_documents(self.upload_dir))
+        path = manager.manifest.path
+        version = document_manager.collection_version(manager.collection_name)
+        self.assertGreater(version, 0)
+        self.assertEqual(version, manager.manifest.version)
+
+        # Nothing to ingest, so nothing is written
+        mtime = os.stat(path).st_mtime_ns
+        self.assertTrue(self.make_manager(FakeEmbeddingEngine()).ingest_documents(self.upload_dir))
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+        self.assertEqual(document_manager.collection_version(manager.collection_name), version)
+
+        with open(os.path.join(self.upload_dir, "doc0.txt"), "a") as f:
+            f.write("\n\nA new paragraph.")
+        os.remove(os.path.join(self.upload_dir, "doc1.txt"))
+        self.assertTrue(manager.ingest_documents(self.upload_dir))
+        self.assertGreater(document_manager.collection_version(manager.collection_name), version)
+
+    def test_job_fails_with_the_files_that_were_given_up_on(self):
+        def target(progress):
+            progress.file_failed("/uploads/doc1.txt", "embedding rejected")
+            return False
+
+        runner = IngestJobRunner()
+        job = runner.submit(target)
+        for _ in range(200):
+            if job.status in FINISHED_STATUSES:
+                break
+            time.sleep(0.01)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, "1 files could not be ingested: doc1.txt")
+
+
+def random_unit_vectors(count, dims, seed):
+    vectors = np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class NumpyVectorStoreTests(TempDirMixin, SimpleTestCase):
+    def open_store(self, dtype="float32"):
+        store = NumpyVectorStore(os.path.join(self.tmp, "store"), 16, initial_capacity=8, dtype=dtype)
+        store.ensure_collection()
+        self.addCleanup(store.close)
+        return store
+
+    def fill(self, store, count=200):
+        vectors = random_unit_vectors(count, 16, seed=1)
+        payloads = [
+            {"text": f"chunk {i}", "metadata": {"source": f"/docs/file{i % 4}.pdf", "page": i % 10}}
+            for i in range(count)
+        ]
+        store.upsert([f"id{i}" for i in range(count)], vectors, payloads)
+        return vectors
+
+    def test_search_matches_brute_force(self):
+        store = self.open_store()
+        vectors = self.fill(store)
+        for query in random_unit_vectors(5, 16, seed=2):
+            expected = np.argsort(-(vectors @ query))[:10]
+            hits = store.search(query, 10)
+            self.assertEqual([hit.id for hit in hits], [f"id{i}" for i in expected])
+            np.testing.assert_allclose([hit.score for hit in hits], (vectors @ query)[expected], rtol=1e-5)
+
+    def test_async_facade_runs_off_the_event_loop(self):
+        store = self.open_store()
+        vectors = self.fill(store)
+        facade = AsyncNumpyVectorStore(store)
+        loop_thread = []
+
+        def search(*args):
+            loop_thread.append(threading.current_thread())
+            return NumpyVectorStore.search(store, *args)
+
+        async def run():
+            loop_thread.append(threading.current_thread())
+            with mock.patch.object(store, "search", side_effect=search):
+                return await facade.search(vectors[7], 1)
+
+        hits = asyncio.run(run())
+        self.assertEqual(hits[0].id, "id7")
+        self.assertIsNot(loop_thread[0], loop_thread[1])
+
+    def test_quantized_scores_stay_close(self):
+        for dtype, tolerance in (("float16", 1e-3), ("uint8", 0.05)):
+            with self.subTest(dtype=dtype):
+                store = self.open_store(dtype)
+                vectors = self.fill(store)
+                query = random_unit_vectors(1, 16, seed=3)[0]
+                hits = store.search(query, 10)
+                exact = {f"id{i}": score for i, score in enumerate(vectors @ query)}
+                for hit in hits:
+                    self.assertAlmostEqual(hit.score, exact[hit.id], delta=tolerance)
+                self.assertEqual(hits[0].id, f"id{int(np.argmax(vectors @ query))}")
+                store.drop()
+
+    def test_deleted_slot_is_reused(self):
+        store = self.open_store()
+        vectors = self.fill(store, count=3)
+        store.delete(["id1"])
+        self.assertEqual(store.count(), 2)
+        self.assertEqual(store.retrieve(["id1"]), [])
+        self.assertNotIn("id1", [hit.id for hit in store.search(vectors[1], 3)])
+
+        store.upsert(["new"], [vectors[1]], [{"text": "new", "metadata": {"source": "/docs/new.txt"}}])
+        self.assertEqual(store.count(), 3)
+        self.assertEqual(store._size, 3)
+        top = store.search(vectors[1], 1)[0]
+        self.assertEqual((top.id, top.payload["text"]), ("new", "new"))
+
+    def test_filters(self):
+        store = self.open_store()
+        vectors = self.fill(store)
+        store.upsert(["text"], [vectors[0]], [{"text": "no pages", "metadata": {"source": "/docs/file0.pdf"}}])
+        query = vectors[0]
+
+        hits = store.search(query, 500, search_filter=SearchFilter(sources=["/docs/file1.pdf"]))
+        self.assertEqual(len(hits), 50)
+        self.assertTrue(all(hit.payload["metadata"]["source"] == "/docs/file1.pdf" for hit in hits))
+
+        hits = store.search(query, 500, search_filter=SearchFilter(sources=["/docs/file0.pdf"], page_from=2, page_to=4))
+        self.assertEqual(sorted({hit.payload["metadata"]["page"] for hit in hits}), [2, 4])
+        self.assertNotIn("text", [hit.id for hit in hits])
+
+        store.delete_by_filter(SearchFilter(sources=["/docs/file2.pdf"]))
+        self.assertEqual(store.count(), 151)
+        self.assertEqual(store.search(query, 5, search_filter=SearchFilter(sources=["/docs/file2.pdf"])), [])
+
+    def test_reopen_from_disk(self):
+        store = self.open_store("float16")
+        vectors = self.fill(store, count=20)
+        store.delete(["id5"])
+        query = vectors[7]
+        before = [(hit.id, hit.score) for hit in store.search(query, 5)]
+        store.close()
+
+        reopened = self.open_store("float16")
+        self.assertEqual(reopened.count(), 19)
+        self.assertEqual([(hit.id, hit.score) for hit in reopened.search(query, 5)], before)
+        self.assertEqual(reopened.retrieve(["id3"])[0].payload["metadata"]["page"], 3)
+        hits = reopened.search(query, 5, search_filter=SearchFilter(sources=["/docs/file3.pdf"]))
+        self.assertEqual({hit.payload["metadata"]["source"] for hit in hits}, {"/docs/file3.pdf"})
+        # The deleted slot is free again after reopening
+        reopened.upsert(["id20"], [vectors[5]], [{"text": "again", "metadata": {"source": "/docs/file0.pdf"}}])
+        self.assertEqual(reopened._size, 20)
+
+
+def word_count(text):
+    return len(text.split())
+
+
+class ContextBuilderTests(SimpleTestCase):
+    def test_mmr_sinks_near_duplicates(self):
+        relevance = np.array([1.0, 0.95, 0.6])
+        vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+        self.assertEqual(mmr_order(relevance, vectors, mmr_lambda=0.5, k=3), [0, 2, 1])
+        self.assertEqual(mmr_order(relevance, vectors, mmr_lambda=1.0, k=3), [0, 1, 2])
+        self.assertEqual(mmr_order(relevance, vectors, mmr_lambda=0.5, k=2), [0, 2])
+
+    def test_build_uses_mmr_order(self):
+        chunks = [
+            ContextChunk("a", "alpha one", 1.0, vector=[1.0, 0.0]),
+            ContextChunk("b", "alpha two", 0.95, vector=[1.0, 0.0]),
+            ContextChunk("c", "beta", 0.6, vector=[0.0, 1.0]),
+        ]
+        builder = ContextBuilder(token_budget=100, max_chunks=2, mmr_lambda=0.5)
+        with mock.patch.object(context_builder, "token_counter", return_value=word_count):
+            self.assertEqual(builder.build(chunks), ["alpha one", "beta"])
+
+    def test_token_budget_skips_chunks_that_do_not_fit(self):
+        chunks = [
+            ContextChunk("a", "one two three", 1.0),
+            ContextChunk("b", "four five six seven eight", 0.9),
+            ContextChunk("c", "nine ten", 0.8),
+        ]
+        builder = ContextBuilder(token_budget=6, max_chunks=5, mmr_lambda=1.0)
+        with mock.patch.object(context_builder, "token_counter", return_value=word_count):
+            passages = builder.build(chunks)
+        self.assertEqual(passages, ["one two three", "nine ten"])
+        self.assertLessEqual(sum(word_count(passage) for passage in passages), 6)
+
+    def test_merge_overlap(self):
+        shared = "the shared splitter overlap text"
+        first = "start of the first chunk, " + shared
+        second = shared + ", then the rest of the second"
+        merged = "start of the first chunk, " + shared + ", then the rest of the second"
+        self.assertEqual(merge_overlap(first, second, max_overlap=200), merged)
+        self.assertEqual(merge_overlap(second, first, max_overlap=200), merged)
+        # Overlaps shorter than MIN_OVERLAP are taken as coincidence
+        self.assertIsNone(merge_overlap("abc the end", "the end and more", max_overlap=200))
+        self.assertIsNone(merge_overlap("completely different", "unrelated text here", max_overlap=200))
+        # Only the last max_overlap characters of the first chunk are searched
+        self.assertIsNone(merge_overlap(first, second, max_overlap=len(shared) - 1))
+
+    def test_build_merges_overlapping_chunks_of_one_source(self):
+        shared = "the shared splitter overlap text"
+        chunks = [
+            ContextChunk("a", "first part, " + shared, 1.0, source="doc.pdf"),
+            ContextChunk("b", shared + ", second part", 0.9, source="doc.pdf"),
+            ContextChunk("c", shared + ", other file", 0.8, source="other.pdf"),
+        ]
+        builder = ContextBuilder(token_budget=100, max_chunks=5, mmr_lambda=1.0)
+        with mock.patch.object(context_builder, "token_counter", return_value=word_count):
+            passages = builder.build(chunks)
+        self.assertEqual(passages, ["first part, " + shared + ", second part", shared + ", other file"])
+
+    def test_token_counter_falls_back_once_without_tokenizer(self):
+        with mock.patch.dict(context_builder._token_counters, clear=True), \
+                mock.patch.object(context_builder, "_estimate_warned", False), \
+                mock.patch("tiktoken.encoding_for_model", side_effect=ConnectionError("offline")) as load, \
+                self.assertLogs("context_builder", "WARNING") as logs:
+            count = context_builder.token_counter("gpt-test")
+            self.assertIs(context_builder.token_counter("gpt-test"), count)
+            context_builder.token_counter("gpt-other")
+        self.assertEqual(count("12345678"), 2)
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("offline", logs.output[0])
+
+
+class SparseIndexTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = SparseIndex(os.path.join(self.tmp, "sparse.sqlite3"))
+        self.addCleanup(self.index.close)
+        self.index.add(
+            ["1", "2", "3"],
+            [
+                'Error ERR-1234 means the "upload" failed',
+                "Release v2.3.1 adds NOT and OR operators to search",
+                "The config_value setting controls retries",
+            ],
+            [{"source": "/docs/a.pdf", "page": 0}, {"source": "/docs/b.pdf", "page": 1}, {"source": "/docs/b.pdf"}],
+        )
+
+    def test_match_query_quotes_each_word(self):
+        self.assertEqual(build_match_query("ERR-1234 upload"), '"err 1234" OR "upload"')
+        self.assertEqual(build_match_query('say "hello" world'), '"say" OR "hello" OR "world"')
+        self.assertEqual(build_match_query("v2.3.1 v2.3.1"), '"v2 3 1"')
+        # FTS5 operators and syntax are searched as plain words
+        self.assertEqual(build_match_query("NOT NEAR(x) a* ^b col:c AND OR"), '"not" OR "near x" OR "b" OR "col c"')
+
+    def test_match_query_without_searchable_words(self):
+        for query in ("", "   ", '"" ()*:^', "what is the"):
+            with self.subTest(query=query):
+                self.assertEqual(build_match_query(query), "")
+                self.assertEqual(self.index.search(query), [])
+
+    def test_search_handles_quotes_and_operators(self):
+        for query in ('"upload', 'upload"', "NOT upload", "AND", "OR retries", "NEAR(upload, failed)",
+                      "upload*", "-err", "(config_value", "text:upload", "{x}"):
+            with self.subTest(query=query):
+                self.index.search(query)
+        self.assertEqual([hit.id for hit in self.index.search('"upload')], ["1"])
+        self.assertEqual([hit.id for hit in self.index.search("NOT operators")], ["2"])
+        self.assertEqual([hit.id for hit in self.index.search("ERR-1234")], ["1"])
+        self.assertEqual([hit.id for hit in self.index.search("config_value")], ["3"])
+        self.assertEqual(self.index.search("1234-ERR"), [])
+
+    def test_search_filter(self):
+        hits = self.index.search("upload OR operators retries", search_filter=SearchFilter(sources=["/docs/b.pdf"]))
+        self.assertEqual(sorted(hit.id for hit in hits), ["2", "3"])
+        hits = self.index.search("operators retries", search_filter=SearchFilter(page_from=1))
+        self.assertEqual([hit.id for hit in hits], ["2"])
+
+
+class RankFusionTests(SimpleTestCase):
+    def test_reciprocal_rank_fusion_order(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+        self.assertEqual([point_id for point_id, _ in fused], ["b", "a", "d", "c"])
+        self.assertAlmostEqual(fused[0][1], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(dict(fused)["c"], 1 / 63)
+        # Ranks 3 and 1 edge out ranks 2 and 2: 1/63 + 1/61 > 2/62
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+        self.assertEqual([point_id for point_id, _ in fused], ["c", "b", "a", "d"])
+        self.assertEqual(reciprocal_rank_fusion([[], []]), [])
+
+    def test_rank_chunks_merges_dense_and_keyword_hits(self):
+        dense = [
+            SearchHit(id=f"d{i}", score=0.9 - i / 10, payload={"text": f"dense {i}", "metadata": {"source": "a.pdf"}})
+            for i in range(3)
+        ]
+        sparse = [SparseHit(id="k", score=5.0, text="keyword"), SparseHit(id="d2", score=4.0, text="dense 2")]
+        ranked = rank_chunks(dense, sparse)
+        self.assertEqual([chunk.id for chunk in ranked], ["d2", "d0", "k", "d1"])
+        self.assertEqual(ranked[0].relevance, 1.0)
+        self.assertEqual((ranked[2].text, ranked[2].source), ("keyword", None))
+        # Dense-only results keep their order and cosine scores
+        self.assertEqual([(chunk.id, chunk.relevance) for chunk in rank_chunks(dense)],
+                         [(hit.id, hit.score) for hit in dense])
+
+
+class FakeDocumentManager:
+    find_duplicate = document_manager.DocumentManager.find_duplicate
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+
+class UploadDuplicateTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = os.path.join(self.tmp, "uploads")
+        os.makedirs(self.upload_dir)
+        self.manifest = IngestManifest(os.path.join(self.tmp, "manifest.json"))
+        for name, content in (("a.txt", b"alpha"), ("b.txt", b"beta")):
+            path = os.path.join(self.upload_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            self.manifest.record(resolve_source(path), hashlib.sha256(content).hexdigest(), [name])
+        self.submitted = []
+        for patcher in (
+            mock.patch.object(views, "UPLOAD_DIR", self.upload_dir),
+            mock.patch.object(views, "get_document_manager", return_value=FakeDocumentManager(self.manifest)),
+            mock.patch.object(views.ingest_runner, "submit", side_effect=self.submit),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, target, description=""):
+        self.submitted.append(description)
+        return mock.Mock(id="job", status="queued")
+
+    def upload(self, name, content):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post("/api/upload/", {"file": upload})
+
+    def read(self, name):
+        with open(os.path.join(self.upload_dir, name), "rb") as f:
+            return f.read()
+
+    def test_new_name_with_ingested_content_is_dropped(self):
+        response = self.upload("c.txt", b"alpha")
+        self.assertEqual(response.json()["duplicate_of"], "a.txt")
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, "c.txt")))
+        self.assertEqual(self.submitted, [])
+
+    def test_existing_name_with_another_files_content_replaces_it(self):
+        response = self.upload("a.txt", b"beta")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.read("a.txt"), b"beta")
+        self.assertEqual(self.submitted, ["Ingest a.txt"])
+
+    def test_existing_name_with_unchanged_content_is_dropped(self):
+        response = self.upload("a.txt", b"alpha")
+        self.assertEqual(response.json()["duplicate_of"], "a.txt")
+        self.assertEqual(self.submitted, [])
+
+    def test_not_yet_ingested_file_is_replaced(self):
+        with open(os.path.join(self.upload_dir, "d.txt"), "wb") as f:
+            f.write(b"old")
+        response = self.upload("d.txt", b"alpha")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.read("d.txt"), b"alpha")
+
+
+class CatalogPendingTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = os.path.join(self.tmp, "uploads")
+        os.makedirs(self.upload_dir)
+        self.manifest = IngestManifest(os.path.join(self.tmp, "manifest.json"))
+        self.runner = IngestJobRunner()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        for patcher in (
+            mock.patch.object(views, "UPLOAD_DIR", self.upload_dir),
+            mock.patch.object(views, "get_document_manager", return_value=FakeDocumentManager(self.manifest)),
+            mock.patch.object(views, "ingest_runner", self.runner),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def row(self, name):
+        return UploadedFile.objects.get(name=name)
+
+    def test_cancelled_upload_is_no_longer_queued(self):
+        # Keeps the runner busy so the upload's job stays queued
+        self.runner.submit(lambda progress: self.release.wait(10))
+        response = self.client.post("/api/upload/", {"file": SimpleUploadedFile("new.txt", b"new content")})
+        job_id = response.json()["job_id"]
+        self.assertEqual((self.row("new.txt").status, self.row("new.txt").job_id), (UploadedFile.QUEUED, job_id))
+
+        response = self.client.post(f"/api/ingest-jobs/{job_id}/cancel/")
+        self.assertEqual(response.json()["status"], CANCELLED)
+        self.assertEqual((self.row("new.txt").status, self.row("new.txt").job_id), (UploadedFile.UPLOADED, ""))
+
+        catalog.sync(self.upload_dir, self.manifest, live_jobs=views._live_job_ids())
+        self.assertEqual(self.row("new.txt").status, UploadedFile.UPLOADED)
+        catalog.sync(self.upload_dir, self.manifest, UploadedFile.FAILED, live_jobs=views._live_job_ids())
+        self.assertEqual(self.row("new.txt").status, UploadedFile.FAILED)
+
+    def test_sync_keeps_only_files_with_a_live_job_queued(self):
+        for name in ("live.txt", "lost.txt", "lost-ingesting.txt"):
+            with open(os.path.join(self.upload_dir, name), "w") as f:
+                f.write(name)
+            catalog.record_upload(name, len(name), "")
+        catalog.set_job("live.txt", "live-job")
+        catalog.set_job("lost.txt", "job-from-before-a-restart")
+        catalog.set_job("lost-ingesting.txt", "job-from-before-a-restart")
+        catalog.set_status("lost-ingesting.txt", UploadedFile.INGESTING)
+
+        catalog.sync(self.upload_dir, self.manifest, UploadedFile.FAILED, {}, live_jobs={"live-job"})
+        self.assertEqual(self.row("live.txt").status, UploadedFile.QUEUED)
+        self.assertEqual(self.row("lost.txt").status, UploadedFile.FAILED)
+        self.assertEqual(self.row("lost-ingesting.txt").status, UploadedFile.FAILED)
+
+        catalog.sync(self.upload_dir, self.manifest)
+        self.assertEqual(self.row("live.txt").status, UploadedFile.UPLOADED)
+
+
+class FileCatalogApiTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = os.path.join(self.tmp, "uploads")
+        os.makedirs(self.upload_dir)
+        self.manifest = IngestManifest(os.path.join(self.tmp, "manifest.json"))
+
+    def write(self, name, content):
+        path = os.path.join(self.upload_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_sync_reconciles_catalog_with_upload_dir_and_manifest(self):
+        ingested = self.write("ingested.txt", "ingested")
+        self.manifest.record(resolve_source(ingested), None, ["c1", "c2"])
+        self.write("pending.txt", "never ingested")
+        self.write("notes.md", "stored only")
+        catalog.record_upload("deleted.txt", 1, "")
+        catalog.record_upload("ingested.txt", 8, "")
+
+        counts = catalog.sync(self.upload_dir, self.manifest)
+        self.assertEqual(counts, {"created": 2, "updated": 1, "deleted": 1})
+        rows = {row.name: row for row in UploadedFile.objects.all()}
+        self.assertEqual(sorted(rows), ["ingested.txt", "notes.md", "pending.txt"])
+        self.assertEqual((rows["ingested.txt"].status, rows["ingested.txt"].chunk_count), (UploadedFile.INGESTED, 2))
+        self.assertEqual(rows["ingested.txt"].sha256, self.manifest.files[resolve_source(ingested)]["sha256"])
+        self.assertEqual(rows["pending.txt"].status, UploadedFile.UPLOADED)
+        self.assertEqual(rows["notes.md"].status, UploadedFile.UPLOADED)
+
+        # Nothing changed, so nothing is written
+        self.assertEqual(catalog.sync(self.upload_dir, self.manifest), {"created": 0, "updated": 0, "deleted": 0})
+        catalog.sync(self.upload_dir, self.manifest, UploadedFile.FAILED, {})
+        self.assertEqual(UploadedFile.objects.get(name="pending.txt").status, UploadedFile.FAILED)
+        self.assertEqual(UploadedFile.objects.get(name="notes.md").status, UploadedFile.UPLOADED)
+
+    def test_list_files_pages_with_a_cursor(self):
+        for i in range(5):
+            catalog.record_upload(f"file{i}.txt", i * 10, "")
+        catalog.set_status("file3.txt", UploadedFile.FAILED, "boom")
+
+        response = self.client.get("/api/list-files/", {"ordering": "name", "page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(set(page), {"next", "previous", "results"})
+        self.assertIsNone(page["previous"])
+        self.assertEqual(
+            set(page["results"][0]),
+            {"name", "size", "sha256", "status", "chunk_count", "error", "uploaded_at", "ingested_at"},
+        )
+
+        names = [item["name"] for item in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"]).json()
+            self.assertIsNotNone(page["previous"])
+            names += [item["name"] for item in page["results"]]
+        self.assertEqual(names, [f"file{i}.txt" for i in range(5)])
+
+        response = self.client.get("/api/list-files/", {"ordering": "-size", "status": "queued", "min_size": 10})
+        self.assertEqual([item["name"] for item in response.json()["results"]], ["file4.txt", "file2.txt", "file1.txt"])
+
+        for params in ({"ordering": "sha256"}, {"status": "done"}, {"min_size": "big"}):
+            self.assertEqual(self.client.get("/api/list-files/", params).status_code, 400)
+
+
+class ChatBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = mock.Mock()
+        self.manager.generate_answers_batch.return_value = []
+        self.manager.get_relevant_documents_batch.return_value = [[]]
+        patcher = mock.patch.object(views, "get_document_manager", return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, **body):
+        return self.client.post("/api/chat/batch/", {"messages": ["q"], **body}, content_type="application/json")
+
+    def test_concurrency_is_clamped(self):
+        for requested, used in ((0, 1), (-5, 1), (3, 3), (10_000, document_manager.BATCH_COMPLETION_CONCURRENCY)):
+            with self.subTest(concurrency=requested):
+                self.assertEqual(self.post(concurrency=requested).status_code, 200)
+                self.assertEqual(self.manager.generate_answers_batch.call_args.kwargs["concurrency"], used)
+
+    def test_limit_must_be_positive(self):
+        for generate in (True, False):
+            self.assertEqual(self.post(limit=0, generate=generate).status_code, 400)
+        self.assertEqual(self.post(limit=2, generate=False).status_code, 200)
+        self.assertEqual(self.manager.get_relevant_documents_batch.call_args.kwargs["limit"], 2)
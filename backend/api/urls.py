@@ -3,9 +3,19 @@ from . import views
 
 urlpatterns = [
     path('hello/', views.hello_world, name='hello_world'),
+    path('metrics/', views.metrics, name='metrics'),
     path('upload/', views.upload_file),
     path('list-files/', views.list_files),
     path('chat/', views.chat, name='chat'),
+    path('chat/stream/', views.chat_stream, name='chat_stream'),
+    path('chat/batch/', views.chat_batch, name='chat_batch'),
     path('clear-documents/', views.clear_documents, name='clear_documents'),
+    path('delete-document/', views.delete_document, name='delete_document'),
     path('ingest-documents/', views.ingest_documents, name='ingest_documents'),
+    path('async/chat/', views.chat_async, name='chat_async'),
+    path('async/chat/stream/', views.chat_stream_async, name='chat_stream_async'),
+    path('async/ingest-documents/', views.ingest_documents_async, name='ingest_documents_async'),
+    path('ingest-jobs/', views.list_ingest_jobs, name='list_ingest_jobs'),
+    path('ingest-jobs/<str:job_id>/', views.ingest_job_status, name='ingest_job_status'),
+    path('ingest-jobs/<str:job_id>/cancel/', views.cancel_ingest_job, name='cancel_ingest_job'),
 ] 
\ No newline at end of file
@@ -1,16 +1,39 @@
 from django.shortcuts import render
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.decorators import parser_classes
-from qdrant_client import QdrantClient
+from rest_framework.decorators import parser_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+import asyncio
 import os
-from document_manager import DocumentManager
+import hashlib
+import logging
+import tempfile
+from ingest_jobs import CANCELLED, FINISHED_STATUSES, IngestJobRunner
+from ingest_manifest import resolve_source
+from ingest_pipeline import IngestCancelled
+from search_filter import SearchFilter
+from metrics import REGISTRY
 from rest_framework import status
 import json
+from . import catalog
+from .catalog import INGESTED_EXTENSIONS
+from .managers import get_async_document_manager, get_document_manager
+from .models import UploadedFile
+from .serializers import UploadedFileSerializer
 
-# Create a single instance of DocumentManager to be reused
-document_manager = DocumentManager()
+logger = logging.getLogger(__name__)
+
+# Directory uploads are saved to and ingested from
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', '/Users/joshzheng/Downloads/test-uploads')
+
+# Background runner for ingestion jobs
+ingest_runner = IngestJobRunner()
 
 # Create your views here.
 
@@ -18,53 +41,192 @@ document_manager = DocumentManager()
 def hello_world(request):
     return Response("helloooo josh")
 
+def metrics(request):
+    """
+    Expose pipeline latency histograms and counters in Prometheus text format.
+    """
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class FileCatalogPagination(CursorPagination):
+    """Cursor pages of the file catalog; "ordering" picks the sort, e.g. "name" or "-size"."""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-uploaded_at'
+    ordering_fields = ('name', 'size', 'uploaded_at')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering', self.ordering)
+        field = ordering.lstrip('-')
+        if ordering not in (field, f'-{field}') or field not in self.ordering_fields:
+            raise ValidationError({'ordering': f"Must be one of {', '.join(self.ordering_fields)}, optionally prefixed with -"})
+        # The cursor only encodes the first field; ties are paged by offset in ID order
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
+
 @api_view(['GET'])
 def list_files(request):
-    upload_dir = '/Users/joshzheng/Downloads/test-uploads'
+    """
+    List uploaded files from the catalog, newest first, one page at a time.
+    
+    Query parameters: "status" (comma-separated), "search" (part of the name),
+    "min_size" and "max_size" in bytes, "ordering" and "page_size". Follow
+    "next" for the following page.
+    """
+    files = UploadedFile.objects.all()
+    statuses = request.query_params.get('status')
+    if statuses:
+        statuses = statuses.split(',')
+        valid = [value for value, _ in UploadedFile.STATUS_CHOICES]
+        if not set(statuses) <= set(valid):
+            return Response({'error': f"status must be one of {', '.join(valid)}"}, status=status.HTTP_400_BAD_REQUEST)
+        files = files.filter(status__in=statuses)
+    search = request.query_params.get('search')
+    if search:
+        files = files.filter(name__icontains=search)
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # List all files in the directory
-        files = []
-        for filename in os.listdir(upload_dir):
-            # Skip .DS_Store files
-            if filename == '.DS_Store':
-                continue
-                
-            file_path = os.path.join(upload_dir, filename)
-            if os.path.isfile(file_path):
-                files.append({
-                    'name': filename,
-                    'size': os.path.getsize(file_path)
-                })
-        
-        return Response(files)
-    except Exception as e:
-        return Response({'error': str(e)}, status=500)
+        for param, lookup in (('min_size', 'size__gte'), ('max_size', 'size__lte')):
+            if request.query_params.get(param):
+                files = files.filter(**{lookup: int(request.query_params[param])})
+    except ValueError:
+        return Response({'error': 'min_size and max_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    paginator = FileCatalogPagination()
+    page = paginator.paginate_queryset(files, request)
+    return paginator.get_paginated_response(UploadedFileSerializer(page, many=True).data)
 
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def upload_file(request):
+    """
+    Save an uploaded file and queue it for ingestion.
+    
+    The content hash is computed while the file is written. A new file whose
+    bytes are already ingested, under any name, is dropped instead of ingested
+    again. A file replacing one of the same name is only dropped if its
+    content is unchanged.
+    """
     if 'file' not in request.FILES:
         return Response({'error': 'No file provided'}, status=400)
     
     file = request.FILES['file']
-    upload_dir = '/Users/joshzheng/Downloads/test-uploads'
+    filename = os.path.basename(file.name)
+    if not filename or filename.startswith('.'):
+        return Response({'error': 'Invalid file name'}, status=status.HTTP_400_BAD_REQUEST)
+    upload_dir = UPLOAD_DIR
     
     # Create directory if it doesn't exist
     os.makedirs(upload_dir, exist_ok=True)
     
-    # Save the file
-    file_path = os.path.join(upload_dir, file.name)
-    with open(file_path, 'wb+') as destination:
-        for chunk in file.chunks():
-            destination.write(chunk)
+    # Write under a temporary name, so a duplicate never replaces the file it duplicates
+    file_path = os.path.join(upload_dir, filename)
+    ingested = filename.endswith(INGESTED_EXTENSIONS)
+    replacing = file_path if os.path.exists(file_path) else None
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix='.upload-')
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as destination:
+            for chunk in file.chunks():
+                digest.update(chunk)
+                destination.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        
+        duplicate = get_document_manager().find_duplicate(sha256, replacing) if ingested else None
+        if duplicate is not None:
+            os.unlink(tmp_path)
+            return Response({
+                'message': 'File already ingested',
+                'filename': filename,
+                'duplicate_of': os.path.basename(duplicate),
+            })
+        os.replace(tmp_path, file_path)
+        catalog.record_upload(filename, size, sha256)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return Response({'error': str(e)}, status=500)
+    
+    if not ingested:
+        return Response({'message': 'File uploaded successfully', 'filename': filename})
     
-    return Response({'message': 'File uploaded successfully', 'filename': file.name})
+    job = ingest_runner.submit(
+        lambda progress: _ingest_upload(filename, file_path, sha256, replacing, progress),
+        description=f"Ingest {filename}"
+    )
+    catalog.set_job(filename, job.id)
+    return Response({
+        'message': 'File uploaded, ingestion started',
+        'filename': filename,
+        'job_id': job.id,
+        'status': job.status,
+    }, status=status.HTTP_202_ACCEPTED)
+
+def _ingest_upload(filename, file_path, sha256, replacing, progress):
+    """Ingest job for one upload; records the outcome in the file catalog."""
+    manager = get_document_manager()
+    # Jobs run one at a time, so this sees every upload ingested before this one
+    duplicate = manager.find_duplicate(sha256, replacing)
+    source = resolve_source(file_path)
+    if duplicate is not None and duplicate != source:
+        os.unlink(file_path)
+        UploadedFile.objects.filter(name=filename).delete()
+        return True
+    catalog.set_status(filename, UploadedFile.INGESTING)
+    try:
+        success = manager.ingest_file(file_path, sha256=sha256, progress=progress)
+    except IngestCancelled:
+        catalog.set_status(filename, UploadedFile.UPLOADED)
+        raise
+    catalog.record_ingest(
+        filename, manager.manifest, source, progress.failed_files.get(source, 'Ingestion failed, see server logs')
+    )
+    return success
+
+def _live_job_ids():
+    return {job.id for job in ingest_runner.list() if job.status not in FINISHED_STATUSES}
+
+def _ingest_directory(upload_dir, progress):
+    """Ingest job for the whole upload directory; syncs the file catalog afterwards."""
+    manager = get_document_manager()
+    # Files the run doesn't record failed, unless it was cancelled before reaching them
+    unrecorded_status = None
+    try:
+        success = manager.ingest_documents(upload_dir, progress=progress)
+        unrecorded_status = UploadedFile.FAILED
+        return success
+    finally:
+        try:
+            catalog.sync(upload_dir, manager.manifest, unrecorded_status, progress.failed_files, _live_job_ids())
+        except Exception as e:
+            logger.error(f"Error syncing file catalog: {str(e)}")
+
+def _parse_search_filter(data):
+    """
+    Search filter from a request body's "files", "page_from" and "page_to", or None without them.
+    
+    "files" names ingested documents (file names or paths); pages are 0-based and inclusive.
+    Raises ValueError on malformed values or unknown files.
+    """
+    files = data.get('files')
+    page_from = data.get('page_from')
+    page_to = data.get('page_to')
+    if files is None and page_from is None and page_to is None:
+        return None
+    if files is not None and (not isinstance(files, list) or not files
+                              or not all(isinstance(name, str) and name for name in files)):
+        raise ValueError("files must be a non-empty list of file names")
+    for page in (page_from, page_to):
+        if page is not None and (not isinstance(page, int) or isinstance(page, bool) or page < 0):
+            raise ValueError("page_from and page_to must be non-negative integers")
+    sources = get_document_manager().resolve_sources(files) if files is not None else None
+    return SearchFilter(sources=sources, page_from=page_from, page_to=page_to)
 
 @api_view(['POST'])
 def chat(request):
+    """
+    Answer a question; "files", "page_from" and "page_to" restrict the search to those documents and pages.
+    """
     try:
         message = request.data.get('message')
         if not message:
@@ -72,9 +234,13 @@ def chat(request):
                 {"error": "Message is required"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            search_filter = _parse_search_filter(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         # Get relevant documents and generate answer
-        answer = document_manager.generate_answer(message)
+        answer = get_document_manager().generate_answer(message, search_filter=search_filter)
         return Response({"response": answer})
     
     except Exception as e:
@@ -83,12 +249,121 @@ def chat(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+# Largest number of questions accepted by one /chat/batch/ request
+MAX_BATCH_QUERIES = 1000
+
+@api_view(['POST'])
+def chat_batch(request):
+    """
+    Retrieve context for, and optionally answer, many questions in one request.
+    
+    Body: {"messages": [...], "generate": true, "limit": 5, "concurrency": 8}, plus
+    optional "files", "page_from" and "page_to" as for /chat/, applied to every message.
+    With "generate": false only the retrieved documents are returned, at most "limit"
+    per message. "limit" only applies then: answers get the context /chat/ would
+    build, sized by token budget. "concurrency" is capped at BATCH_COMPLETION_CONCURRENCY.
+    """
+    messages = request.data.get('messages')
+    if (not isinstance(messages, list) or not messages
+            or not all(isinstance(message, str) and message for message in messages)):
+        return Response(
+            {"error": "messages must be a non-empty list of non-empty strings"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(messages) > MAX_BATCH_QUERIES:
+        return Response(
+            {"error": f"At most {MAX_BATCH_QUERIES} messages per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    # Imported here rather than at startup, like the document managers
+    from document_manager import BATCH_COMPLETION_CONCURRENCY
+    try:
+        limit = int(request.data.get('limit', 5))
+        concurrency = int(request.data.get('concurrency', BATCH_COMPLETION_CONCURRENCY))
+    except (TypeError, ValueError):
+        return Response({"error": "limit and concurrency must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({"error": "limit must be at least 1"}, status=status.HTTP_400_BAD_REQUEST)
+    # One client can't hold more of the completion rate limit than the server allows
+    concurrency = min(max(concurrency, 1), BATCH_COMPLETION_CONCURRENCY)
+    try:
+        search_filter = _parse_search_filter(request.data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        if not request.data.get('generate', True):
+            documents = get_document_manager().get_relevant_documents_batch(
+                messages, limit=limit, search_filter=search_filter
+            )
+            results = [
+                {"query": message, "documents": docs} for message, docs in zip(messages, documents)
+            ]
+        else:
+            results = get_document_manager().generate_answers_batch(
+                messages, concurrency=concurrency, search_filter=search_filter
+            )
+        return Response({"results": results})
+    
+    except Exception as e:
+        return Response(
+            {"error": str(e)}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients that send `Accept: text/event-stream` pass content negotiation."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data)
+
+def _sse_events(events):
+    """Encode (event, data) pairs as Server-Sent Events."""
+    try:
+        for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+@api_view(['POST'])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def chat_stream(request):
+    """
+    Stream retrieval results and answer tokens as Server-Sent Events.
+    
+    Only streams under a WSGI server: under ASGI, Django reads a synchronous
+    iterator to the end before sending any of it. ASGI deployments should
+    use /api/async/chat/stream/, which streams from an async generator.
+    """
+    message = request.data.get('message')
+    if not message:
+        return Response(
+            {"error": "Message is required"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        search_filter = _parse_search_filter(request.data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(
+        _sse_events(get_document_manager().generate_answer_stream(message, search_filter=search_filter)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['POST'])
 def clear_documents(request):
     """
     Clear all documents from the Qdrant collection and delete all files in the upload directory.
     """
-    upload_dir = '/Users/joshzheng/Downloads/test-uploads'
+    upload_dir = UPLOAD_DIR
     
     try:
         # Delete all files in the upload directory
@@ -98,11 +373,11 @@ def clear_documents(request):
                 if os.path.isfile(file_path) and filename != '.DS_Store':
                     os.unlink(file_path)
             except Exception as e:
-                print(f"Error deleting {file_path}: {e}")
+                logger.error(f"Error deleting {file_path}: {str(e)}")
         
         # Delete the collection and recreate it
-        document_manager.qdrant_client.delete_collection(document_manager.collection_name)
-        document_manager._setup_collection()
+        get_document_manager().clear_collection()
+        UploadedFile.objects.all().delete()
         
         return Response({
             'message': 'Documents collection cleared and files deleted successfully'
@@ -110,17 +385,163 @@ def clear_documents(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['POST'])
+def delete_document(request):
+    """
+    Delete one uploaded file and its chunks without rebuilding the collection.
+    """
+    upload_dir = UPLOAD_DIR
+    filename = request.data.get('filename')
+    if not isinstance(filename, str) or not filename or os.path.basename(filename) != filename:
+        return Response({'error': 'filename must be the name of an uploaded file'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    file_path = os.path.join(upload_dir, filename)
+    try:
+        try:
+            removed = get_document_manager().delete_document(file_path)
+        except ValueError:
+            # Uploaded but never ingested
+            removed = []
+        deleted, _ = UploadedFile.objects.filter(name=filename).delete()
+        if os.path.isfile(file_path):
+            os.unlink(file_path)
+        elif not removed and not deleted:
+            return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({'message': 'Document deleted successfully', 'filename': filename})
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+def _parse_body(request):
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+@csrf_exempt
+@require_POST
+async def chat_async(request):
+    """
+    Async chat endpoint for ASGI deployments; awaits embedding, search and completion.
+    """
+    body = _parse_body(request)
+    message = body.get('message')
+    if not message:
+        return JsonResponse({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # Resolving files reads the manifest and may set up the sync manager
+        search_filter = await asyncio.to_thread(_parse_search_filter, body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        answer = await get_async_document_manager().generate_answer(message, search_filter=search_filter)
+        return JsonResponse({"response": answer})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+async def _async_sse_events(events):
+    """Encode async (event, data) pairs as Server-Sent Events."""
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+@csrf_exempt
+@require_POST
+async def chat_stream_async(request):
+    """
+    Async Server-Sent Events chat endpoint for ASGI deployments.
+    
+    Streams token by token under ASGI, unlike /api/chat/stream/.
+    """
+    body = _parse_body(request)
+    message = body.get('message')
+    if not message:
+        return JsonResponse({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # Resolving files reads the manifest and may set up the sync manager
+        search_filter = await asyncio.to_thread(_parse_search_filter, body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(
+        _async_sse_events(
+            get_async_document_manager().generate_answer_stream(message, search_filter=search_filter)
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+@require_POST
+async def ingest_documents_async(request):
+    """
+    Async variant of ingest_documents; queues the job without blocking the event loop.
+    """
+    upload_dir = UPLOAD_DIR
+    
+    job = ingest_runner.submit(
+        lambda progress: _ingest_directory(upload_dir, progress),
+        description=f"Ingest {upload_dir}"
+    )
+    return JsonResponse({
+        'message': 'Document ingestion started',
+        'job_id': job.id,
+        'status': job.status,
+    }, status=status.HTTP_202_ACCEPTED)
+
 @api_view(['POST'])
 def ingest_documents(request):
     """
-    Ingest all documents from the upload directory into Qdrant.
+    Queue ingestion of all documents in the upload directory and return the job ID.
     """
-    upload_dir = '/Users/joshzheng/Downloads/test-uploads'
+    upload_dir = UPLOAD_DIR
     
     try:
-        success = document_manager.ingest_documents(upload_dir)
-        if success:
-            return Response({'message': 'Documents ingested successfully'})
-        return Response({'error': 'Failed to ingest documents'}, status=500)
+        job = ingest_runner.submit(
+            lambda progress: _ingest_directory(upload_dir, progress),
+            description=f"Ingest {upload_dir}"
+        )
+        return Response({
+            'message': 'Document ingestion started',
+            'job_id': job.id,
+            'status': job.status,
+        }, status=status.HTTP_202_ACCEPTED)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+def list_ingest_jobs(request):
+    """
+    List recent ingestion jobs, newest first.
+    """
+    jobs = sorted(ingest_runner.list(), key=lambda job: job.created_at, reverse=True)
+    return Response([job.to_dict() for job in jobs])
+
+@api_view(['GET'])
+def ingest_job_status(request, job_id):
+    """
+    Report status and progress of an ingestion job.
+    """
+    job = ingest_runner.get(job_id)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job.to_dict())
+
+@api_view(['POST'])
+def cancel_ingest_job(request, job_id):
+    """
+    Cancel a queued or running ingestion job.
+    """
+    job = ingest_runner.cancel(job_id)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status == CANCELLED and job.started_at is None:
+        # It will never run, so nothing else takes its files out of the queue
+        catalog.release_job(job.id)
+    return Response(job.to_dict())
@@ -0,0 +1,322 @@
+import os
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from context_builder import ContextBuilder, ContextChunk
+from embedding_cache import EmbeddingCache
+from index_config import IndexConfig
+from qdrant_config import QdrantClientConfig
+from search_filter import SearchFilter
+from vector_store import AsyncVectorStore, make_async_vector_store
+from metrics import OPERATION_DURATION, SEARCH_RESULTS, STAGE_DURATION, record_usage
+from document_manager import (
+    CHAT_MODEL,
+    CONTEXT_CANDIDATES,
+    CONTEXT_SCORE_THRESHOLD,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CONFIG,
+    HYBRID_CANDIDATES_FACTOR,
+    QDRANT_URL,
+    SPARSE_INDEX_DIR,
+    VECTOR_DTYPE,
+    VECTOR_STORE,
+    VECTOR_STORE_DIR,
+    attach_texts,
+    build_messages,
+    collection_version,
+    fill_chunks,
+    make_answer_cache,
+    make_chunk_store,
+    make_context_builder,
+    make_sparse_index,
+    rank_chunks,
+    search_keywords,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDocumentManager:
+    def __init__(
+        self,
+        qdrant_url: str = QDRANT_URL,
+        collection_name: str = "documents",
+        embedding_cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        index_config: Optional[IndexConfig] = None,
+        client_config: Optional[QdrantClientConfig] = None,
+        vector_store: Optional[AsyncVectorStore] = None,
+        sparse_index_dir: Optional[str] = SPARSE_INDEX_DIR,
+        context_builder: Optional[ContextBuilder] = None,
+    ):
+        """
+        Non-blocking variant of DocumentManager's query path for ASGI servers.
+
+        Uses an async vector store and AsyncOpenAI so an in-flight chat awaits its
+        network calls instead of holding a worker thread. Ingestion stays on
+        the synchronous DocumentManager and its background job runner.
+
+        Args:
+            qdrant_url: URL of the Qdrant server, or ":memory:" for an in-process instance
+            collection_name: Name of the collection to use in Qdrant
+            embedding_cache_path: SQLite file for cached embeddings, None or "" to disable
+            index_config: HNSW, quantization and search settings; read from the environment if None
+            client_config: Qdrant transport and upsert settings; read from the environment if None
+            vector_store: Store for chunk vectors; built from VECTOR_STORE if None
+            sparse_index_dir: Directory of the BM25 keyword index, None or "" for dense-only search
+            context_builder: Packs retrieved chunks into prompts; built from the CONTEXT_* settings if None
+        """
+        self.qdrant_url = qdrant_url
+        self.collection_name = collection_name
+        self.index_config = index_config or IndexConfig.from_env()
+        self.client_config = client_config or QdrantClientConfig.from_env()
+
+        self.vector_store = vector_store or make_async_vector_store(
+            VECTOR_STORE,
+            collection_name=collection_name,
+            dimensions=EMBEDDING_DIMENSIONS,
+            index_config=self.index_config,
+            qdrant_url=qdrant_url,
+            numpy_dir=VECTOR_STORE_DIR,
+            dtype=VECTOR_DTYPE,
+            client_config=self.client_config,
+        )
+        self.openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.embedding_cache = (
+            EmbeddingCache(embedding_cache_path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+            if embedding_cache_path else None
+        )
+        self.sparse_index = make_sparse_index(collection_name, sparse_index_dir)
+        # Texts of compact-mode points; reads are in-memory lookups on an mmap, so they run inline
+        self.chunk_store = make_chunk_store(collection_name)
+        self.context_builder = context_builder or make_context_builder()
+        self.answer_cache = make_answer_cache()
+        self._ready = False
+        self._setup_lock = asyncio.Lock()
+
+    async def setup(self):
+        """Create the collection if it doesn't exist; safe to call repeatedly."""
+        if self._ready:
+            return
+        async with self._setup_lock:
+            if self._ready:
+                return
+            if await self.vector_store.ensure_collection():
+                logger.info(f"Created new collection: {self.collection_name}")
+            self._ready = True
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """Get embedding for a text using OpenAI's API."""
+        # The cache is SQLite, so its reads and writes run off the event loop
+        if self.embedding_cache is not None:
+            cached = await asyncio.to_thread(self.embedding_cache.get, EMBEDDING_CONFIG.cache_model, text)
+            if cached is not None:
+                return cached
+
+        with STAGE_DURATION.time(stage="query_embed"):
+            response = await self.openai_client.embeddings.create(
+                model=EMBEDDING_CONFIG.model, input=text, **EMBEDDING_CONFIG.request_kwargs()
+            )
+        record_usage(EMBEDDING_CONFIG.model, response.usage)
+        embedding = response.data[0].embedding
+        if self.embedding_cache is not None:
+            await asyncio.to_thread(self.embedding_cache.put_many, EMBEDDING_CONFIG.cache_model, {text: embedding})
+        return embedding
+
+    async def get_relevant_documents(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float = 0.1,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[str]:
+        """
+        Retrieve relevant documents from Qdrant based on the query.
+
+        Args:
+            query: The search query
+            limit: Maximum number of documents to return
+            score_threshold: Minimum similarity score to consider a document relevant
+            search_filter: Optional restriction to some documents and/or pages
+
+        Returns:
+            List of relevant document texts
+        """
+        with OPERATION_DURATION.time(operation="get_relevant_documents"):
+            query_embedding = await self.get_embedding(query)
+            return await self._search_documents(
+                query_embedding, limit, score_threshold, query=query, search_filter=search_filter
+            )
+
+    async def _search_documents(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        score_threshold: float = 0.1,
+        query: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[str]:
+        """Texts of the top `limit` chunks for an already computed query embedding."""
+        hybrid = query is not None and self.sparse_index is not None
+        candidates = limit * HYBRID_CANDIDATES_FACTOR if hybrid else limit
+        chunks = await self._retrieve(query_embedding, candidates, score_threshold, query, search_filter=search_filter)
+        return [chunk.text for chunk in chunks[:limit]]
+
+    async def _build_context(
+        self, query_embedding: List[float], query: str, search_filter: Optional[SearchFilter] = None
+    ) -> List[str]:
+        """Retrieve candidates and pack them into the prompt context."""
+        chunks = await self._retrieve(
+            query_embedding, CONTEXT_CANDIDATES, CONTEXT_SCORE_THRESHOLD, query,
+            with_vectors=True, search_filter=search_filter
+        )
+        with STAGE_DURATION.time(stage="context"):
+            return self.context_builder.build(chunks)
+
+    async def _retrieve(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        score_threshold: float,
+        query: Optional[str] = None,
+        with_vectors: bool = False,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[ContextChunk]:
+        """Vector search, fused with a concurrent keyword search when `query` is given."""
+        await self.setup()
+        hybrid = query is not None and self.sparse_index is not None
+
+        async def dense_search():
+            with STAGE_DURATION.time(stage="search"):
+                return await self.vector_store.search(
+                    query_embedding, limit=limit, score_threshold=score_threshold,
+                    with_vectors=with_vectors, search_filter=search_filter
+                )
+
+        if not hybrid:
+            search_results = await dense_search()
+            # Reading and decompressing the texts blocks, like the keyword search below
+            await asyncio.to_thread(attach_texts, [search_results], self.chunk_store)
+            SEARCH_RESULTS.observe(len(search_results))
+            logger.info(f"Found {len(search_results)} results")
+            return rank_chunks(search_results)
+
+        # SQLite calls block, so the keyword search runs on a worker thread
+        search_results, sparse_results = await asyncio.gather(
+            dense_search(),
+            asyncio.to_thread(search_keywords, self.sparse_index, query, limit, search_filter),
+        )
+        await asyncio.to_thread(attach_texts, [search_results], self.chunk_store)
+        SEARCH_RESULTS.observe(len(search_results))
+        logger.info(f"Found {len(search_results)} results and {len(sparse_results)} keyword results")
+        chunks = rank_chunks(search_results, sparse_results)
+        missing = [chunk.id for chunk in chunks if chunk.vector is None]
+        if with_vectors and missing:
+            fill_chunks(chunks, await self.vector_store.retrieve(missing, with_vectors=True))
+        return chunks
+
+    def _lookup_answer(self, query_embedding: List[float], search_filter: Optional[SearchFilter] = None):
+        """Check the semantic answer cache; see DocumentManager._lookup_answer."""
+        if self.answer_cache is None or (search_filter is not None and not search_filter.is_empty()):
+            return None, None
+        version = collection_version(self.collection_name)
+        return self.answer_cache.lookup(query_embedding, version=version), version
+
+    async def generate_answer(
+        self, query: str, context: Optional[List[str]] = None, search_filter: Optional[SearchFilter] = None
+    ) -> str:
+        """
+        Generate an answer using OpenAI's API with the provided context.
+
+        Args:
+            query: The question to answer
+            context: Optional list of context documents. If None, will search for relevant documents.
+            search_filter: Optional restriction of that search to some documents and/or pages
+
+        Returns:
+            Generated answer
+        """
+        with OPERATION_DURATION.time(operation="generate_answer"):
+            cache_key = None
+            if context is None:
+                query_embedding = await self.get_embedding(query)
+                cached, cache_key = self._lookup_answer(query_embedding, search_filter)
+                if cached is not None:
+                    return cached.answer
+                start = time.perf_counter()
+                context = await self._build_context(query_embedding, query, search_filter)
+
+            with STAGE_DURATION.time(stage="completion"):
+                response = await self.openai_client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=build_messages(query, context),
+                    temperature=0.7
+                )
+            record_usage(CHAT_MODEL, response.usage)
+            answer = response.choices[0].message.content
+
+            if cache_key is not None:
+                self.answer_cache.store(
+                    query_embedding, answer, context, time.perf_counter() - start, version=cache_key
+                )
+            return answer
+
+    async def generate_answer_stream(
+        self, query: str, context: Optional[List[str]] = None, search_filter: Optional[SearchFilter] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Async counterpart of DocumentManager.generate_answer_stream.
+
+        Yields:
+            ("context", ...), then ("token", ...) per text delta, then ("done", ...)
+        """
+        cache_key = None
+        if context is None:
+            query_embedding = await self.get_embedding(query)
+            cached, cache_key = self._lookup_answer(query_embedding, search_filter)
+            if cached is not None:
+                yield "context", {"documents": cached.context}
+                yield "token", {"content": cached.answer}
+                yield "done", {"response": cached.answer, "cached": True}
+                return
+            start = time.perf_counter()
+            context = await self._build_context(query_embedding, query, search_filter)
+        yield "context", {"documents": context}
+
+        requested = time.perf_counter()
+        stream = await self.openai_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=build_messages(query, context),
+            temperature=0.7,
+            stream=True
+        )
+        answer = []
+        # Time spent in the consumer while suspended at a yield isn't generation time
+        paused = 0.0
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not answer:
+                    STAGE_DURATION.observe(time.perf_counter() - requested, stage="completion_first_token")
+                answer.append(delta)
+                yielded = time.perf_counter()
+                yield "token", {"content": delta}
+                paused += time.perf_counter() - yielded
+        STAGE_DURATION.observe(time.perf_counter() - requested - paused, stage="completion_stream")
+
+        if cache_key is not None:
+            self.answer_cache.store(
+                query_embedding, "".join(answer), context, time.perf_counter() - start, version=cache_key
+            )
+        yield "done", {"response": "".join(answer)}
+
+    async def close(self):
+        await self.openai_client.close()
+        await self.vector_store.close()
@@ -0,0 +1,307 @@
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is used without it
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where writers are only serialized within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CODECS = ("zstd", "zlib")
+
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+
+class ChunkStore:
+    DATA_FILE = "chunks.dat"
+    INDEX_FILE = "chunks.sqlite3"
+    LOCK_FILE = "chunks.lock"
+
+    def __init__(self, path: str, codec: Optional[str] = None, level: Optional[int] = None):
+        """
+        Compressed, append-only store of chunk texts keyed by point ID.
+
+        Lets vector store points carry only a small reference payload: each
+        text is compressed into its own frame appended to `<path>/chunks.dat`,
+        and an offset index in `<path>/chunks.sqlite3` maps point IDs to
+        (offset, length). The index is mirrored in memory and the data file
+        is memory-mapped, so reading the texts of a page of search results
+        is a dict lookup and a decompression per hit, with no file I/O or
+        copying of the compressed bytes.
+
+        Overwritten and deleted texts leave dead frames behind until
+        compact() rewrites the file. Writes hold an exclusive lock on
+        `<path>/chunks.lock`, so a compaction in one process never drops
+        frames another process is appending.
+
+        Args:
+            path: Directory holding the store's files
+            codec: "zstd" (needs the zstandard package) or "zlib"; defaults to
+                zstd when installed. An existing store keeps the codec it was created with.
+            level: Compression level; the codec's default if None
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, self.LOCK_FILE), "a")
+        self._conn = sqlite3.connect(
+            os.path.join(path, self.INDEX_FILE), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY,"
+            " source TEXT,"
+            " offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'codec'").fetchone()
+        if row is None:
+            self.codec = codec or default_codec()
+            self._conn.execute("INSERT INTO meta VALUES ('codec', ?)", (self.codec,))
+        else:
+            self.codec = row[0]
+            if codec is not None and codec != self.codec:
+                logger.warning(f"Chunk store at {path} uses {self.codec}, ignoring requested codec {codec}")
+        if self.codec not in CHUNK_CODECS:
+            raise ValueError(f"codec must be one of {CHUNK_CODECS}, got {self.codec!r}")
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError(f"Chunk store at {path} is zstd-compressed; install the zstandard package")
+        self.level = level
+
+        self._mmap: Optional[mmap.mmap] = None
+        self._open_data()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._load_index()
+
+    @property
+    def _data_path(self) -> str:
+        return os.path.join(self.path, self.DATA_FILE)
+
+    def _open_data(self):
+        self._data = open(self._data_path, "ab+")
+        self._data_inode = os.fstat(self._data.fileno()).st_ino
+
+    @contextmanager
+    def _writing(self):
+        """Hold the store's lock against other threads and, through the lock file, other processes."""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Pick up writes by other processes: new index rows, and the new data file after a compaction."""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            return
+        self._load_index()
+        try:
+            replaced = os.stat(self._data_path).st_ino != self._data_inode
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            # The offsets now point into the compacted file, not the one we have mapped
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._data.close()
+            self._open_data()
+
+    def _load_index(self):
+        # Bumped by SQLite whenever another connection commits to the index
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._index = {
+            point_id: (offset, length)
+            for point_id, offset, length in self._conn.execute("SELECT id, offset, length FROM chunks")
+        }
+
+    def _compress(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=3 if self.level is None else self.level).compress(data)
+        return zlib.compress(data, self.level if self.level is not None else 6)
+
+    def _decompress(self, frame) -> str:
+        if self.codec == "zstd":
+            return zstandard.ZstdDecompressor().decompress(frame).decode("utf-8")
+        return zlib.decompress(frame).decode("utf-8")
+
+    def put(self, ids: Sequence, texts: Sequence[str], sources: Optional[Sequence[Optional[str]]] = None):
+        """
+        Store chunk texts, replacing any previous text for the same IDs.
+
+        Args:
+            ids: Point IDs
+            texts: Chunk texts
+            sources: Optional source file per chunk, for delete_source()
+        """
+        ids = [str(point_id) for point_id in ids]
+        sources = list(sources) if sources is not None else [None] * len(ids)
+        frames = [self._compress(text) for text in texts]
+        with self._writing():
+            # Append to the current data file, not one another process compacted away
+            self._refresh()
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            rows = []
+            for point_id, source, frame in zip(ids, sources, frames):
+                rows.append((point_id, source, offset, len(frame)))
+                offset += len(frame)
+            self._data.write(b"".join(frames))
+            self._data.flush()
+            # Index rows are written after their frames, so they never point past the data
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, source, offset, length) VALUES (?, ?, ?, ?)", rows
+            )
+            for point_id, _, frame_offset, length in rows:
+                self._index[point_id] = (frame_offset, length)
+
+    def get_many(self, ids: Sequence) -> Dict[str, str]:
+        """Texts by point ID; unknown IDs are left out."""
+        with self._lock:
+            ids = [str(point_id) for point_id in ids]
+            self._refresh()
+            locations = {point_id: self._index[point_id] for point_id in ids if point_id in self._index}
+            if not locations:
+                return {}
+            end = max(offset + length for offset, length in locations.values())
+            if self._mmap is None or len(self._mmap) < end:
+                self._remap()
+            view = memoryview(self._mmap)
+            try:
+                return {
+                    point_id: self._decompress(view[offset:offset + length])
+                    for point_id, (offset, length) in locations.items()
+                }
+            finally:
+                view.release()
+
+    def _remap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if os.path.getsize(self._data_path) > 0:
+            self._mmap = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def delete(self, ids: Sequence):
+        """Forget texts by point ID; their frames stay in the file until compact()."""
+        ids = [str(point_id) for point_id in ids]
+        with self._writing():
+            self._delete(ids)
+
+    def _delete(self, ids: Sequence[str]):
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(point_id,) for point_id in ids])
+        for point_id in ids:
+            self._index.pop(point_id, None)
+
+    def delete_source(self, source: str):
+        """Forget every text of one source file."""
+        with self._writing():
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM chunks WHERE source = ?", (source,))]
+            self._delete(ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            live_bytes = sum(length for _, length in self._index.values())
+            return {
+                "codec": self.codec,
+                "chunks": len(self._index),
+                "live_bytes": live_bytes,
+                "file_bytes": os.path.getsize(self._data_path),
+            }
+
+    def compact(self, min_dead_ratio: float = 0.5) -> bool:
+        """
+        Rewrite the data file without dead frames.
+
+        Args:
+            min_dead_ratio: Only compact when at least this share of the file is dead
+
+        Returns:
+            True if the file was rewritten
+        """
+        with self._writing():
+            # Nothing can be appended or deleted until the new file and offsets are in place
+            stats = self.stats()
+            dead = stats["file_bytes"] - stats["live_bytes"]
+            if dead <= 0 or dead < min_dead_ratio * stats["file_bytes"]:
+                return False
+            self._remap()
+            tmp_path = f"{self._data_path}.tmp"
+            rows = []
+            with open(tmp_path, "wb") as out:
+                for point_id, (offset, length) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                    rows.append((out.tell(), point_id))
+                    out.write(self._mmap[offset:offset + length])
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("UPDATE chunks SET offset = ? WHERE id = ?", rows)
+                if self._mmap is not None:
+                    self._mmap.close()
+                    self._mmap = None
+                self._data.close()
+                os.replace(tmp_path, self._data_path)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._open_data()
+            self._load_index()
+            logger.info(f"Compacted chunk store {self.path}: {stats['file_bytes']} -> {stats['live_bytes']} bytes")
+            return True
+
+    def clear(self):
+        with self._writing():
+            self._conn.execute("DELETE FROM chunks")
+            self._index = {}
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._data.truncate(0)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._data.close()
+            self._conn.close()
+            self._lock_file.close()
+
+
+_chunk_stores: Dict[str, ChunkStore] = {}
+_chunk_stores_lock = threading.Lock()
+
+
+def open_chunk_store(path: str) -> ChunkStore:
+    """The process-wide ChunkStore for a directory, so the sync and async managers share one mapping."""
+    path = os.path.abspath(path)
+    with _chunk_stores_lock:
+        store = _chunk_stores.get(path)
+        if store is None:
+            store = _chunk_stores[path] = ChunkStore(path)
+        return store
@@ -0,0 +1,232 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared text treated as splitter overlap rather than coincidence
+MIN_OVERLAP = 20
+# Encoding for chat models the installed tiktoken doesn't know
+FALLBACK_ENCODING = "cl100k_base"
+
+
+@dataclass
+class ContextChunk:
+    id: str
+    text: str
+    # Higher is more relevant; roughly in [0, 1] so it trades off against similarity in MMR
+    relevance: float
+    source: Optional[str] = None
+    vector: Optional[Sequence[float]] = None
+
+
+_token_counters: Dict[str, Callable[[str], int]] = {}
+_token_counters_lock = threading.Lock()
+_estimate_warned = False
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """
+    Token count function for a chat model.
+
+    The tokenizer is loaded on first use and kept for the life of the
+    process. If it can't be loaded, e.g. tiktoken is missing or can't
+    download its encoding offline, token budgets fall back to a
+    4-characters-per-token estimate and a warning is logged once.
+    """
+    counter = _token_counters.get(model)
+    if counter is None:
+        with _token_counters_lock:
+            counter = _token_counters.get(model)
+            if counter is None:
+                counter = _token_counters[model] = _load_token_counter(model)
+    return counter
+
+
+def _load_token_counter(model: str) -> Callable[[str], int]:
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # A model newer than the installed tiktoken
+            encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        # Called under _token_counters_lock; one warning covers every model
+        global _estimate_warned
+        if not _estimate_warned:
+            _estimate_warned = True
+            logger.warning(
+                f"Could not load a tokenizer for {model}, token budgets are estimated at 4 characters "
+                f"per token: {type(e).__name__}: {e}. Set TIKTOKEN_CACHE_DIR to a directory holding the "
+                f"encoding files to count tokens offline."
+            )
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def merge_overlap(first: str, second: str, max_overlap: int, min_overlap: int = MIN_OVERLAP) -> Optional[str]:
+    """
+    Join two chunks that overlap, keeping the shared text once.
+
+    Adjacent chunks from the text splitter share up to `max_overlap`
+    characters: the end of one is the start of the next.
+
+    Returns:
+        The merged text, or None if neither chunk continues the other
+    """
+    for head, tail in ((first, second), (second, first)):
+        probe = tail[:min_overlap]
+        if len(probe) < min_overlap:
+            continue
+        # The earliest match is the longest overlap
+        pos = head.find(probe, max(0, len(head) - max_overlap))
+        while pos != -1:
+            if tail.startswith(head[pos:]):
+                return head + tail[len(head) - pos:]
+            pos = head.find(probe, pos + 1)
+    return None
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, mmr_lambda: float, k: int) -> List[int]:
+    """
+    Maximal marginal relevance ordering of candidates.
+
+    Each step picks the candidate maximizing
+    mmr_lambda * relevance - (1 - mmr_lambda) * (max similarity to the picked ones),
+    so near-duplicates of already picked chunks sink.
+
+    Args:
+        relevance: Per-candidate relevance
+        vectors: Per-candidate vectors, one row each; zero rows never count as similar
+        mmr_lambda: 1.0 ranks by relevance only, lower values favour diversity
+        k: Number of candidates to order
+
+    Returns:
+        Indices of up to k candidates in pick order
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = vectors / norms
+    similarity = unit @ unit.T
+
+    penalty = np.zeros(len(relevance))
+    available = np.ones(len(relevance), dtype=bool)
+    order = []
+    for _ in range(min(k, len(relevance))):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * penalty
+        scores[~available] = -np.inf
+        index = int(np.argmax(scores))
+        order.append(index)
+        available[index] = False
+        penalty = np.maximum(penalty, similarity[index])
+    return order
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        max_chunks: int = 5,
+        mmr_lambda: float = 0.7,
+        model: str = "gpt-3.5-turbo",
+        max_overlap: int = 200,
+    ):
+        """
+        Packs retrieved chunks into the context sent to the chat model.
+
+        Candidates are taken in MMR order, overlapping chunks from the same
+        source are merged so shared text is sent once, and chunks are added
+        until the token budget or `max_chunks` is reached.
+
+        Args:
+            token_budget: Maximum tokens of context, counted with the chat model's tokenizer
+            max_chunks: Maximum number of retrieved chunks to use
+            mmr_lambda: Relevance vs diversity trade-off, 1.0 disables diversity
+            model: Chat model whose tokenizer counts the budget
+            max_overlap: Longest overlap between adjacent chunks (the splitter's chunk_overlap)
+        """
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.mmr_lambda = mmr_lambda
+        self.model = model
+        self.max_overlap = max_overlap
+
+    def build(self, chunks: List[ContextChunk]) -> List[str]:
+        """
+        Select, merge and pack chunks.
+
+        Args:
+            chunks: Candidates, ideally with vectors; those without one are
+                never penalized as duplicates
+
+        Returns:
+            Context passages, most relevant first
+        """
+        if not chunks:
+            return []
+        count_tokens = token_counter(self.model)
+        relevance = np.array([chunk.relevance for chunk in chunks], dtype=np.float32)
+        dimensions = next((len(chunk.vector) for chunk in chunks if chunk.vector is not None), 0)
+        if dimensions and self.mmr_lambda < 1.0:
+            vectors = np.zeros((len(chunks), dimensions), dtype=np.float32)
+            for row, chunk in enumerate(chunks):
+                if chunk.vector is not None:
+                    vectors[row] = chunk.vector
+            order = mmr_order(relevance, vectors, self.mmr_lambda, len(chunks))
+        else:
+            order = [int(index) for index in np.argsort(-relevance, kind="stable")]
+
+        # Each block: [source, text, tokens]
+        blocks = []
+        used_tokens = 0
+        used_chunks = 0
+        for index in order:
+            if used_chunks >= self.max_chunks:
+                break
+            chunk = chunks[index]
+            candidate_blocks = self._add_chunk(blocks, chunk, count_tokens)
+            tokens = sum(block[2] for block in candidate_blocks)
+            if tokens > self.token_budget:
+                continue
+            blocks = candidate_blocks
+            used_tokens = tokens
+            used_chunks += 1
+
+        logger.info(
+            f"Packed {used_chunks} of {len(chunks)} chunks into {len(blocks)} passages, {used_tokens} tokens"
+        )
+        return [text for _, text, _ in blocks]
+
+    def _add_chunk(self, blocks: list, chunk: ContextChunk, count_tokens) -> list:
+        """Blocks after adding a chunk, merged into any overlapping blocks of the same source."""
+        blocks = [list(block) for block in blocks]
+        text = chunk.text
+        position = None
+        while chunk.source is not None:
+            for i, (source, block_text, _) in enumerate(blocks):
+                joined = self._join(block_text, text) if source == chunk.source else None
+                if joined is not None:
+                    break
+            else:
+                break
+            text = joined
+            del blocks[i]
+            # A merged passage keeps the place of the earliest block it absorbed
+            position = i if position is None else min(position, i)
+        blocks.insert(len(blocks) if position is None else position, [chunk.source, text, count_tokens(text)])
+        return blocks
+
+    def _join(self, first: str, second: str) -> Optional[str]:
+        if second in first:
+            return first
+        if first in second:
+            return second
+        return merge_overlap(first, second, self.max_overlap)
@@ -1,14 +1,40 @@
+import multiprocessing
 import os
-from typing import List, Optional
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 import logging
 from dotenv import load_dotenv
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
 from openai import OpenAI
+from embedding_engine import EmbeddingEngine
+from embedding_cache import EmbeddingCache
+from embedding_config import EmbeddingConfig
+from answer_cache import SemanticAnswerCache
+from chunk_store import ChunkStore, open_chunk_store
+from context_builder import ContextBuilder, ContextChunk
+from index_config import IndexConfig
+from qdrant_config import QdrantClientConfig
+from ingest_manifest import (
+    IngestCheckpoint, IngestManifest, chunk_point_id, file_sha256, manifest_version, resolve_source
+)
+from ingest_pipeline import BackgroundUpserter, FileTracker, IngestCancelled, IngestProgress, batched
+from search_filter import SearchFilter
+from sparse_index import SparseIndex, reciprocal_rank_fusion
+from vector_store import VectorStore, make_vector_store
+from metrics import (
+    INGEST_ITEMS,
+    OPERATION_DURATION,
+    OPERATION_ERRORS,
+    SEARCH_RESULTS,
+    STAGE_DURATION,
+    record_usage,
+)
+
+if TYPE_CHECKING:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 # Load environment variables
 load_dotenv()
@@ -17,42 +43,461 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Embedding model and output size (EMBEDDING_MODEL, EMBEDDING_DIMENSIONS); the
+# collection is created with this size and refused at startup if it differs
+EMBEDDING_CONFIG = EmbeddingConfig.from_env()
+EMBEDDING_MODEL = EMBEDDING_CONFIG.model
+EMBEDDING_DIMENSIONS = EMBEDDING_CONFIG.dimensions
+CHAT_MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that answers questions based on the provided context. "
+    "If the context doesn't contain relevant information, say so."
+)
+
+# Embedding throughput knobs
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# Chunks embedded and upserted per ingest pipeline step; bounds peak memory
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "512"))
+# Files whose chunks fail to embed or upsert are retried one at a time, this many
+# times, after the rest of the run; the delay before each round doubles
+INGEST_FILE_RETRIES = int(os.getenv("INGEST_FILE_RETRIES", "2"))
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "5"))
+# Consecutive failed batches after which a run stops, e.g. while the embeddings
+# API is down; the next run resumes from the last upserted batch
+INGEST_FAILURE_LIMIT = int(os.getenv("INGEST_FAILURE_LIMIT", "3"))
+
+# Persistent embedding cache; set EMBEDDING_CACHE_PATH to an empty string to disable
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", str(Path(__file__).resolve().parent / "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+# Directory holding per-collection ingest manifests
+MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", str(Path(__file__).resolve().parent))
+
+# Qdrant server the document managers connect to, or ":memory:" for an in-process instance
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+
+# Vector store backend: "qdrant", or "numpy" for an in-process index under VECTOR_STORE_DIR
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant").lower()
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", str(Path(__file__).resolve().parent / "vector_store_data"))
+# Stored vector type: "float32", "float16" or "uint8"; fixed when the collection is created
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32").lower()
+
+# BM25 keyword index searched alongside the vector store; set SPARSE_INDEX_DIR
+# to an empty string to search by embedding only
+SPARSE_INDEX_DIR = os.getenv("SPARSE_INDEX_DIR", str(Path(__file__).resolve().parent))
+# Candidates taken from each retriever, per requested result, before rank fusion
+HYBRID_CANDIDATES_FACTOR = int(os.getenv("HYBRID_CANDIDATES_FACTOR", "4"))
+
+# Context packed into chat prompts: candidates retrieved per search, token
+# budget, chunk cap and MMR relevance/diversity trade-off (1.0 = relevance only)
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "5"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_SCORE_THRESHOLD = 0.1
+
+# What vector store points carry: "full" keeps chunk text and metadata in the
+# payload, "compact" keeps only source, page, offset and length, with the text
+# compressed in a local chunk store under CHUNK_STORE_DIR
+PAYLOAD_MODES = ("full", "compact")
+PAYLOAD_MODE = os.getenv("PAYLOAD_MODE", "full").lower()
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", str(Path(__file__).resolve().parent / "chunk_store_data"))
+
+# Completions in flight at once when answering a batch of questions
+BATCH_COMPLETION_CONCURRENCY = int(os.getenv("BATCH_COMPLETION_CONCURRENCY", "8"))
+
+# Semantic answer cache; set ANSWER_CACHE_MAX_ENTRIES=0 to disable
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Worker processes for parsing and splitting files; 0 or 1 parses in-process
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# How parse workers are started. Not "fork": the server forks them from a process with
+# threads (ingest jobs, HTTP clients), whose locks the children could inherit held
+PARSE_START_METHOD = os.getenv(
+    "PARSE_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def make_text_splitter() -> "RecursiveCharacterTextSplitter":
+    # langchain is only needed to ingest, so queries and process startup don't pay for importing it
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        # Records each chunk's offset in its page, kept by compact payloads
+        add_start_index=True,
+    )
+
+
+def iter_file_pages(file_path: str) -> Iterator:
+    """Lazily load a document, one page at a time for PDFs."""
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
+    if file_path.endswith('.pdf'):
+        loader = PyPDFLoader(file_path)
+    elif file_path.endswith('.txt'):
+        loader = TextLoader(file_path)
+    else:
+        logger.warning(f"Unsupported file type: {file_path}")
+        return
+    
+    try:
+        yield from loader.lazy_load()
+    except NotImplementedError:
+        yield from loader.load()
+
+
+def split_file(file_path: str, timings: Optional[dict] = None) -> Iterator:
+    """
+    Lazily load and split a file into chunks.
+    
+    Args:
+        file_path: File to load
+        timings: Optional dict that accumulates "parse" and "split" seconds
+    """
+    text_splitter = make_text_splitter()
+    timings = timings if timings is not None else {}
+    timings.setdefault("parse", 0.0)
+    timings.setdefault("split", 0.0)
+    pages = iter_file_pages(file_path)
+    while True:
+        start = time.perf_counter()
+        page = next(pages, None)
+        parsed = time.perf_counter()
+        timings["parse"] += parsed - start
+        if page is None:
+            return
+        chunks = text_splitter.split_documents([page])
+        timings["split"] += time.perf_counter() - parsed
+        yield from chunks
+
+
+def parse_and_split_file(file_path: str) -> Tuple[list, dict]:
+    """Process-pool entry point: parse and chunk one file in a worker."""
+    timings = {}
+    chunks = list(split_file(file_path, timings))
+    return chunks, timings
+
+
+def _observe_parse_timings(timings: dict):
+    STAGE_DURATION.observe(timings.get("parse", 0.0), stage="parse")
+    STAGE_DURATION.observe(timings.get("split", 0.0), stage="split")
+
+
+def build_messages(query: str, context: List[str]) -> List[dict]:
+    """Chat messages for answering a query from context documents."""
+    context_str = "\n".join(context)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context_str}\n\nQuestion: {query}"}
+    ]
+
+
+def make_answer_cache() -> Optional[SemanticAnswerCache]:
+    if ANSWER_CACHE_MAX_ENTRIES <= 0:
+        return None
+    return SemanticAnswerCache(
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl=ANSWER_CACHE_TTL,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    )
+
+
+def manifest_path(collection_name: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"ingest_manifest_{collection_name}.json")
+
+
+def checkpoint_path(collection_name: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"ingest_checkpoint_{collection_name}.jsonl")
+
+
+def make_sparse_index(collection_name: str, sparse_index_dir: Optional[str] = SPARSE_INDEX_DIR) -> Optional[SparseIndex]:
+    if not sparse_index_dir:
+        return None
+    return SparseIndex(os.path.join(sparse_index_dir, f"sparse_index_{collection_name}.sqlite3"))
+
+
+def make_chunk_store(
+    collection_name: str, payload_mode: str = PAYLOAD_MODE, chunk_store_dir: str = CHUNK_STORE_DIR
+) -> Optional[ChunkStore]:
+    """
+    Chunk text store of a collection; None in full payload mode.
+    
+    An existing store is opened in either mode, so points written in compact
+    mode keep their text until the collection is re-ingested.
+    """
+    if payload_mode not in PAYLOAD_MODES:
+        raise ValueError(f"payload mode must be one of {PAYLOAD_MODES}, got {payload_mode!r}")
+    path = os.path.join(chunk_store_dir, collection_name)
+    if payload_mode == "full" and not os.path.exists(path):
+        return None
+    return open_chunk_store(path)
+
+
+def compact_payload(payload: dict) -> dict:
+    """
+    Compact-mode payload for a full one: the document (source), page, and
+    the chunk's character offset and length within that page.
+    """
+    metadata = payload.get("metadata") or {}
+    compact = {
+        "metadata": {key: metadata[key] for key in ("source", "page") if key in metadata},
+        "length": len(payload["text"]),
+    }
+    if "start_index" in metadata:
+        compact["offset"] = metadata["start_index"]
+    return compact
+
+
+def attach_texts(hit_lists: List[list], chunk_store: Optional[ChunkStore]):
+    """Fill in the text of search hits whose compact payload has none, from the chunk store."""
+    missing = [hit for hits in hit_lists for hit in hits if "text" not in hit.payload]
+    if not missing:
+        return
+    texts = {}
+    if chunk_store is not None:
+        with STAGE_DURATION.time(stage="chunk_read"):
+            texts = chunk_store.get_many([hit.id for hit in missing])
+    for hit in missing:
+        text = texts.get(str(hit.id))
+        if text is None:
+            logger.error(f"No stored text for chunk {hit.id}")
+            text = ""
+        hit.payload = {**hit.payload, "text": text}
+
+
+def search_keywords(
+    sparse_index: SparseIndex, query: str, limit: int, search_filter: Optional[SearchFilter] = None
+) -> list:
+    """BM25 search that degrades to no keyword hits if the index fails."""
+    try:
+        with STAGE_DURATION.time(stage="sparse_search"):
+            return sparse_index.search(query, limit, search_filter)
+    except Exception as e:
+        logger.error(f"Error during keyword search: {str(e)}")
+        return []
+
+
+def rank_chunks(dense_hits: list, sparse_hits: Optional[list] = None) -> List[ContextChunk]:
+    """
+    Retrieval candidates as context chunks, best first.
+    
+    Dense-only results keep their cosine score as relevance. With keyword
+    hits, the two rankings are merged by reciprocal rank fusion and relevance
+    is the fused score relative to the best one. Keyword-only chunks have no
+    source or vector until filled in from the vector store.
+    """
+    chunks = {
+        str(hit.id): ContextChunk(
+            id=str(hit.id),
+            text=hit.payload["text"],
+            relevance=hit.score,
+            source=payload_source(hit.payload),
+            vector=hit.vector,
+        )
+        for hit in dense_hits
+    }
+    if sparse_hits is None:
+        return list(chunks.values())
+    for hit in sparse_hits:
+        chunks.setdefault(hit.id, ContextChunk(id=hit.id, text=hit.text, relevance=0.0))
+    fused = reciprocal_rank_fusion([
+        [str(hit.id) for hit in dense_hits],
+        [hit.id for hit in sparse_hits],
+    ])
+    if not fused:
+        return []
+    best = fused[0][1]
+    ranked = []
+    for point_id, score in fused:
+        chunk = chunks[point_id]
+        chunk.relevance = score / best
+        ranked.append(chunk)
+    return ranked
+
+
+def fill_chunks(chunks: List[ContextChunk], points: list):
+    """Set source and vector of keyword-only chunks from stored points."""
+    by_id = {str(point.id): point for point in points}
+    for chunk in chunks:
+        point = by_id.get(chunk.id)
+        if point is not None:
+            chunk.source = payload_source(point.payload)
+            chunk.vector = point.vector
+
+
+def payload_source(payload: Optional[dict]) -> Optional[str]:
+    return ((payload or {}).get("metadata") or {}).get("source")
+
+
+def make_context_builder() -> ContextBuilder:
+    return ContextBuilder(
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        max_chunks=CONTEXT_MAX_CHUNKS,
+        mmr_lambda=CONTEXT_MMR_LAMBDA,
+        model=CHAT_MODEL,
+        max_overlap=CHUNK_OVERLAP,
+    )
+
+
+def collection_version(collection_name: str) -> int:
+    """
+    Changes whenever files are added to or removed from the collection.
+    
+    Read from the ingest manifest's version counter, so this also notices
+    ingests run by other processes.
+    """
+    return manifest_version(manifest_path(collection_name))
+
+
+def _future_chunks(future) -> Iterator:
+    """Chunks of a worker result; re-raises the worker's error when iterated."""
+    chunks, timings = future.result()
+    _observe_parse_timings(timings)
+    yield from chunks
+
+
+def _timed_split_file(file_path: str) -> Iterator:
+    """In-process split_file that records parse/split stage timings when done."""
+    timings = {}
+    yield from split_file(file_path, timings)
+    _observe_parse_timings(timings)
+
+
 class DocumentManager:
-    def __init__(self, qdrant_url: str = "http://localhost:6333", collection_name: str = "documents"):
+    def __init__(
+        self,
+        qdrant_url: str = QDRANT_URL,
+        collection_name: str = "documents",
+        embedding_batch_size: int = EMBEDDING_BATCH_SIZE,
+        embedding_concurrency: int = EMBEDDING_CONCURRENCY,
+        embedding_cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        ingest_batch_size: int = INGEST_BATCH_SIZE,
+        file_retries: int = INGEST_FILE_RETRIES,
+        parse_workers: int = PARSE_WORKERS,
+        index_config: Optional[IndexConfig] = None,
+        client_config: Optional[QdrantClientConfig] = None,
+        vector_store: Optional[VectorStore] = None,
+        sparse_index_dir: Optional[str] = SPARSE_INDEX_DIR,
+        context_builder: Optional[ContextBuilder] = None,
+        payload_mode: str = PAYLOAD_MODE,
+        setup_collection: bool = True,
+    ):
         """
-        Initialize the DocumentManager with Qdrant and OpenAI clients.
+        Initialize the DocumentManager with a vector store and OpenAI clients.
+        
+        Constructing one makes no network calls except for the collection
+        setup, which can be deferred to an explicit setup() call.
         
         Args:
-            qdrant_url: URL of the Qdrant server
+            qdrant_url: URL of the Qdrant server, or ":memory:" for an in-process instance
             collection_name: Name of the collection to use in Qdrant
+            embedding_batch_size: Number of chunks sent per embeddings request
+            embedding_concurrency: Number of embeddings requests in flight at once
+            embedding_cache_path: SQLite file for cached embeddings, None or "" to disable
+            ingest_batch_size: Chunks embedded and upserted per ingest pipeline step
+            file_retries: Times a file whose chunks fail to embed or upsert is retried on its own
+            parse_workers: Worker processes for parsing and splitting, 0 or 1 to parse in-process
+            index_config: HNSW, quantization and search settings; read from the environment if None
+            client_config: Qdrant transport and upsert settings; read from the environment if None
+            vector_store: Store for chunk vectors; built from VECTOR_STORE if None
+            sparse_index_dir: Directory of the BM25 keyword index, None or "" for dense-only search
+            context_builder: Packs retrieved chunks into prompts; built from the CONTEXT_* settings if None
+            payload_mode: "full" to store chunk text in point payloads, "compact" to keep it in the chunk store
+            setup_collection: Create or check the collection now; if False, call setup() before use
         """
         self.qdrant_url = qdrant_url
         self.collection_name = collection_name
+        self.ingest_batch_size = ingest_batch_size
+        self.file_retries = file_retries
+        self.parse_workers = parse_workers
+        self.index_config = index_config or IndexConfig.from_env()
+        self.client_config = client_config or QdrantClientConfig.from_env()
         
         # Initialize clients
-        self.qdrant_client = QdrantClient(url=qdrant_url)
+        self.vector_store = vector_store or make_vector_store(
+            VECTOR_STORE,
+            collection_name=collection_name,
+            dimensions=EMBEDDING_DIMENSIONS,
+            index_config=self.index_config,
+            qdrant_url=qdrant_url,
+            numpy_dir=VECTOR_STORE_DIR,
+            dtype=VECTOR_DTYPE,
+            client_config=self.client_config,
+        )
         self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.embedding_model = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
+        self.embedding_cache = (
+            EmbeddingCache(embedding_cache_path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+            if embedding_cache_path else None
+        )
+        self.embedding_engine = EmbeddingEngine(
+            self.openai_client,
+            model=EMBEDDING_CONFIG.model,
+            dimensions=EMBEDDING_CONFIG.requested_dimensions,
+            batch_size=embedding_batch_size,
+            max_workers=embedding_concurrency,
+            cache=self.embedding_cache,
+        )
+        self.manifest = IngestManifest(manifest_path(collection_name))
+        self.checkpoint = IngestCheckpoint(checkpoint_path(collection_name))
+        self.payload_mode = payload_mode
+        self.chunk_store = make_chunk_store(collection_name, payload_mode)
+        self.sparse_index = make_sparse_index(collection_name, sparse_index_dir)
+        # Runs keyword searches while the calling thread does the vector search
+        self.search_executor = ThreadPoolExecutor(max_workers=4) if self.sparse_index is not None else None
+        self.context_builder = context_builder or make_context_builder()
+        self.answer_cache = make_answer_cache()
+        self._ready = False
+        self._setup_lock = threading.Lock()
         
-        # Setup Qdrant collection
-        self._setup_collection()
+        if setup_collection:
+            self.setup()
+    
+    def setup(self):
+        """Create or check the collection; safe to call repeatedly and from several threads."""
+        if self._ready:
+            return
+        with self._setup_lock:
+            if self._ready:
+                return
+            with STAGE_DURATION.time(stage="collection_setup"):
+                self._setup_collection()
+            self._ready = True
     
     def _setup_collection(self):
-        """Initialize Qdrant collection if it doesn't exist."""
-        try:
-            self.qdrant_client.get_collection(self.collection_name)
-        except Exception:
-            self.qdrant_client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=1536,  # OpenAI embedding dimension
-                    distance=models.Distance.COSINE
-                )
-            )
-            logger.info(f"Created new collection: {self.collection_name}")
+        """Initialize the collection if it doesn't exist."""
+        if self.vector_store.ensure_collection():
+            logger.info(f"Created new collection: {self.collection_name} ({self.index_config})")
+            # A fresh collection holds none of the files the manifest remembers
+            if self.manifest.files:
+                self.manifest.clear()
+            self.checkpoint.clear()
+            if self.sparse_index is not None:
+                self.sparse_index.clear()
+            if self.chunk_store is not None:
+                self.chunk_store.clear()
+        elif self.sparse_index is not None and self.sparse_index.needs_reindex and self.manifest.files:
+            # Collection ingested before the keyword index (or its source and
+            # page columns) existed; forget the manifest so the next ingest
+            # indexes every file (embeddings come from the cache)
+            logger.info("Keyword index is new or outdated, the next ingest will re-index all files")
+            self.manifest.clear()
+            self.checkpoint.clear()
     
     def load_documents(self, file_paths: List[str]) -> List[dict]:
         """Load documents from various file types."""
+        from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
         documents = []
         for file_path in file_paths:
             try:
@@ -72,19 +517,19 @@ class DocumentManager:
         
         return documents
     
+    def iter_documents(self, file_path: str) -> Iterator:
+        """Lazily load a document, one page at a time for PDFs."""
+        return iter_file_pages(file_path)
+    
     def process_documents(self, documents: List[dict]) -> List[dict]:
         """Split documents into chunks and convert to embeddings."""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
+        text_splitter = make_text_splitter()
         split_docs = text_splitter.split_documents(documents)
         logger.info(f"Split documents into {len(split_docs)} chunks")
         
         # Convert documents to embeddings
         texts = [doc.page_content for doc in split_docs]        
-        embeddings = self.embedding_model.embed_documents(texts)
+        embeddings = self.embedding_engine.embed(texts)
         
         # Combine embeddings with original documents
         for i, doc in enumerate(split_docs):
@@ -93,16 +538,29 @@ class DocumentManager:
         logger.info("Successfully combined embeddings with documents")
         return split_docs
     
-    def ingest_documents(self, upload_dir: str) -> bool:
+    def ingest_documents(self, upload_dir: str, progress: Optional[IngestProgress] = None) -> bool:
         """
         Ingest documents from a directory into Qdrant.
         
+        Only files that are new or changed since the last run are loaded and
+        embedded, and points belonging to removed files are deleted.
+        
         Args:
             upload_dir: Directory containing documents to ingest
+            progress: Optional progress counters; setting its cancel_event stops
+                the run at the next batch and raises IngestCancelled
             
         Returns:
-            bool: True if ingestion was successful, False otherwise
+            bool: True if every file was ingested; the files that weren't are
+                listed with their errors in progress.failed_files
         """
+        with OPERATION_DURATION.time(operation="ingest_documents"):
+            success = self._ingest_documents(upload_dir, progress)
+        if not success:
+            OPERATION_ERRORS.inc(operation="ingest_documents")
+        return success
+    
+    def _ingest_documents(self, upload_dir: str, progress: Optional[IngestProgress] = None) -> bool:
         if not os.path.exists(upload_dir):
             logger.error(f"Upload directory does not exist: {upload_dir}")
             return False
@@ -110,74 +568,41 @@ class DocumentManager:
         # Get list of files to process
         file_paths = []
         for ext in ['*.txt', '*.pdf']:
-            file_paths.extend(Path(upload_dir).glob(ext))
+            file_paths.extend(resolve_source(p) for p in Path(upload_dir).glob(ext))
+        file_paths.sort()
         
-        if not file_paths:
+        if not file_paths and not self.manifest.files and not self.checkpoint.sources():
             logger.warning(f"No .txt or .pdf files found in {upload_dir}")
             return False
         
+        progress = progress or IngestProgress()
         try:
-            # Load and process documents
-            logger.info(f"Found {len(file_paths)} files to process")
-            for file_path in file_paths:
-                logger.info(f"Processing file: {file_path}")
-            
-            documents = self.load_documents([str(p) for p in file_paths])
-            logger.info(f"Loaded {len(documents)} documents")
-            
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
+            diff = self.manifest.diff(file_paths)
+            logger.info(
+                f"Found {len(file_paths)} files: {len(diff.new)} new, {len(diff.changed)} changed, "
+                f"{len(diff.unchanged)} unchanged, {len(diff.removed)} removed"
             )
-            split_docs = text_splitter.split_documents(documents)
-            logger.info(f"Split into {len(split_docs)} chunks")
             
-            # Convert documents to embeddings
-            texts = [doc.page_content for doc in split_docs]
-            
-            # Generate embeddings directly with OpenAI API for more control
-            embeddings = []
-            for text in texts:
-                response = self.openai_client.embeddings.create(
-                    model="text-embedding-3-small",
-                    input=text
-                )
-                embeddings.append(response.data[0].embedding)
-                
-            logger.info(f"Generated {len(embeddings)} embeddings")
-            logger.info(f"First embedding size: {len(embeddings[0])}")
-            logger.info(f"First embedding sample: {embeddings[0][:5]}")
-            
-            # Prepare points for Qdrant
-            points = []
-            for i, (doc, embedding) in enumerate(zip(split_docs, embeddings)):
-                points.append(
-                    models.PointStruct(
-                        id=i,
-                        vector=embedding,  # Use the embedding directly
-                        payload={
-                            "text": doc.page_content,
-                            "metadata": doc.metadata
-                        }
-                    )
-                )
-        
-            
-            # Upload points to Qdrant
-            self.qdrant_client.upsert(
-                collection_name=self.collection_name,
-                points=points
-            )
-            logger.info(f"Successfully stored {len(points)} document chunks in Qdrant")
+            # Drop points of files that no longer exist, including files an
+            # interrupted run had started on
+            current = set(file_paths)
+            in_progress = self.checkpoint.sources()
+            abandoned = [source for source in in_progress
+                         if source not in current and source not in self.manifest.files]
+            for source in diff.removed + abandoned:
+                self._delete_source(source)
+                logger.info(f"Removed chunks of deleted file: {source}")
+            unchanged = set(diff.unchanged)
+            for source in in_progress:
+                if source in unchanged:
+                    self._discard_checkpoint(source)
+            self._ingest_sources(diff.new + diff.changed, diff.hashes, progress)
             
             # Verify ingestion with a test search
             test_query = "What is this document about?"
             test_embedding = self.get_embedding(test_query)
-            test_results = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=test_embedding,
+            test_results = self.vector_store.search(
+                test_embedding,
                 limit=1,
                 score_threshold=0.0  # No threshold for testing
             )
@@ -186,24 +611,452 @@ class DocumentManager:
                 logger.info("Test search successful")
                 logger.info(f"Found {len(test_results)} results")
                 logger.info(f"Top result score: {test_results[0].score}")
-            else:
+            elif self.manifest.files:
                 logger.error("Test search failed - no results found")
             
+            if progress.failed_files:
+                logger.error(
+                    f"{len(progress.failed_files)} files could not be ingested: "
+                    f"{', '.join(sorted(progress.failed_files))}"
+                )
+                return False
             return True
             
+        except IngestCancelled:
+            self.manifest.save()
+            logger.info("Document ingestion cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error during document ingestion: {str(e)}")
             return False
     
+    def ingest_file(
+        self, file_path: str, sha256: Optional[str] = None, progress: Optional[IngestProgress] = None
+    ) -> bool:
+        """
+        Ingest one new or changed file, e.g. right after it was uploaded.
+        
+        Unlike ingest_documents this neither lists nor hashes the rest of the
+        upload directory, so the cost depends only on the file.
+        
+        Args:
+            file_path: Path of a .txt or .pdf file
+            sha256: The file's content hash if already known, e.g. computed while it was uploaded
+            progress: Optional progress counters; setting its cancel_event stops the run
+            
+        Returns:
+            bool: True if the file was ingested or was already up to date
+        """
+        with OPERATION_DURATION.time(operation="ingest_file"):
+            success = self._ingest_file(file_path, sha256, progress)
+        if not success:
+            OPERATION_ERRORS.inc(operation="ingest_file")
+        return success
+    
+    def _ingest_file(self, file_path: str, sha256: Optional[str], progress: Optional[IngestProgress]) -> bool:
+        source = resolve_source(file_path)
+        if not os.path.isfile(source):
+            logger.error(f"File does not exist: {source}")
+            return False
+        
+        progress = progress or IngestProgress()
+        try:
+            sha256 = sha256 or file_sha256(source)
+            entry = self.manifest.files.get(source)
+            if entry is not None and entry["sha256"] == sha256:
+                logger.info(f"{source} is already ingested")
+                return True
+            self._ingest_sources([source], {source: sha256}, progress)
+            # A file that failed to parse is not recorded
+            return self.manifest.files.get(source, {}).get("sha256") == sha256
+        except IngestCancelled:
+            self.manifest.save()
+            logger.info(f"Ingestion of {source} cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error ingesting {source}: {str(e)}")
+            return False
+    
+    def find_duplicate(self, sha256: str, replacing: Optional[str] = None) -> Optional[str]:
+        """
+        Ingested source with this content hash, under any name.
+        
+        Args:
+            sha256: Content hash of a new file
+            replacing: Path of an existing file the new one is saved over. Only
+                that file counts as a duplicate then, so new content under an
+                existing name always replaces the old content.
+        """
+        if replacing is not None:
+            source = resolve_source(replacing)
+            entry = self.manifest.files.get(source)
+            return source if entry is not None and entry["sha256"] == sha256 else None
+        return self.manifest.find_by_hash(sha256)
+    
+    def _ingest_sources(self, sources: List[str], hashes: dict, progress: IngestProgress) -> int:
+        """
+        Run new or changed files through the ingest pipeline and record them in the manifest.
+        
+        A file whose chunks fail to embed or upsert doesn't stop the others;
+        such files are retried one at a time, up to file_retries times, once
+        the rest are done. Upserted batches are checkpointed, so a retry, or
+        the next run after a failure or cancellation, resumes each file from
+        its last upserted batch.
+        
+        Args:
+            sources: Absolute paths of the files
+            hashes: Content hashes already computed, keyed by source
+            progress: Progress counters and cancel event
+            
+        Returns:
+            Number of chunks upserted
+        """
+        progress.set_files_total(len(sources))
+        for source in sources:
+            if self.checkpoint.sha256(source) not in (None, hashes.get(source)):
+                # Batches of an older version of the file
+                self._discard_checkpoint(source)
+        
+        total_upserted, failed = self._ingest_pass(sources, hashes, progress)
+        for attempt in range(1, self.file_retries + 1):
+            if not failed:
+                break
+            delay = INGEST_RETRY_DELAY * 2 ** (attempt - 1)
+            logger.warning(
+                f"Retrying {len(failed)} failed files one at a time in {delay:.1f}s "
+                f"(attempt {attempt}/{self.file_retries})"
+            )
+            if progress.cancel_event.wait(delay):
+                raise IngestCancelled()
+            INGEST_ITEMS.inc(len(failed), item="files_retried")
+            retry, failed = failed, {}
+            for source in retry:
+                upserted, errors = self._ingest_pass([source], hashes, progress, count_files=False)
+                total_upserted += upserted
+                failed.update(errors)
+        for source, error in failed.items():
+            logger.error(f"Giving up on {source}, the next run resumes it: {error}")
+            progress.file_failed(source, error)
+            INGEST_ITEMS.inc(item="files_failed")
+        
+        self.manifest.save()
+        self.checkpoint.compact()
+        logger.info(f"Successfully stored {total_upserted} document chunks")
+        if self.chunk_store is not None:
+            self.chunk_store.compact()
+            logger.info(f"Chunk store stats: {self.chunk_store.stats()}")
+        if self.embedding_cache is not None:
+            logger.info(f"Embedding cache stats: {self.embedding_cache.stats()}")
+        return total_upserted
+    
+    def _ingest_pass(
+        self, sources: List[str], hashes: dict, progress: IngestProgress, count_files: bool = True
+    ) -> Tuple[int, Dict[str, str]]:
+        """
+        Load, split, embed and upsert the chunks of some files that aren't upserted yet.
+        
+        Raises the last error once INGEST_FAILURE_LIMIT batches in a row have failed.
+        
+        Returns:
+            Number of chunks upserted, and the error of each file whose chunks failed to embed or upsert
+        """
+        # load -> split -> embed -> upsert, one fixed-size batch at a time.
+        # Upserts run on a background thread and overlap with embedding the
+        # next batch; the bounded queue between them provides backpressure.
+        tracker = FileTracker()
+        failed: Dict[str, str] = {}
+        failed_lock = threading.Lock()
+        consecutive_failures = 0
+        total_upserted = 0
+        
+        def fail_batch(batch, error):
+            # Called on the upserter thread for failed upserts
+            nonlocal consecutive_failures
+            with failed_lock:
+                consecutive_failures += 1
+                new_failures = [source for source in {item[0] for item in batch} if source not in failed]
+                for source in new_failures:
+                    failed[source] = str(error)
+            for source in new_failures:
+                logger.error(f"Error ingesting {source}: {str(error)}")
+                tracker.fail(source)
+        
+        def upsert(batch):
+            ids = [point_id for _, point_id, _, _ in batch]
+            payloads = [payload for _, _, _, payload in batch]
+            if self.payload_mode == "compact":
+                # Texts first, so a search never finds a point without its text
+                with STAGE_DURATION.time(stage="chunk_write"):
+                    self.chunk_store.put(
+                        ids, [payload["text"] for payload in payloads], [source for source, _, _, _ in batch]
+                    )
+                payloads = [compact_payload(payload) for payload in payloads]
+            with STAGE_DURATION.time(stage="upsert"):
+                self.vector_store.upsert(
+                    ids=ids,
+                    vectors=[vector for _, _, vector, _ in batch],
+                    payloads=payloads
+                )
+            if self.sparse_index is not None:
+                with STAGE_DURATION.time(stage="sparse_index"):
+                    self.sparse_index.add(
+                        ids,
+                        [payload["text"] for _, _, _, payload in batch],
+                        [payload["metadata"] for _, _, _, payload in batch],
+                    )
+        
+        def on_upserted(batch):
+            nonlocal consecutive_failures, total_upserted
+            consecutive_failures = 0
+            total_upserted += len(batch)
+            # Checkpointed before the file can complete, so no upserted batch goes unrecorded
+            chunk_ids = defaultdict(list)
+            for source, point_id, _, _ in batch:
+                chunk_ids[source].append(point_id)
+            self.checkpoint.record_batch(chunk_ids, hashes)
+            tracker.batch_done(source for source, _, _, _ in batch)
+            progress.add_upserted(len(batch))
+            INGEST_ITEMS.inc(len(batch), item="chunks_upserted")
+        
+        upserter = BackgroundUpserter(upsert_fn=upsert, on_done=on_upserted, on_error=fail_batch)
+        chunks = self._iter_fresh_chunks(sources, tracker, progress, hashes, count_files)
+        try:
+            for batch in batched(chunks, self.ingest_batch_size):
+                progress.check_cancelled()
+                # Chunks of files that already failed in this pass wait for their retry
+                with failed_lock:
+                    batch = [item for item in batch if item[0] not in failed]
+                if not batch:
+                    continue
+                try:
+                    # Generate embeddings directly with OpenAI API in batched, concurrent requests
+                    with STAGE_DURATION.time(stage="embed"):
+                        embeddings = self.embedding_engine.embed([doc.page_content for _, _, doc in batch])
+                except Exception as e:
+                    fail_batch(batch, e)
+                    if consecutive_failures >= INGEST_FAILURE_LIMIT:
+                        raise
+                    continue
+                consecutive_failures = 0
+                progress.add_embedded(len(batch))
+                INGEST_ITEMS.inc(len(batch), item="chunks_embedded")
+                upserter.submit([
+                    (source, point_id, embedding, {
+                        "text": doc.page_content,
+                        "metadata": doc.metadata
+                    })
+                    for (source, point_id, doc), embedding in zip(batch, embeddings)
+                ])
+                self._finalize_files(tracker, hashes)
+                if consecutive_failures >= INGEST_FAILURE_LIMIT:
+                    raise RuntimeError(f"{consecutive_failures} batches in a row failed to upsert")
+        finally:
+            upserter.close()
+            self._finalize_files(tracker, hashes)
+        return total_upserted, failed
+    
+    def _iter_split_files(self, sources: List[str]) -> Iterator[Tuple[str, Iterable]]:
+        """
+        Parse and split files, in worker processes when parse_workers > 1.
+        
+        Files are submitted to the pool a few at a time and yielded as they
+        finish, so results stream back without queueing the whole corpus.
+        
+        Yields:
+            (source, chunks); iterating chunks raises if the file failed to load
+        """
+        if self.parse_workers <= 1 or len(sources) <= 1:
+            for source in sources:
+                yield source, _timed_split_file(source)
+            return
+        
+        # Workers import this module to run parse_and_split_file, which is why it is module-level
+        executor = ProcessPoolExecutor(
+            max_workers=self.parse_workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+        )
+        try:
+            remaining = iter(sources)
+            pending = {}
+            while True:
+                while len(pending) < self.parse_workers * 2:
+                    source = next(remaining, None)
+                    if source is None:
+                        break
+                    pending[executor.submit(parse_and_split_file, source)] = source
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), _future_chunks(future)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _iter_fresh_chunks(
+        self,
+        sources: List[str],
+        tracker: FileTracker,
+        progress: IngestProgress,
+        hashes: dict,
+        count_files: bool = True,
+    ) -> Iterator[tuple]:
+        """
+        Load and split files, yielding chunks that are not yet in Qdrant.
+        
+        Chunks in the manifest or upserted by an earlier, unfinished run of the
+        same file content count as already in Qdrant.
+        
+        Args:
+            sources: Absolute paths of the files
+            tracker: Tracks when each file's chunks are all upserted
+            progress: Progress counters
+            hashes: Content hashes, keyed by source
+            count_files: Whether to count the files as parsed, False when retrying them
+            
+        Yields:
+            (source, point_id, chunk) for every new or changed chunk
+        """
+        for source, chunks in self._iter_split_files(sources):
+            logger.info(f"Processing file: {source}")
+            tracker.start(source)
+            old_ids = set(self.manifest.chunk_ids(source))
+            resumed_ids = self.checkpoint.chunk_ids(source, hashes.get(source))
+            if resumed_ids:
+                logger.info(f"Resuming {source}, {len(resumed_ids)} chunks already upserted")
+                old_ids |= resumed_ids
+            index = 0
+            fresh_count = 0
+            try:
+                for doc in chunks:
+                    point_id = chunk_point_id(source, index, doc.page_content)
+                    index += 1
+                    fresh = point_id not in old_ids
+                    tracker.add_chunk(source, point_id, pending=fresh)
+                    if fresh:
+                        fresh_count += 1
+                        yield source, point_id, doc
+            except Exception as e:
+                logger.error(f"Error loading {source}: {str(e)}")
+                tracker.fail(source)
+                if count_files:
+                    progress.file_parsed(fresh_count)
+                progress.file_failed(source, f"Error loading file: {str(e)}")
+                INGEST_ITEMS.inc(item="files_failed")
+                continue
+            logger.info(f"Split {source} into {index} chunks")
+            tracker.finish_split(source)
+            if count_files:
+                progress.file_parsed(fresh_count)
+                INGEST_ITEMS.inc(item="files_parsed")
+    
+    def _finalize_files(self, tracker: FileTracker, hashes: dict):
+        """Record files whose chunks are all upserted and drop their stale points."""
+        completed = tracker.pop_completed()
+        for source in completed:
+            chunk_ids = tracker.chunk_ids.pop(source)
+            self._delete_points(set(self.manifest.chunk_ids(source)) - set(chunk_ids))
+            self.manifest.record(source, hashes.get(source), chunk_ids)
+            logger.info(f"Successfully loaded {source}")
+        # One save, and one version bump, for every file the batch completed
+        self.manifest.save()
+        # Only once the manifest is saved, so a crash in between resumes rather than re-embeds
+        self.checkpoint.forget(completed)
+    
+    def _discard_checkpoint(self, source: str):
+        """Delete points an unfinished run upserted for a file that aren't in its manifest entry."""
+        stale_ids = self.checkpoint.chunk_ids(source) - set(self.manifest.chunk_ids(source))
+        if stale_ids:
+            logger.info(f"Discarding {len(stale_ids)} chunks of an unfinished ingest of {source}")
+            self._delete_points(stale_ids)
+        self.checkpoint.forget([source])
+    
+    def _delete_points(self, point_ids):
+        """Delete points by ID from the collection."""
+        point_ids = list(point_ids)
+        if not point_ids:
+            return
+        self.vector_store.delete(point_ids)
+        if self.sparse_index is not None:
+            self.sparse_index.delete(point_ids)
+        if self.chunk_store is not None:
+            self.chunk_store.delete(point_ids)
+    
+    def _delete_source(self, source: str):
+        """Delete every point of a file by payload filter and forget the file."""
+        search_filter = SearchFilter(sources=[source])
+        self.vector_store.delete_by_filter(search_filter)
+        if self.sparse_index is not None:
+            self.sparse_index.delete_by_filter(search_filter)
+        if self.chunk_store is not None:
+            self.chunk_store.delete_source(source)
+        self.manifest.remove(source)
+        self.checkpoint.forget([source])
+    
+    def resolve_sources(self, names: List[str]) -> List[str]:
+        """
+        Ingested sources for file names or paths, e.g. from a chat request.
+        
+        Raises:
+            ValueError: If a name matches no ingested file
+        """
+        sources = []
+        for name in names:
+            matches = self.manifest.find(name)
+            if not matches:
+                raise ValueError(f"No ingested document named {name!r}")
+            sources.extend(source for source in matches if source not in sources)
+        return sources
+    
+    def delete_document(self, name: str) -> List[str]:
+        """
+        Remove one document's chunks without rebuilding the collection.
+        
+        Points are deleted by a filter on the indexed source field, so this
+        costs time proportional to the document, not the corpus. The file on
+        disk is left alone; delete it too or the next ingest adds it back.
+        
+        Args:
+            name: File name or path of an ingested document
+            
+        Returns:
+            Sources that were removed
+            
+        Raises:
+            ValueError: If no ingested document matches the name
+        """
+        with OPERATION_DURATION.time(operation="delete_document"):
+            sources = self.resolve_sources([name])
+            for source in sources:
+                self._delete_source(source)
+                logger.info(f"Deleted document: {source}")
+            # Saving the manifest also invalidates cached answers
+            self.manifest.save()
+            return sources
+    
+    def clear_collection(self):
+        """Drop and recreate the collection and forget every ingested file."""
+        self.vector_store.drop()
+        self.manifest.clear()
+        self.checkpoint.clear()
+        if self.sparse_index is not None:
+            self.sparse_index.clear()
+        if self.chunk_store is not None:
+            self.chunk_store.clear()
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate()
+        self._setup_collection()
+    
     def get_embedding(self, text: str) -> List[float]:
         """Get embedding for a text using OpenAI's API."""
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        with STAGE_DURATION.time(stage="query_embed"):
+            return self.embedding_engine.embed_one(text)
     
-    def get_relevant_documents(self, query: str, limit: int = 5, score_threshold: float = 0.1) -> List[str]:
+    def get_relevant_documents(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float = 0.1,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[str]:
         """
         Retrieve relevant documents from Qdrant based on the query.
         
@@ -211,67 +1064,341 @@ class DocumentManager:
             query: The search query
             limit: Maximum number of documents to return
             score_threshold: Minimum similarity score to consider a document relevant
+            search_filter: Optional restriction to some documents and/or pages
             
         Returns:
             List of relevant document texts
         """
-        logger.info(f"Searching for documents with query: {query}")
-        query_embedding = self.get_embedding(query)
+        with OPERATION_DURATION.time(operation="get_relevant_documents"):
+            logger.info(f"Searching for documents with query: {query}")
+            query_embedding = self.get_embedding(query)
+            return self._search_documents(
+                query_embedding, limit, score_threshold, query=query, search_filter=search_filter
+            )
+    
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in batched requests, using the embedding cache."""
+        with STAGE_DURATION.time(stage="query_embed"):
+            return self.embedding_engine.embed(texts)
+    
+    def get_relevant_documents_batch(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        score_threshold: float = 0.1,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[List[str]]:
+        """
+        Retrieve relevant documents for many queries at once.
         
-        # Get all points first to check what's available
-        all_points = self.qdrant_client.scroll(
-            collection_name=self.collection_name,
-            limit=10
-        )
-        logger.info(f"Total available points: {len(all_points[0])}")
-        if all_points[0]:
-            logger.info("Sample point content:")
-            logger.info(all_points[0][0].payload["text"][:200])
-        
-        # Use exact search with lower score threshold
-        search_results = self.qdrant_client.search(
-            collection_name=self.collection_name,
-            query_vector=query_embedding,
-            limit=limit,
-            score_threshold=score_threshold,
-            search_params=models.SearchParams(
-                exact=True,  # Use exact search
-                hnsw_ef=128  # Increase search accuracy
+        All queries are embedded in batched embeddings requests and searched
+        with one batched vector search.
+        
+        Args:
+            queries: The search queries
+            limit: Maximum number of documents to return per query
+            score_threshold: Minimum similarity score to consider a document relevant
+            search_filter: Optional restriction to some documents and/or pages, for every query
+            
+        Returns:
+            List of relevant document texts per query, in query order
+        """
+        with OPERATION_DURATION.time(operation="get_relevant_documents_batch"):
+            logger.info(f"Searching for documents with {len(queries)} queries")
+            embeddings = self.get_embeddings(queries)
+            hybrid = self.sparse_index is not None
+            candidates = limit * HYBRID_CANDIDATES_FACTOR if hybrid else limit
+            results = self._retrieve_batch(
+                embeddings, candidates, score_threshold, queries, search_filter=search_filter
             )
+            return [[chunk.text for chunk in chunks[:limit]] for chunks in results]
+    
+    def _search_documents(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        score_threshold: float = 0.1,
+        query: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[str]:
+        """Texts of the top `limit` chunks for an already computed query embedding."""
+        hybrid = query is not None and self.sparse_index is not None
+        candidates = limit * HYBRID_CANDIDATES_FACTOR if hybrid else limit
+        chunks = self._retrieve(query_embedding, candidates, score_threshold, query, search_filter=search_filter)
+        return [chunk.text for chunk in chunks[:limit]]
+    
+    def _build_context(
+        self, query_embedding: List[float], query: str, search_filter: Optional[SearchFilter] = None
+    ) -> List[str]:
+        """Retrieve candidates and pack them into the prompt context."""
+        return self._build_contexts([query_embedding], [query], search_filter)[0]
+    
+    def _build_contexts(
+        self,
+        query_embeddings: List[List[float]],
+        queries: List[str],
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[List[str]]:
+        chunk_lists = self._retrieve_batch(
+            query_embeddings, CONTEXT_CANDIDATES, CONTEXT_SCORE_THRESHOLD, queries,
+            with_vectors=True, search_filter=search_filter
         )
-
+        with STAGE_DURATION.time(stage="context"):
+            return [self.context_builder.build(chunks) for chunks in chunk_lists]
+    
+    def _retrieve(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        score_threshold: float,
+        query: Optional[str] = None,
+        with_vectors: bool = False,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[ContextChunk]:
+        """
+        Search with an already computed query embedding.
+        
+        When `query` is given and the keyword index is enabled, a BM25 search
+        runs in parallel with the vector search and the two rankings are
+        merged with reciprocal rank fusion. `limit` applies to each search and
+        `score_threshold` to the vector search only; `search_filter` to both.
+        
+        Returns:
+            Candidate chunks, best first; with_vectors includes their vectors
+        """
+        return self._retrieve_batch(
+            [query_embedding], limit, score_threshold, [query] if query is not None else None,
+            with_vectors, search_filter
+        )[0]
+    
+    def _retrieve_batch(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int,
+        score_threshold: float,
+        queries: Optional[List[str]] = None,
+        with_vectors: bool = False,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[List[ContextChunk]]:
+        """_retrieve for several queries, with one batched vector search."""
+        if not query_embeddings:
+            return []
+        hybrid = queries is not None and self.sparse_index is not None
+        if hybrid:
+            sparse_futures = [
+                self.search_executor.submit(search_keywords, self.sparse_index, query, limit, search_filter)
+                for query in queries
+            ]
+        with STAGE_DURATION.time(stage="search"):
+            batch_results = self.vector_store.search_batch(
+                query_embeddings, limit=limit, score_threshold=score_threshold,
+                with_vectors=with_vectors, search_filter=search_filter
+            )
+        for search_results in batch_results:
+            SEARCH_RESULTS.observe(len(search_results))
+        attach_texts(batch_results, self.chunk_store)
+        
         # Log search results for debugging
-        logger.info(f"Found {len(search_results)} results")
-        for i, hit in enumerate(search_results):
-            logger.info(f"Result {i+1}: Score={hit.score:.4f}")
-            logger.info(f"Content preview: {hit.payload['text'][:200]}...")
+        logger.info(f"Found {sum(len(results) for results in batch_results)} results for {len(batch_results)} queries")
+        for search_results in batch_results:
+            for i, hit in enumerate(search_results):
+                logger.debug(f"Result {i+1}: Score={hit.score:.4f}")
+                logger.debug(f"Content preview: {hit.payload['text'][:200]}...")
+        
+        if not hybrid:
+            return [rank_chunks(search_results) for search_results in batch_results]
         
-        # Return all results without additional filtering
-        return [hit.payload["text"] for hit in search_results]
+        chunk_lists = []
+        for search_results, sparse_future in zip(batch_results, sparse_futures):
+            sparse_results = sparse_future.result()
+            logger.info(f"Found {len(sparse_results)} keyword results")
+            chunk_lists.append(rank_chunks(search_results, sparse_results))
+        missing = list({chunk.id for chunks in chunk_lists for chunk in chunks if chunk.vector is None})
+        if with_vectors and missing:
+            points = self.vector_store.retrieve(missing, with_vectors=True)
+            for chunks in chunk_lists:
+                fill_chunks(chunks, points)
+        return chunk_lists
     
-    def generate_answer(self, query: str, context: Optional[List[str]] = None) -> str:
+    def generate_answer(
+        self, query: str, context: Optional[List[str]] = None, search_filter: Optional[SearchFilter] = None
+    ) -> str:
         """
         Generate an answer using OpenAI's API with the provided context.
         
         Args:
             query: The question to answer
             context: Optional list of context documents. If None, will search for relevant documents.
+            search_filter: Optional restriction of that search to some documents and/or pages
             
         Returns:
             Generated answer
         """
-        if context is None:
-            context = self.get_relevant_documents(query)
+        with OPERATION_DURATION.time(operation="generate_answer"):
+            cache_key = None
+            if context is None:
+                query_embedding = self.get_embedding(query)
+                cached, cache_key = self._lookup_answer(query_embedding, search_filter)
+                if cached is not None:
+                    return cached.answer
+                start = time.perf_counter()
+                context = self._build_context(query_embedding, query, search_filter)
+            
+            answer = self._complete(query, context)
+            
+            if cache_key is not None:
+                self.answer_cache.store(
+                    query_embedding, answer, context, time.perf_counter() - start, version=cache_key
+                )
+            return answer
+    
+    def _complete(self, query: str, context: List[str]) -> str:
+        with STAGE_DURATION.time(stage="completion"):
+            response = self.openai_client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=build_messages(query, context),
+                temperature=0.7
+            )
+        record_usage(CHAT_MODEL, response.usage)
+        return response.choices[0].message.content
+    
+    def generate_answers_batch(
+        self,
+        queries: List[str],
+        concurrency: int = BATCH_COMPLETION_CONCURRENCY,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[dict]:
+        """
+        Answer many questions, e.g. an evaluation set.
+        
+        Queries are embedded and searched in batches, then up to `concurrency`
+        completions run at once. A failed completion is reported in its
+        result instead of failing the whole batch.
+        
+        Args:
+            queries: The questions to answer
+            concurrency: Completions in flight at once, 1 to run them one by one
+            search_filter: Optional restriction to some documents and/or pages, for every query
+            
+        Returns:
+            One dict per query, in query order: {"query", "response", "context", "cached"},
+            or {"query", "error"} if answering it failed
+        """
+        with OPERATION_DURATION.time(operation="generate_answers_batch"):
+            embeddings = self.get_embeddings(queries)
+            results: List[Optional[dict]] = [None] * len(queries)
+            pending = []
+            versions = {}
+            for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+                cached, version = self._lookup_answer(embedding, search_filter)
+                if cached is not None:
+                    results[i] = {"query": query, "response": cached.answer, "context": cached.context, "cached": True}
+                else:
+                    pending.append(i)
+                    versions[i] = version
+            
+            start = time.perf_counter()
+            contexts = self._build_contexts(
+                [embeddings[i] for i in pending], [queries[i] for i in pending], search_filter
+            )
+            # Retrieval ran for the whole batch; charge each answer its share
+            retrieval_seconds = (time.perf_counter() - start) / max(len(pending), 1)
+            
+            def answer(i, context):
+                started = time.perf_counter()
+                response = self._complete(queries[i], context)
+                if versions[i] is not None:
+                    self.answer_cache.store(
+                        embeddings[i], response, context,
+                        retrieval_seconds + time.perf_counter() - started, version=versions[i]
+                    )
+                return response
+            
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                futures = [(i, context, executor.submit(answer, i, context)) for i, context in zip(pending, contexts)]
+                for i, context, future in futures:
+                    try:
+                        results[i] = {"query": queries[i], "response": future.result(), "context": context, "cached": False}
+                    except Exception as e:
+                        logger.error(f"Error answering query {i}: {str(e)}")
+                        OPERATION_ERRORS.inc(operation="generate_answers_batch")
+                        results[i] = {"query": queries[i], "error": str(e)}
+            return results
+    
+    def _lookup_answer(self, query_embedding: List[float], search_filter: Optional[SearchFilter] = None):
+        """
+        Check the semantic answer cache.
         
-        context_str = "\n".join(context)
+        Filtered questions bypass the cache: the same question scoped to
+        another document needs a different answer.
         
-        response = self.openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context. If the context doesn't contain relevant information, say so."},
-                {"role": "user", "content": f"Context:\n{context_str}\n\nQuestion: {query}"}
-            ],
-            temperature=0.7
+        Returns:
+            (cached answer or None, collection version to store a new answer under
+            or None when caching is disabled)
+        """
+        if self.answer_cache is None or (search_filter is not None and not search_filter.is_empty()):
+            return None, None
+        version = collection_version(self.collection_name)
+        cached = self.answer_cache.lookup(query_embedding, version=version)
+        if cached is not None:
+            logger.info(f"Answer cache hit, saved {cached.latency:.2f}s ({self.answer_cache.stats()})")
+        return cached, version
+    
+    def generate_answer_stream(
+        self, query: str, context: Optional[List[str]] = None, search_filter: Optional[SearchFilter] = None
+    ) -> Iterator[Tuple[str, dict]]:
+        """
+        Generate an answer, yielding retrieval results and then tokens as they arrive.
+        
+        Args:
+            query: The question to answer
+            context: Optional list of context documents. If None, will search for relevant documents.
+            search_filter: Optional restriction of that search to some documents and/or pages
+            
+        Yields:
+            (event, data) pairs: one "context" event with the retrieved documents,
+            a "token" event per generated text delta, then a "done" event with
+            the full answer
+        """
+        cache_key = None
+        if context is None:
+            query_embedding = self.get_embedding(query)
+            cached, cache_key = self._lookup_answer(query_embedding, search_filter)
+            if cached is not None:
+                yield "context", {"documents": cached.context}
+                yield "token", {"content": cached.answer}
+                yield "done", {"response": cached.answer, "cached": True}
+                return
+            start = time.perf_counter()
+            context = self._build_context(query_embedding, query, search_filter)
+        yield "context", {"documents": context}
+        
+        requested = time.perf_counter()
+        stream = self.openai_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=build_messages(query, context),
+            temperature=0.7,
+            stream=True
         )
         
-        return response.choices[0].message.content 
\ No newline at end of file
+        answer = []
+        # Time spent in the consumer while suspended at a yield isn't generation time
+        paused = 0.0
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not answer:
+                    STAGE_DURATION.observe(time.perf_counter() - requested, stage="completion_first_token")
+                answer.append(delta)
+                yielded = time.perf_counter()
+                yield "token", {"content": delta}
+                paused += time.perf_counter() - yielded
+        STAGE_DURATION.observe(time.perf_counter() - requested - paused, stage="completion_stream")
+        
+        if cache_key is not None:
+            self.answer_cache.store(
+                query_embedding, "".join(answer), context, time.perf_counter() - start, version=cache_key
+            )
+        yield "done", {"response": "".join(answer)}
@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from metrics import EMBEDDING_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_entries: int = 100_000):
+        """
+        On-disk, content-addressed embedding cache backed by SQLite.
+
+        Vectors are keyed by a hash of (model, text) and stored as packed
+        float32 blobs. When the cache grows past `max_entries`, the least
+        recently used entries are evicted, down to 90% of `max_entries` so
+        that evictions, and the row count they need, come in batches.
+
+        Args:
+            path: Path of the SQLite database file
+            max_entries: Maximum number of cached vectors
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        # Upper bound on the number of entries, so puts don't count the table; exact after an eviction
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content address of a text for a given model."""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached vectors.
+
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            Mapping of text to vector for every text found in the cache
+        """
+        keys = {self.make_key(model, text): text for text in texts}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(key_list), 500):
+                part = key_list[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = array("f", blob).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})",
+                        [time.time(), *part],
+                    )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        EMBEDDING_CACHE_LOOKUPS.inc(len(found), result="hit")
+        EMBEDDING_CACHE_LOOKUPS.inc(len(keys) - len(found), result="miss")
+        return found
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up a single cached vector."""
+        return self.get_many(model, [text]).get(text)
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """
+        Store vectors for texts and evict old entries if over capacity.
+
+        Args:
+            model: Embedding model name
+            items: Mapping of text to vector
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), array("f", vector).tobytes(), now)
+            for text, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+                )
+                # Replaced keys are counted too, which only makes the next count come sooner
+                self._count += len(rows)
+                if self._count > self.max_entries:
+                    self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        """Drop least recently used entries down to 90% of max_entries, if over max_entries."""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - (self.max_entries - self.max_entries // 10)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,),
+            )
+            logger.info(f"Evicted {excess} entries from embedding cache")
+            count -= excess
+        self._count = count
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self):
+        """Remove every cached vector."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
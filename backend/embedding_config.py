@@ -0,0 +1,68 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+# Output size of each embedding model when no dimensions are requested
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Models whose embeddings the API can shorten with the `dimensions` parameter
+REDUCIBLE_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+
+
+def cache_model_name(model: str, dimensions: Optional[int] = None) -> str:
+    """Model name embeddings are cached under; shortened embeddings are cached apart from full ones."""
+    return f"{model}@{dimensions}" if dimensions is not None else model
+
+
+@dataclass(frozen=True)
+class EmbeddingConfig:
+    """
+    Embedding model and output size, shared by ingestion, queries and the vector store.
+
+    text-embedding-3 models can return shorter embeddings through the API's
+    `dimensions` parameter; halving the size halves index memory and search
+    cost for a small loss in recall (see scripts/benchmark_dimensions.py).
+    """
+    model: str = "text-embedding-3-small"
+    dimensions: Optional[int] = None
+
+    def __post_init__(self):
+        native = NATIVE_DIMENSIONS.get(self.model)
+        if self.dimensions is None:
+            if native is None:
+                raise ValueError(f"Unknown native dimensions of {self.model}; set EMBEDDING_DIMENSIONS")
+            object.__setattr__(self, "dimensions", native)
+        if self.dimensions < 1:
+            raise ValueError(f"Embedding dimensions must be positive, got {self.dimensions}")
+        if native is not None and self.dimensions != native:
+            if self.model not in REDUCIBLE_MODELS:
+                raise ValueError(f"{self.model} only produces {native}-dimensional embeddings")
+            if self.dimensions > native:
+                raise ValueError(f"{self.model} produces at most {native} dimensions, got {self.dimensions}")
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingConfig":
+        dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+        return cls(
+            model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+            dimensions=int(dimensions) if dimensions else None,
+        )
+
+    @property
+    def requested_dimensions(self) -> Optional[int]:
+        """`dimensions` to send with embeddings requests; None at the model's native size."""
+        native = NATIVE_DIMENSIONS.get(self.model)
+        return self.dimensions if native is not None and self.dimensions != native else None
+
+    def request_kwargs(self) -> dict:
+        """Extra arguments for embeddings.create()."""
+        dimensions = self.requested_dimensions
+        return {"dimensions": dimensions} if dimensions is not None else {}
+
+    @property
+    def cache_model(self) -> str:
+        return cache_model_name(self.model, self.requested_dimensions)
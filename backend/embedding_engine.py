@@ -0,0 +1,144 @@
+import time
+import random
+import logging
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError
+from embedding_cache import EmbeddingCache
+from embedding_config import cache_model_name
+from metrics import record_usage
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: the request never produced a result, so resending the
+# same batch is safe and the output order is unaffected.
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError)
+
+
+class EmbeddingEngine:
+    def __init__(
+        self,
+        openai_client: OpenAI,
+        model: str = "text-embedding-3-small",
+        batch_size: int = 256,
+        max_workers: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        cache: Optional[EmbeddingCache] = None,
+        dimensions: Optional[int] = None,
+    ):
+        """
+        Generate embeddings in batched requests with a bounded worker pool.
+
+        Args:
+            openai_client: OpenAI client used for the embeddings endpoint
+            model: Embedding model name
+            batch_size: Number of texts sent in a single embeddings request
+            max_workers: Maximum number of batches in flight at once
+            max_retries: Retries per batch on rate-limit or transient errors
+            initial_backoff: First retry delay in seconds, doubled on each retry
+            max_backoff: Upper bound for a single retry delay in seconds
+            cache: Optional persistent cache consulted before calling the API
+            dimensions: Shortened output size requested from the API; None for the model's native size
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.openai_client = openai_client
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self.dimensions = dimensions
+        self.cache_model = cache_model_name(model, dimensions)
+        self._request_kwargs = {"dimensions": dimensions} if dimensions is not None else {}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts, preserving input order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding per input text, in the same order
+        """
+        if not texts:
+            return []
+
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        cached = self.cache.get_many(self.cache_model, texts)
+        # Embed each distinct missing text once, even if it repeats in the input
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+        if missing:
+            fresh = dict(zip(missing, self._embed_uncached(missing)))
+            self.cache.put_many(self.cache_model, fresh)
+            cached.update(fresh)
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} texts served from cache")
+        return [cached[text] for text in texts]
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text."""
+        if self.cache is not None:
+            return self.embed([text])[0]
+        return self._embed_batch([text])[0]
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts through the API in batches, preserving order."""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_workers == 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                # map() yields results in submission order, so chunk order is kept
+                results = list(executor.map(self._embed_batch, batches))
+
+        embeddings = [embedding for batch in results for embedding in batch]
+        logger.info(f"Embedded {len(embeddings)} texts in {len(batches)} batches")
+        return embeddings
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Send one embeddings request, retrying with exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                response = self.openai_client.embeddings.create(model=self.model, input=batch, **self._request_kwargs)
+                record_usage(self.model, response.usage)
+                # The API returns items tagged with their input index; sort to be safe
+                data = sorted(response.data, key=lambda item: item.index)
+                return [item.embedding for item in data]
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(
+                    f"Embedding batch of {len(batch)} failed ({type(e).__name__}), "
+                    f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+
+    def _backoff_delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Delay before the next retry, honouring a server Retry-After header."""
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+
+        delay = min(self.initial_backoff * (2 ** attempt), self.max_backoff)
+        # Jitter keeps concurrent workers from retrying in lockstep
+        return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,83 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from qdrant_client.http import models
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class IndexConfig:
+    """
+    HNSW and quantization settings for the Qdrant collection and its searches.
+
+    Index settings (hnsw_m, hnsw_ef_construct, quantization, on_disk) are applied when
+    the collection is created; search settings apply to every query.
+    """
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    search_ef: int = 128
+    exact: bool = False
+    quantization: str = "none"
+    quantization_always_ram: bool = True
+    rescore: bool = True
+    oversampling: float = 2.0
+    # Keep original vectors on disk, e.g. when searches run on quantized vectors in RAM
+    on_disk: bool = False
+
+    def __post_init__(self):
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization must be one of {QUANTIZATION_MODES}, got {self.quantization!r}")
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        return cls(
+            hnsw_m=int(os.getenv("QDRANT_HNSW_M", "16")),
+            hnsw_ef_construct=int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100")),
+            search_ef=int(os.getenv("QDRANT_SEARCH_EF", "128")),
+            exact=_env_bool("QDRANT_EXACT_SEARCH", False),
+            quantization=os.getenv("QDRANT_QUANTIZATION", "none").lower(),
+            quantization_always_ram=_env_bool("QDRANT_QUANTIZATION_ALWAYS_RAM", True),
+            rescore=_env_bool("QDRANT_QUANTIZATION_RESCORE", True),
+            oversampling=float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0")),
+            on_disk=_env_bool("QDRANT_ON_DISK_VECTORS", False),
+        )
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self) -> Optional[models.QuantizationConfig]:
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=self.quantization_always_ram,
+                )
+            )
+        if self.quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=self.quantization_always_ram)
+            )
+        return None
+
+    def search_params(self) -> models.SearchParams:
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(
+                rescore=self.rescore,
+                oversampling=self.oversampling,
+            )
+        return models.SearchParams(
+            hnsw_ef=self.search_ef,
+            exact=self.exact,
+            quantization=quantization,
+        )
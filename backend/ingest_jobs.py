@@ -0,0 +1,150 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from ingest_pipeline import IngestCancelled, IngestProgress
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+def _failure_message(progress: IngestProgress) -> str:
+    failed = progress.failed_files
+    if not failed:
+        return "Ingestion failed, see server logs"
+    names = sorted(os.path.basename(source) for source in failed)
+    listed = ", ".join(names[:10]) + (f" and {len(names) - 10} more" if len(names) > 10 else "")
+    return f"{len(names)} files could not be ingested: {listed}"
+
+
+class IngestJob:
+    def __init__(self, target: Callable[[IngestProgress], bool], description: str = ""):
+        """
+        A unit of ingestion work run by IngestJobRunner.
+
+        Args:
+            target: Called with the job's progress object; returns True on success
+            description: Human-readable summary shown in status responses
+        """
+        self.id = uuid.uuid4().hex
+        self.target = target
+        self.description = description
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.progress = IngestProgress()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def cancel(self) -> bool:
+        """Request cancellation; returns False if the job already finished."""
+        if self.status in FINISHED_STATUSES:
+            return False
+        self.progress.cancel_event.set()
+        if self.status == QUEUED:
+            self.status = CANCELLED
+            self.finished_at = time.time()
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress.to_dict(),
+        }
+
+
+class IngestJobRunner:
+    def __init__(self, max_finished_jobs: int = 100):
+        """
+        In-process background runner for ingestion jobs.
+
+        Jobs are executed one at a time, in submission order, on a single
+        daemon thread fed by a local queue, so no external broker is needed
+        and runs never race on the ingest manifest.
+
+        Args:
+            max_finished_jobs: Number of finished jobs kept for status queries
+        """
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: "queue.Queue[IngestJob]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, target: Callable[[IngestProgress], bool], description: str = "") -> IngestJob:
+        """Queue a job and start the worker thread if needed."""
+        job = IngestJob(target, description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ingest-jobs", daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        logger.info(f"Queued ingest job {job.id}: {description}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Under the lock, so the worker can't start the job between the check and the update
+            cancelled = job is not None and job.cancel()
+        if cancelled:
+            logger.info(f"Cancellation requested for ingest job {job_id}")
+        return job
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status == CANCELLED:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+            job.progress.started_at = job.started_at
+            try:
+                success = job.target(job.progress)
+                job.status = SUCCEEDED if success else FAILED
+                if not success:
+                    job.error = _failure_message(job.progress)
+            except IngestCancelled:
+                job.status = CANCELLED
+            except Exception as e:
+                logger.error(f"Ingest job {job.id} failed: {str(e)}")
+                job.status = FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+            logger.info(f"Ingest job {job.id} finished with status {job.status}")
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished_jobs."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+            del self._jobs[job_id]
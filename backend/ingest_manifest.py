@@ -0,0 +1,330 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Namespace for deterministic chunk point IDs
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c1b1e-8d3a-5c47-9a51-2f6f0e6a7b90")
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash a file's content without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_point_id(source: str, index: int, text: str) -> str:
+    """
+    Stable Qdrant point ID for a chunk.
+
+    The ID only changes when the chunk's source, position or content
+    changes, so re-ingesting an unchanged chunk overwrites the same point.
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}\0{index}\0{content_hash}"))
+
+
+@dataclass
+class ManifestDiff:
+    new: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # Content hashes computed while diffing, keyed by source
+    hashes: Dict[str, str] = field(default_factory=dict)
+
+
+class IngestManifest:
+    def __init__(self, path: str):
+        """
+        Record of ingested files and the point IDs created for them.
+
+        Each entry is keyed by the file's absolute path and stores its
+        content hash, mtime, size and chunk point IDs. The manifest also
+        stores a version counter, bumped by every save that adds or removes
+        files, which cached answers are checked against.
+
+        Args:
+            path: JSON file the manifest is persisted to
+        """
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        self.version = 0
+        # Whether there is anything to save, and whether it changes which files are ingested
+        self._dirty = False
+        self._modified = False
+        self.load()
+
+    def load(self):
+        self.files = {}
+        self.version = 0
+        self._dirty = self._modified = False
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.version = data.get("version", 0)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read ingest manifest {self.path}, starting fresh: {str(e)}")
+            self.files = {}
+
+    def save(self):
+        """
+        Write the manifest atomically so a crash never leaves it half-written.
+
+        Does nothing if the manifest hasn't changed since it was loaded or
+        last saved, so a run that ingests nothing doesn't bump the version.
+        """
+        if not self._dirty:
+            return
+        if self._modified:
+            self.version += 1
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.version, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = self._modified = False
+
+    def diff(self, file_paths: List[str]) -> ManifestDiff:
+        """
+        Compare files on disk against the manifest.
+
+        Files whose size and mtime match the manifest are assumed unchanged
+        without being hashed; otherwise the content hash decides.
+
+        Args:
+            file_paths: Absolute paths of the files currently on disk
+
+        Returns:
+            The files grouped into new, changed, unchanged and removed
+        """
+        result = ManifestDiff()
+        for source in file_paths:
+            stat = os.stat(source)
+            entry = self.files.get(source)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                result.unchanged.append(source)
+                continue
+
+            sha256 = file_sha256(source)
+            result.hashes[source] = sha256
+            if entry is None:
+                result.new.append(source)
+            elif entry["sha256"] == sha256:
+                # Touched but not modified; remember the new mtime
+                entry["mtime"] = stat.st_mtime
+                entry["size"] = stat.st_size
+                self._dirty = True
+                result.unchanged.append(source)
+            else:
+                result.changed.append(source)
+
+        current = set(file_paths)
+        result.removed = [source for source in self.files if source not in current]
+        return result
+
+    def chunk_ids(self, source: str) -> List[str]:
+        entry = self.files.get(source)
+        return list(entry["chunk_ids"]) if entry else []
+
+    def record(self, source: str, sha256: Optional[str], chunk_ids: List[str]):
+        """Record a fully ingested file."""
+        stat = os.stat(source)
+        self.files[source] = {
+            "sha256": sha256 or file_sha256(source),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunk_ids": chunk_ids,
+        }
+        self._dirty = self._modified = True
+
+    def find(self, name: str) -> List[str]:
+        """Ingested sources matching a path or a bare file name."""
+        if name in self.files:
+            return [name]
+        resolved = resolve_source(name)
+        if resolved in self.files:
+            return [resolved]
+        return [source for source in self.files if os.path.basename(source) == name]
+
+    def find_by_hash(self, sha256: str) -> Optional[str]:
+        """An ingested source whose content has this hash, whatever its name."""
+        for source, entry in self.files.items():
+            if entry["sha256"] == sha256:
+                return source
+        return None
+
+    def remove(self, source: str):
+        if self.files.pop(source, None) is not None:
+            self._dirty = self._modified = True
+
+    def clear(self):
+        self.files = {}
+        self._dirty = self._modified = True
+        self.save()
+
+
+# path -> (stat signature, version) of the manifests read by manifest_version()
+_versions: Dict[str, tuple] = {}
+_versions_lock = threading.Lock()
+
+
+def manifest_version(path: str) -> int:
+    """
+    Version counter of a saved manifest, 0 if there is none.
+
+    The file is only parsed again when it was replaced since the last call,
+    so this is cheap enough to call for every question, and still notices
+    saves by other processes.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _versions_lock:
+        cached = _versions.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        with open(path) as f:
+            version = json.load(f).get("version", 0)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read the version of ingest manifest {path}: {str(e)}")
+        return 0
+    with _versions_lock:
+        _versions[path] = (signature, version)
+    return version
+
+
+class IngestCheckpoint:
+    def __init__(self, path: str):
+        """
+        Durable record of chunk batches upserted for files not yet in the manifest.
+
+        The manifest only records a file once every chunk of it is upserted.
+        This log records each batch as it is upserted, so an ingest that fails
+        or is cancelled partway through a large file resumes from its last
+        upserted batch rather than from the start of the file. Each batch is
+        appended and fsynced, so the cost per batch doesn't grow with the log;
+        a line torn by a crash is skipped on load.
+
+        Args:
+            path: JSON-lines file the checkpoint is appended to
+        """
+        self.path = path
+        # source -> {"sha256": content hash the chunks were split from, "chunk_ids": set}
+        self.files: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        self.files = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        logger.warning(f"Skipping a damaged line of ingest checkpoint {self.path}")
+        except OSError as e:
+            logger.error(f"Could not read ingest checkpoint {self.path}, starting fresh: {str(e)}")
+            self.files = {}
+
+    def _apply(self, record: dict):
+        source = record["source"]
+        if record.get("done"):
+            self.files.pop(source, None)
+            return
+        entry = self.files.get(source)
+        if entry is None or entry["sha256"] != record["sha256"]:
+            entry = self.files[source] = {"sha256": record["sha256"], "chunk_ids": set()}
+        entry["chunk_ids"].update(record["chunk_ids"])
+
+    def _append(self, records: List[dict]):
+        with open(self.path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for record in records:
+            self._apply(record)
+
+    def record_batch(self, chunk_ids: Dict[str, List[str]], hashes: Dict[str, str]):
+        """
+        Record upserted chunks.
+
+        Args:
+            chunk_ids: Point IDs of the upserted chunks, keyed by source
+            hashes: Content hash of each source's file when it was split
+        """
+        with self._lock:
+            self._append([
+                {"source": source, "sha256": hashes.get(source), "chunk_ids": ids}
+                for source, ids in chunk_ids.items()
+            ])
+
+    def chunk_ids(self, source: str, sha256: Optional[str] = None) -> Set[str]:
+        """Chunks upserted for a file; with `sha256`, only if they were split from that content."""
+        with self._lock:
+            entry = self.files.get(source)
+            if entry is None or (sha256 is not None and entry["sha256"] != sha256):
+                return set()
+            return set(entry["chunk_ids"])
+
+    def sha256(self, source: str) -> Optional[str]:
+        with self._lock:
+            entry = self.files.get(source)
+            return entry["sha256"] if entry else None
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return list(self.files)
+
+    def forget(self, sources: Iterable[str]):
+        """Drop files that are now recorded in the manifest, or deleted."""
+        with self._lock:
+            records = [{"source": source, "done": True} for source in sources if source in self.files]
+            if records:
+                self._append(records)
+
+    def compact(self):
+        """Rewrite the log with only the files still in progress, or remove it if there are none."""
+        with self._lock:
+            if not self.files:
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                for source, entry in self.files.items():
+                    record = {"source": source, "sha256": entry["sha256"], "chunk_ids": sorted(entry["chunk_ids"])}
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.files = {}
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def resolve_source(path) -> str:
+    """Canonical manifest key for a file path."""
+    return str(Path(path).resolve())
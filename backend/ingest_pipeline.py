@@ -0,0 +1,223 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to `size` items without materialising the iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BackgroundUpserter:
+    def __init__(
+        self,
+        upsert_fn: Callable[[list], None],
+        on_done: Callable[[list], None],
+        max_pending: int = 2,
+        on_error: Optional[Callable[[list, Exception], None]] = None,
+    ):
+        """
+        Run upserts on a worker thread so they overlap with embedding the next batch.
+
+        `submit` blocks once `max_pending` batches are waiting, which keeps the
+        embedding stage from racing ahead and buffering the whole corpus.
+
+        Args:
+            upsert_fn: Called with each batch on the worker thread
+            on_done: Called with each batch after a successful upsert
+            max_pending: Maximum number of batches queued ahead of the worker
+            on_error: Called with a batch and the error if its upsert fails, after
+                which the worker goes on with the next batch; without it the first
+                error stops the worker and is raised by submit() and close()
+        """
+        self.upsert_fn = upsert_fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="qdrant-upserter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is not None:
+                # Drain remaining batches after a failure so submit() never blocks forever
+                continue
+            try:
+                self.upsert_fn(batch)
+            except Exception as e:
+                if self.on_error is None:
+                    self._error = e
+                    continue
+                try:
+                    self.on_error(batch, e)
+                except Exception as callback_error:
+                    self._error = callback_error
+                continue
+            try:
+                self.on_done(batch)
+            except Exception as e:
+                self._error = e
+
+    def submit(self, batch: list):
+        """Queue a batch, blocking while the worker is `max_pending` batches behind."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(batch)
+
+    def close(self):
+        """Wait for queued batches to finish and re-raise the first upsert error."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class FileTracker:
+    def __init__(self):
+        """
+        Track when every chunk of a file has been upserted.
+
+        A file is complete once it has been fully split and no batch holding
+        one of its chunks is still waiting to be upserted.
+        """
+        self._lock = threading.Lock()
+        self._pending: Counter = Counter()
+        self._split_done: Set[str] = set()
+        self._failed: Set[str] = set()
+        self._completed: List[str] = []
+        self.chunk_ids: Dict[str, List[str]] = {}
+
+    def start(self, source: str):
+        with self._lock:
+            self.chunk_ids[source] = []
+
+    def add_chunk(self, source: str, point_id: str, pending: bool):
+        """Register a chunk; `pending` chunks must be upserted before the file completes."""
+        with self._lock:
+            self.chunk_ids[source].append(point_id)
+            if pending:
+                self._pending[source] += 1
+
+    def finish_split(self, source: str):
+        with self._lock:
+            self._split_done.add(source)
+            self._maybe_complete(source)
+
+    def fail(self, source: str):
+        with self._lock:
+            self._failed.add(source)
+            self._split_done.discard(source)
+
+    def batch_done(self, sources: Iterable[str]):
+        """Mark one upserted chunk for each source in `sources`."""
+        with self._lock:
+            for source in sources:
+                self._pending[source] -= 1
+                self._maybe_complete(source)
+
+    def _maybe_complete(self, source: str):
+        if source in self._split_done and self._pending[source] <= 0 and source not in self._failed:
+            self._split_done.discard(source)
+            self._completed.append(source)
+
+    def pop_completed(self) -> List[str]:
+        with self._lock:
+            completed, self._completed = self._completed, []
+            return completed
+
+
+class IngestCancelled(Exception):
+    """Raised inside an ingest run when its job has been cancelled."""
+
+
+class IngestProgress:
+    def __init__(self, cancel_event: Optional[threading.Event] = None):
+        """
+        Thread-safe progress counters for one ingest run.
+
+        Args:
+            cancel_event: When set, the run stops at the next batch boundary
+        """
+        self._lock = threading.Lock()
+        self.cancel_event = cancel_event or threading.Event()
+        self.started_at = time.time()
+        self.files_total = 0
+        self.files_parsed = 0
+        self.files_failed = 0
+        # Error of each file that could not be ingested, keyed by source
+        self.failed_files: Dict[str, str] = {}
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.points_upserted = 0
+
+    def set_files_total(self, count: int):
+        with self._lock:
+            self.files_total = count
+
+    def file_parsed(self, chunks: int):
+        """Record a parsed file and the number of new chunks it produced."""
+        with self._lock:
+            self.files_parsed += 1
+            self.chunks_total += chunks
+
+    def file_failed(self, source: str, error: str):
+        """Record a file that failed to load, or whose chunks kept failing to embed or upsert."""
+        with self._lock:
+            if source not in self.failed_files:
+                self.files_failed += 1
+            self.failed_files[source] = error
+
+    def add_embedded(self, count: int):
+        with self._lock:
+            self.chunks_embedded += count
+
+    def add_upserted(self, count: int):
+        with self._lock:
+            self.points_upserted += count
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise IngestCancelled()
+
+    def to_dict(self) -> dict:
+        """Snapshot including throughput and a rough ETA."""
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            throughput = self.points_upserted / elapsed if elapsed > 0 else 0.0
+            # Until every file is parsed, extrapolate total chunks from the files seen so far
+            expected_chunks = self.chunks_total
+            if 0 < self.files_parsed < self.files_total:
+                expected_chunks = self.chunks_total * self.files_total / self.files_parsed
+            remaining = max(expected_chunks - self.points_upserted, 0)
+            eta = remaining / throughput if throughput > 0 else None
+            return {
+                "files_total": self.files_total,
+                "files_parsed": self.files_parsed,
+                "files_failed": self.files_failed,
+                "failed_files": [
+                    {"file": os.path.basename(source), "error": error}
+                    for source, error in self.failed_files.items()
+                ],
+                "chunks_total": self.chunks_total,
+                "chunks_embedded": self.chunks_embedded,
+                "points_upserted": self.points_upserted,
+                "elapsed_seconds": round(elapsed, 3),
+                "chunks_per_second": round(throughput, 2),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+            }
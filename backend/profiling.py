@@ -0,0 +1,236 @@
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from metrics import (
+    EMBEDDING_CACHE_LOOKUPS,
+    INGEST_ITEMS,
+    OPENAI_TOKENS,
+    OPERATION_DURATION,
+    OPERATION_ERRORS,
+    STAGE_DURATION,
+)
+
+# Counters reported by name, as deltas over the profiled run
+PROFILED_COUNTERS = {
+    "ingest_items": INGEST_ITEMS,
+    "openai_tokens": OPENAI_TOKENS,
+    "embedding_cache_lookups": EMBEDDING_CACHE_LOOKUPS,
+    "operation_errors": OPERATION_ERRORS,
+}
+
+
+def _histogram_delta(before: dict, after: dict) -> Dict[str, dict]:
+    """Seconds and calls per label value added between two Histogram snapshots, largest first."""
+    rows = {}
+    for key, (total, count) in after.items():
+        old_total, old_count = before.get(key, (0.0, 0))
+        if count > old_count:
+            rows[",".join(key)] = {"seconds": total - old_total, "calls": count - old_count}
+    return dict(sorted(rows.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+
+def _counter_delta(before: dict, after: dict) -> Dict[str, float]:
+    return {",".join(key): value - before.get(key, 0) for key, value in sorted(after.items())
+            if value != before.get(key, 0)}
+
+
+def _frame_label(code) -> str:
+    # ";" separates frames in the collapsed format and a trailing number is the sample count
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _is_idle_pool_worker(frames: list) -> bool:
+    """A thread-pool worker waiting for work rather than running a task."""
+    in_worker = running = False
+    for frame in frames:
+        if frame.f_code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py")):
+            in_worker |= frame.f_code.co_name == "_worker"
+            running |= frame.f_code.co_name == "run"
+    return in_worker and not running
+
+
+class RunProfiler:
+    def __init__(
+        self,
+        output_path: Optional[str] = None,
+        cprofile_path: Optional[str] = None,
+        stacks_path: Optional[str] = None,
+        sample_interval: float = 0.005,
+    ):
+        """
+        Profile a bulk run, e.g. an ingest or a batch of queries.
+
+        The stage breakdown is the difference in the pipeline's stage and
+        operation metrics over the run, so it costs nothing extra. Stages can
+        overlap (upserts run alongside embedding, parsing in worker processes),
+        so their shares of the wall time can add up to more than 100%.
+
+        Args:
+            output_path: JSON file for the stage breakdown, call counts and counters
+            cprofile_path: pstats file of cProfile stats for the calling thread and the
+                threads started during the run; worker processes are not included
+            stacks_path: Stacks of all threads sampled every sample_interval seconds, in
+                the collapsed format read by flamegraph.pl, inferno and speedscope
+            sample_interval: Seconds between stack samples
+        """
+        self.output_path = output_path
+        self.cprofile_path = cprofile_path
+        self.stacks_path = stacks_path
+        self.sample_interval = sample_interval
+        self.report: Optional[dict] = None
+        self._profiles: List[cProfile.Profile] = []
+        self._profiles_lock = threading.Lock()
+        self._stacks: Dict[str, int] = defaultdict(int)
+        self._samples = 0
+        self._stop_sampling = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self):
+        self._stages_before = STAGE_DURATION.snapshot()
+        self._operations_before = OPERATION_DURATION.snapshot()
+        self._counters_before = {name: counter.snapshot() for name, counter in PROFILED_COUNTERS.items()}
+        if self.stacks_path:
+            # Started first, so cProfile leaves the sampler out
+            self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        if self.cprofile_path:
+            if sys.version_info < (3, 12):
+                # cProfile only sees the thread that enabled it; give each new thread its own
+                threading.setprofile(self._profile_thread)
+            # From 3.12 cProfile hooks sys.monitoring, which covers every thread
+            self._profile_thread()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def _profile_thread(self, *args):
+        profile = cProfile.Profile()
+        with self._profiles_lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop_sampling.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                if _is_idle_pool_worker(frames):
+                    continue
+                # Pools are created per call, so number-free thread names keep their stacks together
+                thread_name = re.sub(r"\d+", "N", names.get(thread_id, "thread"))
+                stack = ";".join([thread_name] + [_frame_label(f.f_code) for f in reversed(frames)])
+                self._stacks[stack] += 1
+            self._samples += 1
+
+    def stop(self) -> dict:
+        """Stop profiling, write the requested files and return the stage breakdown."""
+        wall_seconds = time.perf_counter() - self._wall_start
+        cpu_seconds = time.process_time() - self._cpu_start
+        if self._sampler is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+        if self.cprofile_path:
+            threading.setprofile(None)
+            with self._profiles_lock:
+                profiles = list(self._profiles)
+            for profile in profiles:
+                profile.disable()
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(self.cprofile_path)
+            self._cprofile_stats = stats
+
+        stages = _histogram_delta(self._stages_before, STAGE_DURATION.snapshot())
+        operations = _histogram_delta(self._operations_before, OPERATION_DURATION.snapshot())
+        for rows in (stages, operations):
+            for row in rows.values():
+                row["mean_ms"] = row["seconds"] / row["calls"] * 1000
+                row["percent_of_wall"] = row["seconds"] / wall_seconds * 100 if wall_seconds else 0.0
+        self.report = {
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "stages": stages,
+            "operations": operations,
+            "counters": {
+                name: _counter_delta(self._counters_before[name], counter.snapshot())
+                for name, counter in PROFILED_COUNTERS.items()
+            },
+        }
+        if self.stacks_path:
+            self.report["stack_samples"] = self._samples
+            with open(self.stacks_path, "w") as f:
+                for stack, count in sorted(self._stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        if self.output_path:
+            with open(self.output_path, "w") as f:
+                json.dump(self.report, f, indent=2)
+        return self.report
+
+    def format_report(self, top_functions: int = 15) -> str:
+        """The stage breakdown as a table, plus the most expensive functions if cProfile ran."""
+        report = self.report
+        lines = [f"Wall time {report['wall_seconds']:.2f}s, CPU time {report['cpu_seconds']:.2f}s"]
+        for title, rows in (("stage", report["stages"]), ("operation", report["operations"])):
+            if not rows:
+                continue
+            lines.append(f"\n{title:<30} {'calls':>7} {'seconds':>9} {'mean_ms':>9} {'% wall':>7}")
+            for name, row in rows.items():
+                lines.append(f"{name:<30} {row['calls']:>7} {row['seconds']:>9.3f} "
+                             f"{row['mean_ms']:>9.2f} {row['percent_of_wall']:>7.1f}")
+        for name, values in report["counters"].items():
+            if values:
+                lines.append(f"\n{name}: " + ", ".join(f"{key or 'total'}={value:g}" for key, value in values.items()))
+        if self.cprofile_path:
+            stream = io.StringIO()
+            self._cprofile_stats.stream = stream
+            self._cprofile_stats.sort_stats("tottime").print_stats(top_functions)
+            lines.append(f"\nTop {top_functions} functions by own time, all profiled threads:")
+            lines.append(stream.getvalue().split("\n\n", 1)[-1].rstrip())
+        written = [path for path in (self.output_path, self.cprofile_path, self.stacks_path) if path]
+        if written:
+            lines.append(f"\nWrote {', '.join(written)}")
+        return "\n".join(lines)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group(
+        "profiling",
+        "Set PARSE_WORKERS=0 to include PDF parsing and splitting in --cprofile and --stacks; "
+        "worker processes are not profiled."
+    )
+    group.add_argument("--profile", metavar="FILE",
+                       help="Print a per-stage timing breakdown with call counts and write it to FILE as JSON")
+    group.add_argument("--cprofile", metavar="FILE", help="Also write cProfile stats to FILE, for pstats or snakeviz")
+    group.add_argument("--stacks", metavar="FILE",
+                       help="Also write sampled stacks of all threads to FILE in collapsed format, "
+                            "for flamegraph.pl, inferno or speedscope")
+    group.add_argument("--sample-interval", type=float, default=0.005, help="Seconds between stack samples")
+
+
+def profiler_from_args(args) -> Optional[RunProfiler]:
+    """A RunProfiler for the parsed arguments, or None if no profiling was asked for."""
+    if not (args.profile or args.cprofile or args.stacks):
+        return None
+    return RunProfiler(args.profile, args.cprofile, args.stacks, args.sample_interval)
@@ -0,0 +1,76 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from index_config import _env_bool
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+@dataclass
+class QdrantClientConfig:
+    """
+    Transport and bulk upload settings for Qdrant clients.
+
+    Transport settings only apply to a Qdrant server, not to the in-process
+    ":memory:" instance. Unset values keep qdrant-client's defaults, which
+    for REST to localhost means a new connection per request.
+    """
+    prefer_grpc: bool = False
+    grpc_port: int = 6334
+    # Seconds per request; qdrant-client rounds up to whole seconds
+    timeout: Optional[int] = None
+    # Pooled keep-alive REST connections; gRPC multiplexes one channel instead
+    pool_size: Optional[int] = None
+    # Points per upsert request, and requests in flight at once
+    upsert_batch_size: int = 256
+    upsert_parallel: int = 4
+    # Wait for each upsert to be applied, rather than only written to the WAL
+    upsert_wait: bool = True
+
+    def __post_init__(self):
+        if self.upsert_batch_size < 1 or self.upsert_parallel < 1:
+            raise ValueError("upsert_batch_size and upsert_parallel must be at least 1")
+
+    @classmethod
+    def from_env(cls) -> "QdrantClientConfig":
+        return cls(
+            prefer_grpc=_env_bool("QDRANT_PREFER_GRPC", False),
+            grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+            timeout=_env_int("QDRANT_TIMEOUT"),
+            pool_size=_env_int("QDRANT_POOL_SIZE"),
+            upsert_batch_size=int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256")),
+            upsert_parallel=int(os.getenv("QDRANT_UPSERT_PARALLEL", "4")),
+            upsert_wait=_env_bool("QDRANT_UPSERT_WAIT", True),
+        )
+
+    def client_kwargs(self, location: str) -> dict:
+        """Keyword arguments for QdrantClient/AsyncQdrantClient at `location`."""
+        if location == ":memory:":
+            return {"location": location}
+        kwargs = {
+            "location": location,
+            "prefer_grpc": self.prefer_grpc,
+            "grpc_port": self.grpc_port,
+            "timeout": self.timeout,
+        }
+        if self.pool_size is not None:
+            import httpx
+
+            kwargs["limits"] = httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            )
+        return kwargs
+
+
+def make_client(location: str, config: Optional[QdrantClientConfig] = None) -> QdrantClient:
+    return QdrantClient(**(config or QdrantClientConfig()).client_kwargs(location))
+
+
+def make_async_client(location: str, config: Optional[QdrantClientConfig] = None) -> AsyncQdrantClient:
+    return AsyncQdrantClient(**(config or QdrantClientConfig()).client_kwargs(location))
@@ -0,0 +1,139 @@
+import argparse
+import itertools
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from openai import OpenAI
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from embedding_config import NATIVE_DIMENSIONS
+from embedding_engine import EmbeddingEngine
+from vector_store import VECTOR_DTYPES, NumpyVectorStore
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Clustered vectors whose variance decays along the dimensions.
+
+    text-embedding-3 models are trained so leading dimensions carry the most
+    information; a decaying spectrum gives truncation a similar recall curve,
+    unlike isotropic noise where every dimension matters equally.
+    """
+    rng = np.random.default_rng(seed)
+    spectrum = 1.0 / np.sqrt(np.arange(1, dim + 1))
+    centers = rng.normal(size=(clusters, dim)) * spectrum
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(count, dim)) * spectrum
+    return vectors.astype(np.float32)
+
+
+def embed_docs(docs_dir: str, model: str, queries: int, seed: int):
+    """Native-size embeddings of the chunks of a directory, and of some of their opening sentences as queries."""
+    from document_manager import split_file
+
+    texts = []
+    for path in sorted(Path(docs_dir).glob("*")):
+        if path.suffix in (".txt", ".pdf"):
+            texts.extend(doc.page_content for doc in split_file(str(path.resolve())))
+    if not texts:
+        raise SystemExit(f"No .txt or .pdf files in {docs_dir}")
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(texts), size=min(queries, len(texts)), replace=False)
+    questions = [texts[i].split(".")[0][:200] for i in picked]
+    engine = EmbeddingEngine(OpenAI(api_key=os.getenv("OPENAI_API_KEY")), model=model)
+    corpus = np.asarray(engine.embed(texts), dtype=np.float32)
+    return corpus, np.asarray(engine.embed(questions), dtype=np.float32)
+
+
+def shorten(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Truncate and renormalize, which is what the API's `dimensions` parameter
+    does to text-embedding-3 embeddings, so one native-size embedding run
+    covers every size.
+    """
+    vectors = vectors[:, :dimensions]
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ground_truth(corpus: np.ndarray, queries: np.ndarray, k: int) -> list:
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    scores = queries @ corpus.T
+    return [set(row.tolist()) for row in np.argpartition(-scores, k, axis=1)[:, :k]]
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: list, dtype: str, k: int) -> dict:
+    path = tempfile.mkdtemp()
+    try:
+        store = NumpyVectorStore(path, corpus.shape[1], initial_capacity=len(corpus), dtype=dtype)
+        store.ensure_collection()
+        for start in range(0, len(corpus), 4096):
+            ids = range(start, min(start + 4096, len(corpus)))
+            store.upsert(list(ids), corpus[start:start + 4096], [{} for _ in ids])
+        vector_bytes = sum(
+            os.path.getsize(os.path.join(path, name))
+            for name in (store.VECTORS_FILES[dtype], store.SCALES_FILE) if os.path.exists(os.path.join(path, name))
+        )
+        recalls = []
+        latencies = []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = store.search(query, k)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len({int(hit.id) for hit in hits} & expected) / k)
+        store.close()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    latencies.sort()
+    return {
+        "recall": statistics.mean(recalls),
+        "vector_bytes": vector_bytes,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall@k, vector memory and search latency of shortened embeddings and compact vector types, "
+                    "against exact search on full-size float32 embeddings"
+    )
+    parser.add_argument("--docs", help="Directory of .txt/.pdf files to embed (needs OPENAI_API_KEY); "
+                                       "synthetic vectors if omitted")
+    parser.add_argument("--model", default="text-embedding-3-small", choices=sorted(NATIVE_DIMENSIONS))
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[1536, 1024, 768, 512, 256])
+    parser.add_argument("--dtypes", nargs="+", choices=VECTOR_DTYPES, default=list(VECTOR_DTYPES))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    native = NATIVE_DIMENSIONS[args.model]
+    if args.docs:
+        corpus, queries = embed_docs(args.docs, args.model, args.queries, args.seed)
+    else:
+        corpus = make_vectors(args.points, native, args.clusters, args.seed)
+        queries = make_vectors(args.queries, native, args.clusters, args.seed + 1)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = ground_truth(corpus, queries, min(args.k, len(corpus) - 1))
+    print(f"{len(corpus)} points, {len(queries)} queries, {args.model} ({native} dimensions)\n")
+
+    print(f"{'dims':>5} {'dtype':>8} {'recall@k':>9} {'vectors_MB':>11} {'p50_ms':>7} {'p95_ms':>7}")
+    for dimensions, dtype in itertools.product(sorted(set(args.dimensions), reverse=True), args.dtypes):
+        if dimensions > native:
+            continue
+        result = evaluate(shorten(corpus, dimensions), shorten(queries, dimensions), truth, dtype, args.k)
+        print(f"{dimensions:>5} {dtype:>8} {result['recall']:>9.4f} {result['vector_bytes'] / 1e6:>11.1f} "
+              f"{result['p50_ms']:>7.2f} {result['p95_ms']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import time
+import sys
+from pathlib import Path
+
+from openai import OpenAI
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from embedding_engine import EmbeddingEngine
+from fake_openai_server import start_server
+
+
+def make_chunks(count: int, size: int = 1000):
+    """Synthetic chunks of roughly `size` characters."""
+    words = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+    chunks = []
+    for i in range(count):
+        text = f"chunk {i} "
+        j = i
+        while len(text) < size:
+            text += words[j % len(words)] + " "
+            j += 7
+        chunks.append(text[:size])
+    return chunks
+
+
+def run_serial(client: OpenAI, texts):
+    """The old ingest loop: one embeddings request per chunk."""
+    embeddings = []
+    for text in texts:
+        response = client.embeddings.create(model="text-embedding-3-small", input=text)
+        embeddings.append(response.data[0].embedding)
+    return embeddings
+
+
+def report(label: str, count: int, elapsed: float):
+    print(f"{label:<32} {count:>7} chunks  {elapsed:8.2f}s  {count / elapsed:10.1f} chunks/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput against a fake server")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--serial-chunks", type=int, default=200,
+                        help="Chunks for the serial baseline (it is slow, so it is sampled)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[64, 256])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--per-item-latency", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency, per_item_latency=args.per_item_latency)
+    client = OpenAI(api_key="fake", base_url=base_url)
+    texts = make_chunks(args.chunks)
+
+    try:
+        start = time.perf_counter()
+        run_serial(client, texts[:args.serial_chunks])
+        report("serial (1 chunk/request)", args.serial_chunks, time.perf_counter() - start)
+
+        for batch_size in args.batch_size:
+            for concurrency in args.concurrency:
+                engine = EmbeddingEngine(client, batch_size=batch_size, max_workers=concurrency)
+                start = time.perf_counter()
+                embeddings = engine.embed(texts)
+                elapsed = time.perf_counter() - start
+                assert len(embeddings) == len(texts)
+                report(f"batch={batch_size} concurrency={concurrency}", len(texts), elapsed)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import itertools
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from index_config import IndexConfig
+
+COLLECTION = "benchmark_index"
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ground_truth(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return top
+
+
+def wait_for_index(client: QdrantClient, timeout: float = 600.0):
+    """Block until the optimizer has finished building the index."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(COLLECTION)
+        if info.status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    raise TimeoutError("Index build did not finish in time")
+
+
+def build(client: QdrantClient, corpus: np.ndarray, config: IndexConfig) -> float:
+    client.recreate_collection(
+        collection_name=COLLECTION,
+        vectors_config=models.VectorParams(size=corpus.shape[1], distance=models.Distance.COSINE),
+        hnsw_config=config.hnsw_config(),
+        quantization_config=config.quantization_config(),
+    )
+    start = time.perf_counter()
+    client.upload_collection(
+        collection_name=COLLECTION,
+        vectors=corpus,
+        ids=list(range(len(corpus))),
+        batch_size=256,
+    )
+    wait_for_index(client)
+    return time.perf_counter() - start
+
+
+def evaluate(client: QdrantClient, queries: np.ndarray, truth: np.ndarray, config: IndexConfig, k: int):
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = client.search(
+            collection_name=COLLECTION,
+            query_vector=query.tolist(),
+            limit=k,
+            search_params=config.search_params(),
+        )
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({hit.id for hit in hits} & set(expected.tolist())) / k)
+    latencies.sort()
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    return statistics.mean(recalls), statistics.median(latencies), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency for Qdrant index settings")
+    parser.add_argument("--qdrant-url", default=":memory:",
+                        help='":memory:" for an in-process Qdrant, or a server URL')
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-construct", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--quantization", nargs="+", default=["none", "scalar", "binary"])
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    client = QdrantClient(location=args.qdrant_url)
+    if args.qdrant_url == ":memory:":
+        print("Note: in-memory Qdrant always searches exactly; HNSW and quantization settings only")
+        print("change latency/recall against a server (--qdrant-url http://localhost:6333).\n")
+
+    corpus = make_vectors(args.points, args.dim, args.clusters, args.seed)
+    queries = make_vectors(args.queries, args.dim, args.clusters, args.seed + 1)
+    truth = ground_truth(corpus, queries, args.k)
+
+    print(f"{'m':>4} {'ef_c':>5} {'quant':>7} {'build_s':>8} {'exact':>6} {'ef':>5} "
+          f"{'recall@k':>9} {'p50_ms':>8} {'p95_ms':>8}")
+    for m, ef_construct, quantization in itertools.product(args.m, args.ef_construct, args.quantization):
+        config = IndexConfig(hnsw_m=m, hnsw_ef_construct=ef_construct, quantization=quantization,
+                             oversampling=args.oversampling)
+        build_seconds = build(client, corpus, config)
+
+        runs = [(True, args.ef[0])] + [(False, ef) for ef in args.ef]
+        for exact, ef in runs:
+            config.exact = exact
+            config.search_ef = ef
+            recall, p50, p95 = evaluate(client, queries, truth, config, args.k)
+            print(f"{m:>4} {ef_construct:>5} {quantization:>7} {build_seconds:>8.1f} {str(exact):>6} {ef:>5} "
+                  f"{recall:>9.4f} {p50 * 1000:>8.2f} {p95 * 1000:>8.2f}")
+
+    client.delete_collection(COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import gc
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from chunk_store import CHUNK_CODECS, ChunkStore
+from document_manager import attach_texts, compact_payload, split_file
+from index_config import IndexConfig
+from vector_store import QdrantVectorStore
+
+COLLECTION = "benchmark_payloads"
+
+
+def make_payloads(count: int, size: int, seed: int) -> list:
+    """
+    Synthetic full-mode payloads shaped like PDF chunks.
+
+    Words are drawn from a Zipf distribution over a random vocabulary, so the
+    text compresses roughly like prose rather than like repeated filler.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("etaoinshrdlucmfwypvbgkjqxz"))
+    vocabulary = ["".join(rng.choice(letters, size=rng.integers(2, 10))) for _ in range(5000)]
+    payloads = []
+    for i in range(count):
+        words = []
+        length = 0
+        while length < size:
+            word = vocabulary[min(int(rng.zipf(1.3)) - 1, len(vocabulary) - 1)]
+            words.append(word)
+            length += len(word) + 1
+        page = i // 4
+        payloads.append({
+            "text": " ".join(words)[:size],
+            "metadata": {
+                "source": f"/srv/uploads/report-{i // 200:04d}.pdf",
+                "page": page % 50,
+                "start_index": (i % 4) * (size - 200),
+            },
+        })
+    return payloads
+
+
+def load_payloads(docs_dir: str) -> list:
+    """Full-mode payloads of the real .txt and .pdf files in a directory."""
+    payloads = []
+    for path in sorted(Path(docs_dir).glob("*")):
+        if path.suffix in (".txt", ".pdf"):
+            payloads.extend(
+                {"text": doc.page_content, "metadata": doc.metadata} for doc in split_file(str(path.resolve()))
+            )
+    return payloads
+
+
+def server_memory_bytes(qdrant_url: str):
+    """Resident memory reported by a Qdrant server's /metrics, or None if unavailable."""
+    try:
+        with urllib.request.urlopen(f"{qdrant_url.rstrip('/')}/metrics", timeout=5) as response:
+            for line in response.read().decode().splitlines():
+                if line.startswith("memory_resident_bytes "):
+                    return float(line.split()[1])
+    except Exception:
+        pass
+    return None
+
+
+def run(mode: str, args, payloads: list, vectors: np.ndarray, queries: np.ndarray) -> dict:
+    local = args.qdrant_url == ":memory:"
+    store = QdrantVectorStore(
+        QdrantClient(location=args.qdrant_url), COLLECTION, vectors.shape[1], IndexConfig(exact=local)
+    )
+    store.drop()
+    store.ensure_collection()
+    chunk_dir = tempfile.mkdtemp()
+    chunk_store = ChunkStore(chunk_dir, codec=args.codec) if mode == "compact" else None
+    ids = list(range(len(payloads)))
+
+    if chunk_store is not None:
+        chunk_store.put(ids, [payload["text"] for payload in payloads],
+                        [payload["metadata"]["source"] for payload in payloads])
+
+    memory_before = None if local else server_memory_bytes(args.qdrant_url)
+    if local:
+        tracemalloc.start()
+    # Fresh copies, so the in-process Qdrant's share of them is counted and ours is freed below
+    if chunk_store is not None:
+        stored = [compact_payload(payload) for payload in payloads]
+    else:
+        stored = [json.loads(json.dumps(payload)) for payload in payloads]
+    payload_bytes = sum(len(json.dumps(payload)) for payload in stored)
+    for i in range(0, len(ids), 256):
+        store.upsert(ids[i:i + 256], vectors[i:i + 256], stored[i:i + 256])
+    del stored
+    if local:
+        gc.collect()
+        memory_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        after = server_memory_bytes(args.qdrant_url)
+        memory_bytes = after - memory_before if after is not None and memory_before is not None else None
+
+    latencies = []
+    response_bytes = []
+    for query in queries:
+        # What a search response carries, as JSON
+        hits = store.client.search(COLLECTION, query_vector=query.tolist(), limit=args.k, with_payload=True)
+        response_bytes.append(len(json.dumps([hit.model_dump() for hit in hits])))
+        # Search latency including reading the texts back in compact mode
+        start = time.perf_counter()
+        results = store.search(query, args.k)
+        attach_texts([results], chunk_store)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    result = {
+        "mode": mode,
+        "payload_bytes": payload_bytes,
+        "memory_bytes": memory_bytes,
+        "response_bytes": statistics.mean(response_bytes),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000,
+        "chunk_store_bytes": chunk_store.stats()["file_bytes"] if chunk_store is not None else 0,
+    }
+    store.drop()
+    if chunk_store is not None:
+        chunk_store.close()
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Qdrant payload size, memory and search response size, full vs compact payloads"
+    )
+    parser.add_argument("--qdrant-url", default=":memory:",
+                        help='":memory:" for an in-process Qdrant, or a server URL')
+    parser.add_argument("--docs", help="Directory of .txt/.pdf files to chunk instead of a synthetic corpus")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--codec", choices=CHUNK_CODECS, help="Chunk store codec; zstd when installed")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.docs) if args.docs else make_payloads(args.chunks, args.chunk_size, args.seed)
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.normal(size=(len(payloads), args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    text_bytes = sum(len(payload["text"].encode("utf-8")) for payload in payloads)
+    print(f"{len(payloads)} chunks, {text_bytes / 1e6:.1f} MB of text, {vectors.nbytes / 1e6:.1f} MB of vectors")
+    if args.qdrant_url == ":memory:":
+        print("Note: memory is Python heap growth of the in-process Qdrant; pass --qdrant-url for a server.\n")
+
+    print(f"{'mode':>8} {'payload_MB':>11} {'memory_MB':>10} {'resp_KB':>8} {'store_MB':>9} {'p50_ms':>7} {'p95_ms':>7}")
+    for mode in ("full", "compact"):
+        result = run(mode, args, payloads, vectors, queries)
+        memory = f"{result['memory_bytes'] / 1e6:>10.1f}" if result["memory_bytes"] is not None else f"{'n/a':>10}"
+        print(f"{mode:>8} {result['payload_bytes'] / 1e6:>11.2f} {memory} {result['response_bytes'] / 1e3:>8.1f} "
+              f"{result['chunk_store_bytes'] / 1e6:>9.2f} {result['p50_ms']:>7.2f} {result['p95_ms']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
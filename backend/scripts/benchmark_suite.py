@@ -0,0 +1,395 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from fake_openai_server import start_server_process
+
+# Environment settings recorded with the results, so runs with different knobs aren't compared blindly
+SETTING_PREFIXES = (
+    "EMBEDDING_", "INGEST_", "PARSE_", "VECTOR_", "PAYLOAD_", "QDRANT_",
+    "CONTEXT_", "HYBRID_", "ANSWER_CACHE_", "BATCH_",
+)
+# Directories the benchmark points at its scratch directory
+SCRATCH_SETTINGS = (
+    "VECTOR_STORE_DIR", "SPARSE_INDEX_DIR", "INGEST_MANIFEST_DIR", "CHUNK_STORE_DIR", "EMBEDDING_CACHE_PATH",
+)
+# Metrics where a lower value is better; for the rest (throughput) higher is better
+LOWER_IS_BETTER = ("seconds", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "max_ms", "peak_rss_mb", "errors")
+
+SYLLABLES = "ka lo mi ne ru sa te vo zi pa do fe gu hi ja".split()
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_corpus(directory: str, files: int, file_kb: int, topics: int, seed: int) -> list:
+    """
+    Write `files` text files of about `file_kb` KB of generated sentences.
+
+    Each file is about one of `topics` topics, whose words make up most of
+    its sentences, so queries built from a file's sentences retrieve it and
+    its neighbours. The same arguments always produce the same corpus.
+
+    Returns:
+        One sentence per file, to build queries from
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(5000, rng)
+    topic_words = [rng.sample(vocabulary, 50) for _ in range(topics)]
+    sentences = []
+    for i in range(files):
+        words = topic_words[i % topics]
+        paragraphs = []
+        size = 0
+        while size < file_kb * 1024:
+            paragraph = []
+            for _ in range(rng.randint(3, 8)):
+                sentence = " ".join(
+                    rng.choice(words) if rng.random() < 0.6 else rng.choice(vocabulary)
+                    for _ in range(rng.randint(8, 20))
+                )
+                paragraph.append(sentence.capitalize() + ".")
+            paragraphs.append(" ".join(paragraph))
+            size += len(paragraphs[-1]) + 2
+        sentences.append(rng.choice(paragraph))
+        with open(os.path.join(directory, f"doc{i:05}.txt"), "w") as f:
+            f.write("\n\n".join(paragraphs))
+    return sentences
+
+
+def make_queries(sentences: list, count: int, seed) -> list:
+    rng = random.Random(seed)
+    return [
+        f"What about {' '.join(rng.choice(sentences).rstrip('.').split()[:8])}? ({i})"
+        for i in range(count)
+    ]
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter so the next reading covers one phase (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def process_peak_rss_mb() -> float:
+    """Peak resident memory since the process started."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory since the last reset_peak_rss(), or since the process started."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return process_peak_rss_mb()
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run_load(function, queries: list, concurrency: int, warmup: int = 5) -> dict:
+    """
+    Call `function` once per query, `concurrency` calls at a time.
+
+    Latency is measured per call, throughput over the whole run. Failed
+    calls are counted and left out of the latencies.
+    """
+    for query in queries[:warmup]:
+        function(f"warmup {query}")
+
+    errors = []
+
+    def one(query):
+        start = time.perf_counter()
+        try:
+            function(query)
+        except Exception as e:
+            errors.append(str(e))
+            return None
+        return time.perf_counter() - start
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [latency for latency in executor.map(one, queries) if latency is not None]
+    elapsed = time.perf_counter() - start
+    if errors:
+        logging.warning(f"{len(errors)} of {len(queries)} calls failed, first error: {errors[0]}")
+    latencies.sort()
+    result = {"concurrency": concurrency, "requests": len(queries), "errors": len(errors),
+              "seconds": elapsed, "qps": len(latencies) / elapsed}
+    if latencies:
+        result.update({
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+            "max_ms": latencies[-1] * 1000,
+        })
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def start_django_server():
+    """Serve the Django app from a thread, with threaded request handling like `runserver`."""
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class BenchmarkServer(ThreadedWSGIServer):
+        # Accept bursts of concurrent connections without resets
+        request_queue_size = 1024
+
+    server = BenchmarkServer(("127.0.0.1", 0), WSGIRequestHandler)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def git_commit() -> dict:
+    root = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                cwd=root, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit.stdout.strip(), "dirty": bool(status.stdout.strip())}
+
+
+def print_load(label: str, result: dict):
+    if "p50_ms" not in result:
+        print(f"{label:<24} {result['concurrency']:>5}  all {result['errors']} requests failed")
+        return
+    print(f"{label:<24} {result['concurrency']:>5} {result['qps']:>8.1f} {result['p50_ms']:>8.1f} "
+          f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6} {result['peak_rss_mb']:>8.0f}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """
+    Print each metric next to the baseline's and return the number of regressions.
+
+    A metric regressed if it is worse than the baseline by more than `threshold` (a fraction).
+    """
+    def rows():
+        for key in ("seconds", "chunks_per_s", "peak_rss_mb"):
+            yield "ingest", key, baseline.get("ingest", {}).get(key), results["ingest"].get(key)
+        for target, runs in results["queries"].items():
+            before = {run["concurrency"]: run for run in baseline.get("queries", {}).get(target, [])}
+            for run in runs:
+                old = before.get(run["concurrency"], {})
+                for key in ("qps", "p50_ms", "p95_ms", "p99_ms", "errors"):
+                    yield f"{target} c={run['concurrency']}", key, old.get(key), run.get(key)
+
+    commit = baseline.get("meta", {}).get("commit") or "unknown"
+    print(f"\nCompared with {commit[:12]} (regression threshold {threshold:.0%})")
+    for section in ("args", "settings"):
+        old = baseline.get("meta", {}).get(section, {})
+        new = results["meta"][section]
+        differing = [f"{key} {old.get(key)} -> {new.get(key)}"
+                     for key in sorted(set(old) | set(new)) if old.get(key) != new.get(key)]
+        if differing:
+            print(f"Note: the runs used different {section}: {', '.join(differing)}")
+    print(f"{'measurement':<34} {'metric':<13} {'baseline':>10} {'current':>10} {'change':>8}")
+    regressions = 0
+    for label, key, old, new in rows():
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = change > threshold if key in LOWER_IS_BETTER else change < -threshold
+        regressions += worse
+        print(f"{label:<34} {key:<13} {old:>10.1f} {new:>10.1f} {change:>+7.0%}{' !' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ingest throughput, peak memory and query latency of DocumentManager and the chat "
+                    "endpoint, against a fake OpenAI server and a local vector store"
+    )
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-kb", type=int, default=20, help="Approximate size of each generated file")
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200, help="Calls per target and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--targets", nargs="+", default=["get_relevant_documents", "generate_answer", "chat"],
+                        choices=["get_relevant_documents", "generate_answer", "chat"])
+    parser.add_argument("--vector-store", choices=["qdrant", "numpy"], default="qdrant")
+    parser.add_argument("--qdrant-url", default=":memory:",
+                        help="Qdrant server URL, or :memory: for an in-process instance")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Seconds per embeddings request")
+    parser.add_argument("--per-item-latency", type=float, default=0.0, help="Extra seconds per embedded text")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Seconds to the first chat token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between chat tokens")
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Keep the semantic answer cache on; off by default so every call does the full work")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change counted as a regression by --compare; exits with status 1 if any")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated corpus and indexes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    # The fake server runs in its own process so it doesn't compete with the code under test for the GIL
+    server, base_url = start_server_process(
+        latency=args.embedding_latency, per_item_latency=args.per_item_latency,
+        chat_latency=args.chat_latency, token_latency=args.token_latency, answer_tokens=args.answer_tokens,
+    )
+    scratch_dir = tempfile.mkdtemp(prefix="benchmark_suite_")
+    corpus_dir = os.path.join(scratch_dir, "corpus")
+    os.makedirs(corpus_dir)
+    # Settings are read when the modules are imported, so set them first
+    os.environ.update({
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": base_url,
+        "VECTOR_STORE": args.vector_store,
+        "QDRANT_URL": args.qdrant_url,
+        "UPLOAD_DIR": corpus_dir,
+        "DJANGO_SETTINGS_MODULE": "config.settings",
+    })
+    for name in SCRATCH_SETTINGS:
+        # A directory each: dropping the NumPy collection removes <VECTOR_STORE_DIR>/<collection>,
+        # which would also take the chunk store with it if they shared a root
+        os.environ[name] = os.path.join(scratch_dir, name.lower())
+        os.makedirs(os.environ[name])
+    # No persistent embedding cache, so every run embeds everything
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+
+    try:
+        start = time.perf_counter()
+        sentences = make_corpus(corpus_dir, args.files, args.file_kb, args.topics, args.seed)
+        corpus_bytes = sum(entry.stat().st_size for entry in os.scandir(corpus_dir))
+        print(f"Generated {args.files} files, {corpus_bytes / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+        import django
+        django.setup()
+        from api.managers import get_document_manager
+
+        # The manager the API serves from, so the chat endpoint searches the same corpus
+        start = time.perf_counter()
+        manager = get_document_manager()
+        startup_seconds = time.perf_counter() - start
+
+        reset_peak_rss()
+        start = time.perf_counter()
+        if not manager.ingest_documents(corpus_dir):
+            raise SystemExit("Ingestion failed, see the log")
+        seconds = time.perf_counter() - start
+        chunks = manager.vector_store.count()
+        ingest = {
+            "files": args.files,
+            "bytes": corpus_bytes,
+            "chunks": chunks,
+            "seconds": seconds,
+            "files_per_s": args.files / seconds,
+            "chunks_per_s": chunks / seconds,
+            "mb_per_s": corpus_bytes / 1e6 / seconds,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"Ingested {chunks} chunks in {seconds:.2f}s: {ingest['chunks_per_s']:.0f} chunks/s, "
+              f"{ingest['mb_per_s']:.2f} MB/s, peak RSS {ingest['peak_rss_mb']:.0f} MB\n")
+
+        targets = {
+            "get_relevant_documents": lambda query: manager.get_relevant_documents(query),
+            "generate_answer": lambda query: manager.generate_answer(query),
+        }
+        if "chat" in args.targets:
+            import httpx
+
+            django_server, django_url = start_django_server()
+            # After the server's app setup, which configures Django's logging
+            logging.getLogger("django.server").setLevel(logging.ERROR)
+            http = httpx.Client(timeout=120, limits=httpx.Limits(
+                max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency)
+            ))
+            targets["chat"] = lambda query: http.post(
+                f"{django_url}/api/chat/", json={"message": query}
+            ).raise_for_status()
+
+        queries = {}
+        print(f"{'target':<24} {'conc':>5} {'qps':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} "
+              f"{'errors':>6} {'rss_MB':>8}")
+        for target in args.targets:
+            queries[target] = []
+            for concurrency in args.concurrency:
+                # Fresh questions per run, so nothing is answered from an earlier run's caches
+                questions = make_queries(sentences, args.queries, f"{args.seed}-{target}-{concurrency}")
+                result = run_load(targets[target], questions, concurrency)
+                queries[target].append(result)
+                print_load(target, result)
+        if "chat" in args.targets:
+            http.close()
+            django_server.shutdown()
+
+        results = {
+            "meta": {
+                **git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "args": {key: value for key, value in vars(args).items()
+                         if key not in ("output", "compare", "threshold", "keep")},
+                "settings": {name: value for name, value in sorted(os.environ.items())
+                             if name.startswith(SETTING_PREFIXES) and name not in SCRATCH_SETTINGS},
+                "startup_seconds": startup_seconds,
+            },
+            "ingest": ingest,
+            "queries": queries,
+            "peak_rss_mb": process_peak_rss_mb(),
+        }
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"\nResults written to {args.output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare(results, json.load(f), args.threshold)
+            if regressions:
+                print(f"\n{regressions} metrics regressed by more than {args.threshold:.0%}")
+                sys.exit(1)
+    finally:
+        server.terminate()
+        if args.keep:
+            print(f"Corpus and indexes kept in {scratch_dir}")
+        else:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import itertools
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from index_config import IndexConfig
+from qdrant_config import QdrantClientConfig, make_client
+from vector_store import QdrantVectorStore
+
+COLLECTION = "benchmark_transport"
+
+
+def make_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def bench_upsert(store: QdrantVectorStore, vectors: np.ndarray) -> float:
+    """Points per second for one bulk upsert of the whole corpus into a fresh collection."""
+    store.drop()
+    store.ensure_collection()
+    payloads = [{"text": f"chunk {i}", "metadata": {"source": f"doc{i // 100}.pdf", "page": i % 50}}
+                for i in range(len(vectors))]
+    start = time.perf_counter()
+    store.upsert(list(range(len(vectors))), vectors, payloads)
+    if not store.client_config.upsert_wait:
+        # Without wait the call returns once the points are queued; count until they are all applied
+        while store.count() < len(vectors):
+            time.sleep(0.01)
+    return len(vectors) / (time.perf_counter() - start)
+
+
+def bench_search(store: QdrantVectorStore, queries: np.ndarray, k: int, concurrency: int) -> dict:
+    """Per-query latency and throughput with `concurrency` queries in flight."""
+    def search(query):
+        start = time.perf_counter()
+        store.search(query, k)
+        return time.perf_counter() - start
+
+    for query in queries[:10]:
+        search(query)
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [search(query) for query in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(search, queries))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "qps": len(latencies) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Qdrant search latency and bulk upsert throughput, REST vs gRPC"
+    )
+    parser.add_argument("--qdrant-url", default="http://localhost:6333",
+                        help="Qdrant server URL; gRPC uses --grpc-port on the same host")
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--transports", nargs="+", choices=["rest", "grpc"], default=["rest", "grpc"])
+    parser.add_argument("--pool-size", type=int, nargs="+", default=[0, 16],
+                        help="REST keep-alive pool sizes; 0 for qdrant-client's default")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--parallel", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--wait", choices=["true", "false", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.qdrant_url == ":memory:":
+        print("Note: the in-process Qdrant has no transport; use a server to compare REST and gRPC.\n")
+    vectors = make_vectors(args.points, args.dim, args.seed)
+    queries = make_vectors(args.queries, args.dim, args.seed + 1)
+    waits = {"true": [True], "false": [False], "both": [True, False]}[args.wait]
+
+    for transport in args.transports:
+        # gRPC multiplexes requests over one channel, so the REST pool size doesn't apply
+        pool_sizes = args.pool_size if transport == "rest" else [0]
+        for pool_size in pool_sizes:
+            base = QdrantClientConfig(
+                prefer_grpc=transport == "grpc",
+                grpc_port=args.grpc_port,
+                timeout=args.timeout,
+                pool_size=pool_size or None,
+            )
+            label = f"{transport}" + (f" pool={pool_size}" if transport == "rest" else "")
+            client = make_client(args.qdrant_url, base)
+
+            print(f"== {label}: bulk upsert of {args.points} x {args.dim}")
+            print(f"{'batch':>6} {'parallel':>9} {'wait':>6} {'points/s':>10}")
+            for batch_size, parallel, wait in itertools.product(args.batch_size, args.parallel, waits):
+                config = replace(base, upsert_batch_size=batch_size, upsert_parallel=parallel, upsert_wait=wait)
+                store = QdrantVectorStore(client, COLLECTION, args.dim, IndexConfig(), config)
+                rate = bench_upsert(store, vectors)
+                print(f"{batch_size:>6} {parallel:>9} {str(wait):>6} {rate:>10.0f}")
+
+            print(f"\n== {label}: search of {args.points} points, k={args.k}")
+            print(f"{'concurrency':>11} {'p50_ms':>8} {'p95_ms':>8} {'qps':>8}")
+            for concurrency in args.concurrency:
+                result = bench_search(store, queries, args.k, concurrency)
+                print(f"{concurrency:>11} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['qps']:>8.0f}")
+            print()
+            store.drop()
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,8 +22,13 @@ def main():
         # Get a sample of points
         points = client.scroll(collection_name, limit=1)
         if points[0]:
-            print("\nSample document content:")
-            print(points[0][0].payload["text"][:200] + "...")
+            payload = points[0][0].payload
+            if "text" in payload:
+                print("\nSample document content:")
+                print(payload["text"][:200] + "...")
+            else:
+                # PAYLOAD_MODE=compact keeps chunk text in the local chunk store
+                print(f"\nSample compact payload: {payload}")
         else:
             print("\nNo documents found in collection")
             
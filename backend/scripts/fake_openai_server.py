@@ -0,0 +1,231 @@
+import argparse
+import base64
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+import numpy as np
+
+
+def fake_embedding_array(text: str, dimensions: int) -> np.ndarray:
+    """Deterministic float32 unit vector derived from the text, so runs are reproducible."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    return fake_embedding_array(text, dimensions).tolist()
+
+
+def fake_answer(messages: List[dict], max_tokens: int) -> List[str]:
+    """Deterministic answer tokens derived from the last user message."""
+    question = messages[-1]["content"] if messages else ""
+    words = question.split()[-20:] or ["empty"]
+    return [f"{words[i % len(words)]} " for i in range(max_tokens)]
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Accept bursts of concurrent connections during load tests
+    request_queue_size = 1024
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the OpenAI embeddings and chat completions endpoints."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        path = self.path.rstrip("/")
+        if path.endswith("/embeddings"):
+            self._handle_embeddings(body)
+        elif path.endswith("/chat/completions"):
+            self._handle_chat(body)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+
+    def _handle_embeddings(self, body: dict):
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        server = self.server
+        time.sleep(server.latency + server.per_item_latency * len(inputs))
+
+        dimensions = body.get("dimensions") or server.dimensions
+        # The openai client asks for base64 unless told otherwise; it is far cheaper to
+        # encode and parse than lists of floats, so the server doesn't cap benchmark throughput
+        if body.get("encoding_format") == "base64":
+            encode = lambda text: base64.b64encode(fake_embedding_array(text, dimensions).tobytes()).decode("ascii")
+        else:
+            encode = lambda text: fake_embedding(text, dimensions)
+        data = [
+            {"object": "embedding", "index": i, "embedding": encode(text)}
+            for i, text in enumerate(inputs)
+        ]
+        with server.stats_lock:
+            server.requests += 1
+            server.inputs += len(inputs)
+        tokens = sum(len(text.split()) for text in inputs)
+        self._send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _handle_chat(self, body: dict):
+        server = self.server
+        tokens = fake_answer(body.get("messages", []), server.answer_tokens)
+        with server.stats_lock:
+            server.chat_requests += 1
+        time.sleep(server.chat_latency)
+
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake-chat")}
+        if not body.get("stream"):
+            time.sleep(server.token_latency * len(tokens))
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+            return
+
+        # Stream without a Content-Length; the body ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, token in enumerate(tokens + [None]):
+            chunk = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": token} if token is not None else {},
+                    "finish_reason": None if token is not None else "stop",
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if token is not None and i < len(tokens) - 1:
+                time.sleep(server.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict):
+        encoded = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.05,
+    per_item_latency: float = 0.0005,
+    dimensions: int = 1536,
+    chat_latency: float = 0.3,
+    token_latency: float = 0.01,
+    answer_tokens: int = 50,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the fake server in a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind, 0 picks a free port
+        latency: Fixed latency per request in seconds
+        per_item_latency: Additional latency per input text in seconds
+        dimensions: Default embedding dimension
+        chat_latency: Time to first token for chat completions in seconds
+        token_latency: Delay between streamed tokens in seconds
+        answer_tokens: Number of tokens in every chat answer
+
+    Returns:
+        The running server and the base URL to pass to the OpenAI client
+    """
+    server = FakeOpenAIServer((host, port), FakeOpenAIHandler)
+    server.latency = latency
+    server.per_item_latency = per_item_latency
+    server.dimensions = dimensions
+    server.chat_latency = chat_latency
+    server.token_latency = token_latency
+    server.answer_tokens = answer_tokens
+    server.stats_lock = threading.Lock()
+    server.requests = 0
+    server.inputs = 0
+    server.chat_requests = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def _serve_in_process(connection, kwargs):
+    server, base_url = start_server(**kwargs)
+    connection.send(base_url)
+    threading.Event().wait()
+
+
+def start_server_process(**kwargs) -> Tuple[multiprocessing.Process, str]:
+    """
+    Start the fake server in a child process.
+
+    Use this for load tests so the server does not compete with the client
+    under test for the GIL. Accepts the same arguments as start_server.
+
+    Returns:
+        The server process (terminate it when done) and the base URL
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve_in_process, args=(child, kwargs), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI server for local benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per request")
+    parser.add_argument("--per-item-latency", type=float, default=0.0005, help="Seconds per input")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Seconds to first chat token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between chat tokens")
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        args.host, args.port, args.latency, args.per_item_latency, args.dimensions,
+        args.chat_latency, args.token_latency, args.answer_tokens,
+    )
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
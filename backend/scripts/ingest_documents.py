@@ -1,3 +1,4 @@
+import argparse
 import os
 from pathlib import Path
 import logging
@@ -8,6 +9,7 @@ from pathlib import Path
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent.parent))
 from document_manager import DocumentManager
+from profiling import add_profile_arguments, profiler_from_args
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,9 +22,14 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = "/Users/joshzheng/Downloads/test-uploads"
 
 def main():
+    parser = argparse.ArgumentParser(description="Ingest the .txt and .pdf files of a directory")
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
     # Check if upload directory exists
-    if not os.path.exists(UPLOAD_DIR):
-        logger.error(f"Upload directory does not exist: {UPLOAD_DIR}")
+    if not os.path.exists(args.upload_dir):
+        logger.error(f"Upload directory does not exist: {args.upload_dir}")
         return
     
     # Get OpenAI API key
@@ -31,11 +38,19 @@ def main():
         logger.error("OPENAI_API_KEY environment variable is not set")
         return
     
-    # Initialize DocumentManager
-    doc_manager = DocumentManager()
-    
-    # Ingest documents
-    success = doc_manager.ingest_documents(UPLOAD_DIR)
+    profiler = profiler_from_args(args)
+    if profiler:
+        profiler.start()
+    try:
+        # Initialize DocumentManager
+        doc_manager = DocumentManager()
+        
+        # Ingest documents
+        success = doc_manager.ingest_documents(args.upload_dir)
+    finally:
+        if profiler:
+            profiler.stop()
+            print(profiler.format_report())
     
     if success:
         logger.info("Document ingestion completed successfully")
@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from fake_openai_server import fake_embedding, start_server_process
+
+
+def summarize(label: str, latencies, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(
+        f"{label:<28} {len(latencies):>5} req  {elapsed:7.2f}s  {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50={statistics.median(latencies) * 1000:7.0f}ms  p95={p95 * 1000:7.0f}ms"
+    )
+
+
+def seed_points(count: int):
+    """(ids, vectors, payloads) for VectorStore.upsert."""
+    from document_manager import EMBEDDING_DIMENSIONS
+
+    ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"doc{i}.txt")) for i in range(count)]
+    vectors = [fake_embedding(f"document {i}", EMBEDDING_DIMENSIONS) for i in range(count)]
+    payloads = [{"text": f"document {i} " * 50, "metadata": {"source": f"doc{i}.txt"}} for i in range(count)]
+    return ids, vectors, payloads
+
+
+def seed_keywords(manager, points):
+    if manager.sparse_index is not None:
+        ids, _, payloads = points
+        manager.sparse_index.add(ids, [payload["text"] for payload in payloads])
+
+
+async def run_async(concurrency_levels, points):
+    from async_document_manager import AsyncDocumentManager
+
+    manager = AsyncDocumentManager(qdrant_url=":memory:", embedding_cache_path=None)
+    await manager.setup()
+    await manager.vector_store.upsert(*points)
+    seed_keywords(manager, points)
+
+    for concurrency in concurrency_levels:
+        async def one(i):
+            start = time.perf_counter()
+            await manager.generate_answer(f"async question {concurrency} {i}")
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        summarize(f"async concurrency={concurrency}", latencies, time.perf_counter() - start)
+
+    await manager.close()
+
+
+def run_sync(concurrency_levels, points, workers: int):
+    from document_manager import DocumentManager
+
+    manager = DocumentManager(qdrant_url=":memory:", embedding_cache_path=None)
+    manager.vector_store.upsert(*points)
+    seed_keywords(manager, points)
+
+    for concurrency in concurrency_levels:
+        def one(i, submitted):
+            manager.generate_answer(f"sync question {concurrency} {i}")
+            # Include time spent queued behind busy workers
+            return time.perf_counter() - submitted
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(one, i, time.perf_counter()) for i in range(concurrency)]
+            latencies = [future.result() for future in futures]
+        summarize(f"sync workers={workers} conc={concurrency}", latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the async chat path against local stand-ins")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500])
+    parser.add_argument("--sync-workers", type=int, default=8,
+                        help="Threads for the sync baseline, like a pool of sync worker threads")
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--chat-latency", type=float, default=0.3)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--skip-sync", action="store_true")
+    args = parser.parse_args()
+
+    server, base_url = start_server_process(
+        latency=args.embedding_latency, per_item_latency=0.0,
+        chat_latency=args.chat_latency, token_latency=0.0,
+    )
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    # Keep on-disk indexes of the seeded corpus out of the real data directories
+    scratch_dir = tempfile.mkdtemp(prefix="loadtest_")
+    os.environ["VECTOR_STORE_DIR"] = scratch_dir
+    os.environ["SPARSE_INDEX_DIR"] = scratch_dir
+    points = seed_points(args.points)
+
+    try:
+        asyncio.run(run_async(args.concurrency, points))
+        if not args.skip_sync:
+            run_sync(args.concurrency, points, args.sync_workers)
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,87 @@
+import argparse
+import json
 import os
+import time
 from dotenv import load_dotenv
 import sys
 from pathlib import Path
 
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent.parent))
-from document_manager import DocumentManager
+from document_manager import BATCH_COMPLETION_CONCURRENCY, DocumentManager
+from profiling import add_profile_arguments, profiler_from_args
 
 # Load environment variables
 load_dotenv()
 
 def main():
+    parser = argparse.ArgumentParser(description="Retrieve context for and answer a set of questions")
+    parser.add_argument("--questions", help="File with one question per line; built-in examples if omitted")
+    parser.add_argument("--concurrency", type=int, default=BATCH_COMPLETION_CONCURRENCY,
+                        help="Completions in flight at once")
+    parser.add_argument("--output", help="Write results as JSON lines to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
     # Get OpenAI API key
     openai_api_key = os.getenv("OPENAI_API_KEY")
     if not openai_api_key:
         print("OPENAI_API_KEY environment variable is not set")
         return
     
-    # Initialize DocumentManager
-    doc_manager = DocumentManager()
+    if args.questions:
+        with open(args.questions) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        # Test queries
+        queries = [
+            "What is this document about?",
+            "What are the main topics covered?",
+            "Tell me about the FAQ content"
+        ]
     
-    # Test queries
-    queries = [
-        "What is this document about?",
-        "What are the main topics covered?",
-        "Tell me about the FAQ content"
-    ]
+    profiler = profiler_from_args(args)
+    if profiler:
+        profiler.start()
+    try:
+        # Initialize DocumentManager
+        doc_manager = DocumentManager()
+        
+        # One batched embeddings request and one batched search for all queries, then
+        # several completions at a time; each result carries the context it was answered from
+        start = time.perf_counter()
+        results = doc_manager.generate_answers_batch(queries, concurrency=args.concurrency)
+        answer_seconds = time.perf_counter() - start
+    finally:
+        if profiler:
+            profiler.stop()
     
-    for query in queries:
+    for result in results:
         print(f"\n{'='*50}")
-        print(f"Query: {query}")
+        print(f"Query: {result['query']}")
         print(f"{'='*50}")
         
-        # Get relevant documents
-        context = doc_manager.get_relevant_documents(query)
-        print(f"\nFound {len(context)} relevant documents:")
+        if "error" in result:
+            print(f"\nError: {result['error']}")
+            continue
         
+        context = result["context"]
+        cached = " (cached answer)" if result["cached"] else ""
+        print(f"\nAnswered from {len(context)} context passages{cached}:")
         for i, doc in enumerate(context, 1):
-            print(f"\nDocument {i}:")
+            print(f"\nPassage {i}:")
             print(doc[:200] + "...")
         
-        # Generate answer
-        answer = doc_manager.generate_answer(query)
-        print(f"\nAnswer: {answer}")
+        print(f"\nAnswer: {result['response']}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    
+    print(f"\nRetrieved context for and answered {len(queries)} queries in {answer_seconds:.2f}s")
+    if profiler:
+        print(f"\n{profiler.format_report()}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from qdrant_client.http import models
+
+# Payload fields the filters match on; indexed when the collection is set up
+SOURCE_FIELD = "metadata.source"
+PAGE_FIELD = "metadata.page"
+
+
+@dataclass
+class SearchFilter:
+    """
+    Restricts a search to chunks of some files and/or a page range.
+
+    Pages are the 0-based numbers the PDF loader stores in each chunk's
+    metadata; both ends of the range are inclusive. Chunks without a page
+    (text files) never match a page range.
+    """
+    sources: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
+    def __post_init__(self):
+        if self.sources is not None:
+            self.sources = list(self.sources)
+        if self.page_from is not None and self.page_to is not None and self.page_from > self.page_to:
+            raise ValueError(f"page_from ({self.page_from}) is after page_to ({self.page_to})")
+
+    @property
+    def has_page_range(self) -> bool:
+        return self.page_from is not None or self.page_to is not None
+
+    def is_empty(self) -> bool:
+        return self.sources is None and not self.has_page_range
+
+    def qdrant_filter(self) -> Optional["models.Filter"]:
+        # Imported here so API views can parse filters without loading qdrant_client
+        from qdrant_client.http import models
+
+        conditions = []
+        if self.sources is not None:
+            conditions.append(models.FieldCondition(key=SOURCE_FIELD, match=models.MatchAny(any=self.sources)))
+        if self.has_page_range:
+            conditions.append(models.FieldCondition(
+                key=PAGE_FIELD,
+                range=models.Range(gte=self.page_from, lte=self.page_to),
+            ))
+        return models.Filter(must=conditions) if conditions else None
@@ -0,0 +1,237 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from search_filter import SearchFilter
+
+logger = logging.getLogger(__name__)
+
+# Rank constant from the original reciprocal rank fusion paper
+RRF_K = 60
+
+# Words that match nearly every chunk and only slow the keyword search down
+STOPWORDS = frozenset("""
+a about an and are as at be by can do does for from how i in is it me my of on or
+that the this to was what when where which who why with you your
+""".split())
+
+_WORD = re.compile(r"\S+")
+_TOKEN = re.compile(r"\w+")
+
+
+@dataclass
+class SparseHit:
+    id: str
+    score: float
+    text: str
+
+
+def _filter_clause(search_filter: Optional[SearchFilter]) -> Tuple[str, list]:
+    """SQL conditions on the chunks table for a filter, ANDed onto a WHERE clause."""
+    if search_filter is None:
+        return "", []
+    sql, params = "", []
+    if search_filter.sources is not None:
+        sql += f" AND chunks.source IN ({','.join('?' * len(search_filter.sources))})"
+        params.extend(search_filter.sources)
+    if search_filter.has_page_range:
+        sql += " AND chunks.page IS NOT NULL"
+    if search_filter.page_from is not None:
+        sql += " AND chunks.page >= ?"
+        params.append(search_filter.page_from)
+    if search_filter.page_to is not None:
+        sql += " AND chunks.page <= ?"
+        params.append(search_filter.page_to)
+    return sql, params
+
+
+def build_match_query(query: str) -> str:
+    """
+    FTS5 query that ORs the words of a free-text query.
+
+    Each whitespace-separated word becomes a phrase of its tokens, so a
+    pasted identifier like "ERR-1234" or "v2.3.1" only matches where its
+    parts appear next to each other.
+    """
+    phrases = []
+    for word in _WORD.findall(query.lower()):
+        tokens = _TOKEN.findall(word)
+        if not tokens or (len(tokens) == 1 and tokens[0] in STOPWORDS):
+            continue
+        phrase = '"' + " ".join(tokens) + '"'
+        if phrase not in phrases:
+            phrases.append(phrase)
+    return " OR ".join(phrases)
+
+
+class SparseIndex:
+    def __init__(self, path: str):
+        """
+        BM25 keyword index over chunk texts, backed by SQLite FTS5.
+
+        Complements dense vector search for exact terms (identifiers, error
+        codes, product names) that embeddings tend to blur. Each chunk's
+        source file and page are stored alongside it so searches can be
+        filtered like vector searches.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self.created = not os.path.exists(path)
+        # Set when the index is new or predates a column; its chunks must be re-added
+        self.needs_reindex = self.created
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Keep snake_case identifiers as single tokens
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, tokenize=\"unicode61 tokenchars '_'\")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY,"
+            " fts_rowid INTEGER NOT NULL UNIQUE,"
+            " source TEXT,"
+            " page INTEGER)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "source" not in columns:
+            # Index written before filtering was supported
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN source TEXT")
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN page INTEGER")
+            self.needs_reindex = True
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+
+    def add(self, ids: Sequence, texts: Sequence[str], metadatas: Optional[Sequence[dict]] = None):
+        """
+        Index chunk texts, replacing any previous text for the same IDs.
+
+        Args:
+            ids: Chunk IDs, as in the vector store
+            texts: Chunk texts
+            metadatas: Optional chunk metadata; its "source" and "page" are stored for filtering
+        """
+        metadatas = metadatas if metadatas is not None else [{}] * len(ids)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._delete(ids)
+                for point_id, text, metadata in zip(ids, texts, metadatas):
+                    page = metadata.get("page")
+                    rowid = self._conn.execute("INSERT INTO chunks_fts (text) VALUES (?)", (text,)).lastrowid
+                    self._conn.execute(
+                        "INSERT INTO chunks (id, fts_rowid, source, page) VALUES (?, ?, ?, ?)",
+                        (str(point_id), rowid, metadata.get("source"), page if isinstance(page, int) else None),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: Sequence):
+        """Remove chunks by ID; unknown IDs are ignored."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._delete(ids)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_by_filter(self, search_filter: SearchFilter):
+        """Remove every chunk matching a filter, e.g. all chunks of one file."""
+        if search_filter.is_empty():
+            raise ValueError("Refusing to delete by an empty filter; use clear() to delete everything")
+        sql, params = _filter_clause(search_filter)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    f"DELETE FROM chunks_fts WHERE rowid IN (SELECT fts_rowid FROM chunks WHERE 1{sql})", params
+                )
+                self._conn.execute(f"DELETE FROM chunks WHERE 1{sql}", params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete(self, ids: Sequence):
+        ids = [str(point_id) for point_id in ids]
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            rowids = self._conn.execute(
+                f"SELECT fts_rowid FROM chunks WHERE id IN ({placeholders})", part
+            ).fetchall()
+            self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rowids)
+            self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", part)
+
+    def search(self, query: str, limit: int = 20, search_filter: Optional[SearchFilter] = None) -> List[SparseHit]:
+        """
+        Rank chunks against a free-text query with BM25.
+
+        Args:
+            query: Free-text query
+            limit: Maximum number of hits
+            search_filter: Optional restriction to some files and/or pages
+
+        Returns:
+            Up to `limit` hits, best first; scores are positive, higher is better
+        """
+        match = build_match_query(query)
+        if not match or limit <= 0:
+            return []
+        sql, params = _filter_clause(search_filter)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunks.id, chunks_fts.text, bm25(chunks_fts) FROM chunks_fts"
+                " JOIN chunks ON chunks.fts_rowid = chunks_fts.rowid"
+                f" WHERE chunks_fts MATCH ?{sql} ORDER BY bm25(chunks_fts) LIMIT ?",
+                (match, *params, limit),
+            ).fetchall()
+        # FTS5's bm25() is negated so that ascending order is best first
+        return [SparseHit(id=point_id, score=-score, text=text) for point_id, text, score in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks_fts")
+            self._conn.execute("DELETE FROM chunks")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Merge ranked ID lists by reciprocal rank fusion.
+
+    Each list contributes 1 / (k + rank) to an ID's score, so documents
+    ranked well by several retrievers rise to the top without having to
+    calibrate their raw scores against each other.
+
+    Args:
+        rankings: ID lists, each best first
+        k: Rank constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        (ID, fused score) for every ID, best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, point_id in enumerate(ranking, start=1):
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,911 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence, Set, Union
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models
+
+from index_config import IndexConfig
+from qdrant_config import QdrantClientConfig, make_async_client, make_client
+from search_filter import PAGE_FIELD, SOURCE_FIELD, SearchFilter
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_BACKENDS = ("qdrant", "numpy")
+
+# Element types of stored vectors; float16 halves and uint8 quarters vector memory
+VECTOR_DTYPES = ("float32", "float16", "uint8")
+
+PointId = Union[str, int]
+
+# Payload indexes created with every Qdrant collection so filtered searches don't scan payloads
+PAYLOAD_INDEXES = (
+    (SOURCE_FIELD, models.PayloadSchemaType.KEYWORD),
+    (PAGE_FIELD, models.PayloadSchemaType.INTEGER),
+)
+
+
+@dataclass
+class SearchHit:
+    id: PointId
+    score: float
+    payload: dict
+    vector: Optional[List[float]] = None
+
+
+@dataclass
+class Point:
+    id: PointId
+    payload: dict
+    vector: Optional[List[float]] = None
+
+
+class VectorStore(ABC):
+    """Storage and cosine similarity search for one collection of chunk vectors."""
+
+    @abstractmethod
+    def ensure_collection(self) -> bool:
+        """
+        Create the collection if it doesn't exist.
+
+        Returns:
+            True if a new, empty collection was created
+        """
+
+    @abstractmethod
+    def upsert(self, ids: Sequence[PointId], vectors: Sequence[Sequence[float]], payloads: Sequence[dict]):
+        """Insert or overwrite points by ID."""
+
+    @abstractmethod
+    def delete(self, ids: Sequence[PointId]):
+        """Delete points by ID; unknown IDs are ignored."""
+
+    @abstractmethod
+    def search(
+        self,
+        vector: Sequence[float],
+        limit: int,
+        score_threshold: Optional[float] = None,
+        with_vectors: bool = False,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[SearchHit]:
+        """
+        Nearest points by cosine similarity, best first; with_vectors also returns
+        their vectors and search_filter restricts the search to matching payloads.
+        """
+
+    def search_batch(
+        self,
+        vectors: Sequence[Sequence[float]],
+        limit: int,
+        score_threshold: Optional[float] = None,
+        with_vectors: bool = False,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[List[SearchHit]]:
+        """search() for several query vectors; backends override this with a single request."""
+        return [self.search(vector, limit, score_threshold, with_vectors, search_filter) for vector in vectors]
+
+    @abstractmethod
+    def delete_by_filter(self, search_filter: SearchFilter):
+        """Delete every point matching a filter, e.g. all chunks of one file."""
+
+    @abstractmethod
+    def retrieve(self, ids: Sequence[PointId], with_vectors: bool = False) -> List[Point]:
+        """Stored points by ID; unknown IDs are left out."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of points in the collection."""
+
+    @abstractmethod
+    def drop(self):
+        """Delete the collection and everything in it."""
+
+    def close(self):
+        pass
+
+
+class AsyncVectorStore(ABC):
+    """Subset of VectorStore for the async chat path."""
+
+    @abstractmethod
+    async def ensure_collection(self) -> bool:
+        """Create the collection if it doesn't exist; True if it was created."""
+
+    @abstractmethod
+    async def upsert(self, ids: Sequence[PointId], vectors: Sequence[Sequence[float]], payloads: Sequence[dict]):
+        """Insert or overwrite points by ID."""
+
+    @abstractmethod
+    async def search(
+        self,
+        vector: Sequence[float],
+        limit: int,
+        score_threshold: Optional[float] = None,
+        with_vectors: bool = False,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[SearchHit]:
+        """
+        Nearest points by cosine similarity, best first; with_vectors also returns
+        their vectors and search_filter restricts the search to matching payloads.
+        """
+
+    @abstractmethod
+    async def retrieve(self, ids: Sequence[PointId], with_vectors: bool = False) -> List[Point]:
+        """Stored points by ID; unknown IDs are left out."""
+
+    async def close(self):
+        pass
+
+
+def _collection_params(dimensions: int, index_config: IndexConfig) -> dict:
+    return dict(
+        vectors_config=models.VectorParams(
+            size=dimensions, distance=models.Distance.COSINE, on_disk=index_config.on_disk or None
+        ),
+        hnsw_config=index_config.hnsw_config(),
+        quantization_config=index_config.quantization_config(),
+    )
+
+
+def _check_dimensions(info: models.CollectionInfo, collection_name: str, dimensions: int):
+    """Reject a collection created for another embedding size."""
+    vectors = info.config.params.vectors
+    size = vectors.size if isinstance(vectors, models.VectorParams) else None
+    if size is not None and size != dimensions:
+        raise ValueError(
+            f"Qdrant collection {collection_name} holds {size}-dimensional vectors, expected {dimensions}; "
+            f"re-ingest into a new collection or set EMBEDDING_DIMENSIONS={size}"
+        )
+
+
+def _qdrant_filter(search_filter: Optional[SearchFilter]) -> Optional[models.Filter]:
+    return search_filter.qdrant_filter() if search_filter is not None else None
+
+
+def _require_conditions(search_filter: SearchFilter):
+    if search_filter.is_empty():
+        raise ValueError("Refusing to delete by an empty filter; use drop() to delete everything")
+
+
+def _as_list(vector) -> List[float]:
+    return vector.tolist() if isinstance(vector, np.ndarray) else list(vector)
+
+
+def _upsert_batches(ids, vectors, payloads, batch_size: int) -> List[models.Batch]:
+    """Points split into upsert requests of at most `batch_size` points."""
+    ids = list(ids)
+    payloads = list(payloads)
+    return [
+        _to_batch(ids[i:i + batch_size], vectors[i:i + batch_size], payloads[i:i + batch_size])
+        for i in range(0, len(ids), batch_size)
+    ]
+
+
+def _to_batch(ids, vectors, payloads) -> models.Batch:
+    vectors = vectors.tolist() if isinstance(vectors, np.ndarray) else [_as_list(v) for v in vectors]
+    return models.Batch(ids=list(ids), vectors=vectors, payloads=list(payloads))
+
+
+def _to_points(records) -> List[Point]:
+    return [Point(id=record.id, payload=record.payload, vector=record.vector) for record in records]
+
+
+def _to_hits(points) -> List[SearchHit]:
+    return [
+        SearchHit(id=point.id, score=point.score, payload=point.payload, vector=point.vector)
+        for point in points
+    ]
+
+
+class QdrantVectorStore(VectorStore):
+    def __init__(
+        self,
+        client: QdrantClient,
+        collection_name: str,
+        dimensions: int,
+        index_config: IndexConfig,
+        client_config: Optional[QdrantClientConfig] = None,
+    ):
+        """
+        VectorStore on a Qdrant collection.
+
+        Upserts are split into requests of client_config.upsert_batch_size
+        points, up to client_config.upsert_parallel of them in flight at once.
+
+        Args:
+            client: Qdrant client, local (":memory:") or remote
+            collection_name: Name of the Qdrant collection
+            dimensions: Vector size used when creating the collection
+            index_config: HNSW, quantization and search settings
+            client_config: Upsert batching, parallelism and wait settings; defaults if None
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.dimensions = dimensions
+        self.index_config = index_config
+        self.client_config = client_config or QdrantClientConfig()
+        self._upsert_executor: Optional[ThreadPoolExecutor] = None
+        self._upsert_executor_lock = threading.Lock()
+
+    def ensure_collection(self) -> bool:
+        try:
+            info = self.client.get_collection(self.collection_name)
+            created = False
+        except Exception:
+            info = None
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                **_collection_params(self.dimensions, self.index_config)
+            )
+            created = True
+        if info is not None:
+            _check_dimensions(info, self.collection_name, self.dimensions)
+        # Also indexes collections created before the indexes existed; a no-op when present
+        for field_name, field_schema in PAYLOAD_INDEXES:
+            self.client.create_payload_index(self.collection_name, field_name=field_name, field_schema=field_schema)
+        return created
+
+    def upsert(self, ids, vectors, payloads):
+        batches = _upsert_batches(ids, vectors, payloads, self.client_config.upsert_batch_size)
+        if len(batches) <= 1 or self.client_config.upsert_parallel <= 1:
+            for batch in batches:
+                self._upsert_batch(batch)
+            return
+        # list() waits for every request and re-raises the first failure
+        list(self._executor().map(self._upsert_batch, batches))
+
+    def _upsert_batch(self, batch: models.Batch):
+        self.client.upsert(collection_name=self.collection_name, points=batch, wait=self.client_config.upsert_wait)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._upsert_executor_lock:
+            if self._upsert_executor is None:
+                self._upsert_executor = ThreadPoolExecutor(
+                    max_workers=self.client_config.upsert_parallel, thread_name_prefix="qdrant-upsert"
+                )
+            return self._upsert_executor
+
+    def delete(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=ids)
+        )
+
+    def delete_by_filter(self, search_filter):
+        _require_conditions(search_filter)
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=search_filter.qdrant_filter())
+        )
+
+    def search(self, vector, limit, score_threshold=None, with_vectors=False, search_filter=None):
+        # Approximate HNSW search unless index_config.exact is set
+        return _to_hits(self.client.search(
+            collection_name=self.collection_name,
+            query_vector=_as_list(vector),
+            query_filter=_qdrant_filter(search_filter),
+            limit=limit,
+            score_threshold=score_threshold,
+            search_params=self.index_config.search_params(),
+            with_vectors=with_vectors
+        ))
+
+    def search_batch(self, vectors, limit, score_threshold=None, with_vectors=False, search_filter=None):
+        query_filter = _qdrant_filter(search_filter)
+        requests = [
+            models.SearchRequest(
+                vector=_as_list(vector),
+                filter=query_filter,
+                limit=limit,
+                score_threshold=score_threshold,
+                params=self.index_config.search_params(),
+                with_payload=True,
+                with_vector=with_vectors,
+            )
+            for vector in vectors
+        ]
+        if not requests:
+            return []
+        return [_to_hits(points) for points in self.client.search_batch(self.collection_name, requests=requests)]
+
+    def retrieve(self, ids, with_vectors=False):
+        ids = list(ids)
+        if not ids:
+            return []
+        return _to_points(self.client.retrieve(self.collection_name, ids=ids, with_vectors=with_vectors))
+
+    def count(self) -> int:
+        return self.client.count(self.collection_name, exact=True).count
+
+    def drop(self):
+        self.client.delete_collection(self.collection_name)
+
+    def close(self):
+        if self._upsert_executor is not None:
+            self._upsert_executor.shutdown()
+        self.client.close()
+
+
+class AsyncQdrantVectorStore(AsyncVectorStore):
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        collection_name: str,
+        dimensions: int,
+        index_config: IndexConfig,
+        client_config: Optional[QdrantClientConfig] = None,
+    ):
+        """Async counterpart of QdrantVectorStore's query path."""
+        self.client = client
+        self.collection_name = collection_name
+        self.dimensions = dimensions
+        self.index_config = index_config
+        self.client_config = client_config or QdrantClientConfig()
+
+    async def ensure_collection(self) -> bool:
+        try:
+            info = await self.client.get_collection(self.collection_name)
+            created = False
+        except Exception:
+            info = None
+            await self.client.create_collection(
+                collection_name=self.collection_name,
+                **_collection_params(self.dimensions, self.index_config)
+            )
+            created = True
+        if info is not None:
+            _check_dimensions(info, self.collection_name, self.dimensions)
+        for field_name, field_schema in PAYLOAD_INDEXES:
+            await self.client.create_payload_index(
+                self.collection_name, field_name=field_name, field_schema=field_schema
+            )
+        return created
+
+    async def upsert(self, ids, vectors, payloads):
+        batches = _upsert_batches(ids, vectors, payloads, self.client_config.upsert_batch_size)
+        in_flight = asyncio.Semaphore(self.client_config.upsert_parallel)
+
+        async def upsert_batch(batch):
+            async with in_flight:
+                await self.client.upsert(
+                    collection_name=self.collection_name, points=batch, wait=self.client_config.upsert_wait
+                )
+
+        await asyncio.gather(*(upsert_batch(batch) for batch in batches))
+
+    async def search(self, vector, limit, score_threshold=None, with_vectors=False, search_filter=None):
+        return _to_hits(await self.client.search(
+            collection_name=self.collection_name,
+            query_vector=_as_list(vector),
+            query_filter=_qdrant_filter(search_filter),
+            limit=limit,
+            score_threshold=score_threshold,
+            search_params=self.index_config.search_params(),
+            with_vectors=with_vectors
+        ))
+
+    async def retrieve(self, ids, with_vectors=False):
+        ids = list(ids)
+        if not ids:
+            return []
+        return _to_points(await self.client.retrieve(self.collection_name, ids=ids, with_vectors=with_vectors))
+
+    async def close(self):
+        await self.client.close()
+
+
+# Page of points whose payload has none, e.g. chunks of text files
+_NO_PAGE = np.iinfo(np.int64).min
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _map_file(path: str, dtype: str, shape: tuple) -> np.memmap:
+    """Memory-map a file as a matrix, growing the file to fit it."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+class NumpyVectorStore(VectorStore):
+    VECTORS_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "uint8": "vectors.u8"}
+    # (offset, step) of each uint8 row
+    SCALES_FILE = "scales.f32"
+    POINTS_FILE = "points.sqlite3"
+    # Rows converted to float32 at a time when scoring float16/uint8 vectors
+    SCORE_BLOCK_ROWS = 4096
+
+    def __init__(self, path: str, dimensions: int, initial_capacity: int = 1024, dtype: str = "float32"):
+        """
+        In-process VectorStore doing exact cosine search with NumPy.
+
+        Vectors are stored normalized, one row per slot, in a matrix
+        memory-mapped from `<path>/vectors.f32`; a search is one matrix-vector
+        product over that matrix plus an argpartition for the top k. With
+        dtype float16 or uint8 the matrix holds that type instead (uint8 rows
+        are scalar-quantized between their own min and max) and is scored a
+        block of rows at a time. Point IDs
+        and payloads live in `<path>/points.sqlite3` and are loaded into
+        memory when the store is opened. Deleted slots are masked out and
+        reused by later upserts, and the matrix doubles in size when full.
+        Sources and pages are kept in in-memory indexes, so a filtered search
+        only scores the rows of the matching files.
+
+        Meant for single-process deployments and CI; use open_numpy_store to
+        share one instance between the sync and async managers.
+
+        Args:
+            path: Directory holding the store's files
+            dimensions: Vector size
+            initial_capacity: Rows allocated when the store is created
+            dtype: "float32", "float16" or "uint8"; fixed when the store is created
+        """
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"dtype must be one of {VECTOR_DTYPES}, got {dtype!r}")
+        self.path = path
+        self.dimensions = dimensions
+        self.initial_capacity = initial_capacity
+        self.dtype = dtype
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._matrix: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._reset()
+
+    def _reset(self):
+        self._size = 0
+        self._valid = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[dict]] = []
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        # Payload indexes for filtered searches
+        self._source_slots: Dict[str, Set[int]] = {}
+        self._pages = np.zeros(0, dtype=np.int64)
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, self.VECTORS_FILES[self.dtype])
+
+    def ensure_collection(self) -> bool:
+        with self._lock:
+            if self._conn is not None:
+                return False
+            created = not os.path.exists(os.path.join(self.path, self.POINTS_FILE))
+            os.makedirs(self.path, exist_ok=True)
+            self._conn = sqlite3.connect(
+                os.path.join(self.path, self.POINTS_FILE), check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS points ("
+                " slot INTEGER PRIMARY KEY,"
+                " id TEXT NOT NULL UNIQUE,"
+                " payload TEXT NOT NULL)"
+            )
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'dimensions'").fetchone()
+            if row is None:
+                self._conn.execute("INSERT INTO meta VALUES ('dimensions', ?)", (str(self.dimensions),))
+                self._conn.execute("INSERT INTO meta VALUES ('dtype', ?)", (self.dtype,))
+            elif int(row[0]) != self.dimensions:
+                self._close()
+                raise ValueError(
+                    f"Vector store at {self.path} holds {row[0]}-dimensional vectors, "
+                    f"expected {self.dimensions}"
+                )
+            # Stores created before vector dtypes existed are float32
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'dtype'").fetchone()
+            stored_dtype = row[0] if row is not None else "float32"
+            if stored_dtype != self.dtype:
+                self._close()
+                raise ValueError(f"Vector store at {self.path} holds {stored_dtype} vectors, expected {self.dtype}")
+            self._load()
+            if created:
+                logger.info(f"Created new NumPy vector store at {self.path}")
+            return created
+
+    def _load(self):
+        self._reset()
+        rows = self._conn.execute("SELECT slot, id, payload FROM points ORDER BY slot").fetchall()
+        self._size = rows[-1][0] + 1 if rows else 0
+        capacity = self.initial_capacity
+        if os.path.exists(self._vectors_path):
+            capacity = os.path.getsize(self._vectors_path) // (np.dtype(self.dtype).itemsize * self.dimensions)
+        self._map(max(capacity, self._size, 1))
+        self._ids = [None] * self._size
+        self._payloads = [None] * self._size
+        for slot, point_id, payload in rows:
+            self._ids[slot] = point_id
+            self._payloads[slot] = json.loads(payload)
+            self._slots[point_id] = slot
+            self._valid[slot] = True
+            self._index_payload(slot)
+        self._free = [slot for slot in range(self._size - 1, -1, -1) if not self._valid[slot]]
+
+    def _map(self, capacity: int):
+        """(Re)map the vectors file with room for `capacity` rows."""
+        self._unmap()
+        self._matrix = _map_file(self._vectors_path, self.dtype, (capacity, self.dimensions))
+        if self.dtype == "uint8":
+            self._scales = _map_file(os.path.join(self.path, self.SCALES_FILE), "float32", (capacity, 2))
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid[:capacity]
+        self._valid = valid
+        pages = np.full(capacity, _NO_PAGE, dtype=np.int64)
+        pages[:len(self._pages)] = self._pages[:capacity]
+        self._pages = pages
+
+    def _flush(self):
+        self._matrix.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    def _unmap(self):
+        if self._matrix is not None:
+            self._flush()
+        self._matrix = None
+        self._scales = None
+
+    def _encode(self, slots: List[int], vectors: np.ndarray):
+        """Write normalized float32 vectors into slots in the store's dtype."""
+        if self.dtype == "uint8":
+            low = vectors.min(axis=1)
+            step = (vectors.max(axis=1) - low) / 255
+            step[step == 0] = 1.0
+            self._matrix[slots] = np.rint((vectors - low[:, None]) / step[:, None])
+            self._scales[slots] = np.stack([low, step], axis=1)
+        else:
+            self._matrix[slots] = vectors
+
+    def _decode(self, slot: int) -> np.ndarray:
+        vector = np.asarray(self._matrix[slot], dtype=np.float32)
+        if self.dtype == "uint8":
+            low, step = self._scales[slot]
+            vector = vector * step + low
+        return vector
+
+    def _score(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Dot products of queries with the first _size rows, or with the given rows."""
+        count = self._size if rows is None else len(rows)
+        if self.dtype == "float32":
+            # One (queries x points) product scores every query at once
+            return np.asarray(queries @ (self._matrix[:count] if rows is None else self._matrix[rows]).T)
+        # Converting the whole matrix to float32 would undo the memory saving
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        query_sums = queries.sum(axis=1, keepdims=True)
+        for start in range(0, count, self.SCORE_BLOCK_ROWS):
+            block = slice(start, min(start + self.SCORE_BLOCK_ROWS, count))
+            block_rows = block if rows is None else rows[block]
+            product = queries @ self._matrix[block_rows].astype(np.float32).T
+            if self.dtype == "uint8":
+                # q . (low + step * code) = low * sum(q) + step * (q . code)
+                scales = self._scales[block_rows]
+                product = product * scales[:, 1] + query_sums * scales[:, 0]
+            scores[:, block] = product
+        return scores
+
+    def _index_payload(self, slot: int):
+        metadata = (self._payloads[slot] or {}).get("metadata") or {}
+        source = metadata.get("source")
+        if source is not None:
+            self._source_slots.setdefault(source, set()).add(slot)
+        page = metadata.get("page")
+        self._pages[slot] = page if isinstance(page, int) else _NO_PAGE
+
+    def _unindex_payload(self, slot: int):
+        metadata = (self._payloads[slot] or {}).get("metadata") or {}
+        slots = self._source_slots.get(metadata.get("source"))
+        if slots is not None:
+            slots.discard(slot)
+            if not slots:
+                del self._source_slots[metadata["source"]]
+        self._pages[slot] = _NO_PAGE
+
+    def _filter_mask(self, n: int, search_filter: SearchFilter) -> np.ndarray:
+        """Which of the first n slots hold a point matching the filter."""
+        mask = self._valid[:n].copy()
+        if search_filter.sources is not None:
+            in_sources = np.zeros(n, dtype=bool)
+            for source in search_filter.sources:
+                in_sources[list(self._source_slots.get(source, ()))] = True
+            mask &= in_sources
+        if search_filter.has_page_range:
+            pages = self._pages[:n]
+            mask &= pages != _NO_PAGE
+            if search_filter.page_from is not None:
+                mask &= pages >= search_filter.page_from
+            if search_filter.page_to is not None:
+                mask &= pages <= search_filter.page_to
+        return mask
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = self._size
+        self._size += 1
+        self._ids.append(None)
+        self._payloads.append(None)
+        if self._size > self._matrix.shape[0]:
+            self._map(self._matrix.shape[0] * 2)
+        return slot
+
+    def _require_open(self):
+        if self._conn is None:
+            raise RuntimeError(f"Vector store at {self.path} is not open; call ensure_collection() first")
+
+    def upsert(self, ids, vectors, payloads):
+        ids = [str(point_id) for point_id in ids]
+        payloads = list(payloads)
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+        with self._lock:
+            self._require_open()
+            slots = []
+            for point_id in ids:
+                slot = self._slots.get(point_id)
+                if slot is None:
+                    slot = self._slots[point_id] = self._allocate()
+                slots.append(slot)
+            self._encode(slots, vectors)
+            self._flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (slot, id, payload) VALUES (?, ?, ?)",
+                [(slot, point_id, json.dumps(payload)) for slot, point_id, payload in zip(slots, ids, payloads)],
+            )
+            for slot, point_id, payload in zip(slots, ids, payloads):
+                if self._valid[slot]:
+                    self._unindex_payload(slot)
+                self._ids[slot] = point_id
+                self._payloads[slot] = payload
+                self._valid[slot] = True
+                self._index_payload(slot)
+
+    def delete(self, ids):
+        with self._lock:
+            self._require_open()
+            slots = [self._slots.pop(str(point_id)) for point_id in ids if str(point_id) in self._slots]
+            if not slots:
+                return
+            self._conn.executemany("DELETE FROM points WHERE slot = ?", [(slot,) for slot in slots])
+            for slot in slots:
+                self._unindex_payload(slot)
+                self._valid[slot] = False
+                self._ids[slot] = None
+                self._payloads[slot] = None
+                self._free.append(slot)
+
+    def search(self, vector, limit, score_threshold=None, with_vectors=False, search_filter=None):
+        return self.search_batch([vector], limit, score_threshold, with_vectors, search_filter)[0]
+
+    def search_batch(self, vectors, limit, score_threshold=None, with_vectors=False, search_filter=None):
+        if len(vectors) == 0:
+            return []
+        queries = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+        with self._lock:
+            if self._conn is None or self._size == 0 or limit <= 0:
+                return [[] for _ in range(len(queries))]
+            n = self._size
+            if search_filter is None or search_filter.is_empty():
+                rows = None
+                scores = self._score(queries, None)
+                scores[:, ~self._valid[:n]] = -np.inf
+            else:
+                # Only the matching rows are scored
+                rows = np.flatnonzero(self._filter_mask(n, search_filter))
+                scores = self._score(queries, rows)
+            m = scores.shape[1]
+            if m == 0:
+                return [[] for _ in range(len(queries))]
+            k = min(limit, m)
+            if k < m:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(m), (len(queries), 1))
+            order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            return [
+                self._hits(row_scores, row_top, rows, score_threshold, with_vectors)
+                for row_scores, row_top in zip(scores, top)
+            ]
+
+    def _hits(
+        self, scores: np.ndarray, columns: np.ndarray, rows: Optional[np.ndarray], score_threshold, with_vectors
+    ) -> List[SearchHit]:
+        """Hits for the top score columns; `rows` maps columns to slots when only some rows were scored."""
+        hits = []
+        for column in columns:
+            score = float(scores[column])
+            if score == -np.inf or (score_threshold is not None and score < score_threshold):
+                break
+            slot = int(rows[column]) if rows is not None else column
+            hits.append(SearchHit(
+                id=self._ids[slot],
+                score=score,
+                payload=self._payloads[slot],
+                vector=self._decode(slot).tolist() if with_vectors else None,
+            ))
+        return hits
+
+    def delete_by_filter(self, search_filter):
+        _require_conditions(search_filter)
+        with self._lock:
+            self._require_open()
+            slots = np.flatnonzero(self._filter_mask(self._size, search_filter))
+            self.delete([self._ids[slot] for slot in slots])
+
+    def retrieve(self, ids, with_vectors=False):
+        with self._lock:
+            if self._conn is None:
+                return []
+            slots = [self._slots.get(str(point_id)) for point_id in ids]
+            return [
+                Point(
+                    id=self._ids[slot],
+                    payload=self._payloads[slot],
+                    vector=self._decode(slot).tolist() if with_vectors else None,
+                )
+                for slot in slots if slot is not None
+            ]
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    def drop(self):
+        with self._lock:
+            self._close()
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._reset()
+
+    def _close(self):
+        self._unmap()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+class AsyncNumpyVectorStore(AsyncVectorStore):
+    def __init__(self, store: NumpyVectorStore):
+        """
+        Async facade over a NumpyVectorStore.
+
+        Calls run in a worker thread: a search scans every vector and an
+        upsert may grow and flush the arrays, which would stall the event
+        loop on large collections. NumPy releases the GIL for the scan.
+        """
+        self.store = store
+
+    async def ensure_collection(self) -> bool:
+        return await asyncio.to_thread(self.store.ensure_collection)
+
+    async def upsert(self, ids, vectors, payloads):
+        await asyncio.to_thread(self.store.upsert, ids, vectors, payloads)
+
+    async def search(self, vector, limit, score_threshold=None, with_vectors=False, search_filter=None):
+        return await asyncio.to_thread(self.store.search, vector, limit, score_threshold, with_vectors, search_filter)
+
+    async def retrieve(self, ids, with_vectors=False):
+        return await asyncio.to_thread(self.store.retrieve, ids, with_vectors)
+
+
+_numpy_stores: Dict[str, NumpyVectorStore] = {}
+_numpy_stores_lock = threading.Lock()
+
+
+def open_numpy_store(path: str, dimensions: int, dtype: str = "float32") -> NumpyVectorStore:
+    """The process-wide NumpyVectorStore for a directory, so writers and readers see the same data."""
+    path = os.path.abspath(path)
+    with _numpy_stores_lock:
+        store = _numpy_stores.get(path)
+        if store is None:
+            store = _numpy_stores[path] = NumpyVectorStore(path, dimensions, dtype=dtype)
+        elif store.dimensions != dimensions:
+            raise ValueError(f"Vector store at {path} is open with {store.dimensions} dimensions, not {dimensions}")
+        elif store.dtype != dtype:
+            raise ValueError(f"Vector store at {path} is open with {store.dtype} vectors, not {dtype}")
+        return store
+
+
+def _local_client_config(qdrant_url: str, client_config: Optional[QdrantClientConfig]) -> QdrantClientConfig:
+    """The in-process Qdrant isn't safe for concurrent writes, so it gets one upsert at a time."""
+    client_config = client_config or QdrantClientConfig()
+    return replace(client_config, upsert_parallel=1) if qdrant_url == ":memory:" else client_config
+
+
+def _qdrant_index_config(index_config: IndexConfig, dtype: str) -> IndexConfig:
+    """
+    Qdrant equivalent of a vector dtype.
+
+    qdrant-client has no option to store original vectors in a smaller type,
+    so uint8 becomes int8 scalar quantization kept in RAM with the float32
+    originals moved to disk for rescoring, and float16 is left as float32.
+    """
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"dtype must be one of {VECTOR_DTYPES}, got {dtype!r}")
+    if dtype == "float16":
+        logger.warning("Qdrant collections store float32 vectors; ignoring VECTOR_DTYPE=float16")
+    if dtype == "uint8":
+        quantization = index_config.quantization if index_config.quantization != "none" else "scalar"
+        return replace(index_config, quantization=quantization, on_disk=True)
+    return index_config
+
+
+def make_vector_store(
+    backend: str,
+    collection_name: str,
+    dimensions: int,
+    index_config: IndexConfig,
+    qdrant_url: str,
+    numpy_dir: str,
+    dtype: str = "float32",
+    client_config: Optional[QdrantClientConfig] = None,
+) -> VectorStore:
+    """
+    Build the configured VectorStore.
+
+    Args:
+        backend: "qdrant" or "numpy"
+        collection_name: Collection (Qdrant) or subdirectory (NumPy) name
+        dimensions: Vector size
+        index_config: Qdrant HNSW, quantization and search settings
+        qdrant_url: URL of the Qdrant server, or ":memory:" for an in-process instance
+        numpy_dir: Parent directory of NumPy stores
+        dtype: Stored vector type, one of VECTOR_DTYPES
+        client_config: Qdrant transport and upsert settings; defaults if None
+    """
+    if backend == "qdrant":
+        client_config = _local_client_config(qdrant_url, client_config)
+        return QdrantVectorStore(
+            make_client(qdrant_url, client_config), collection_name, dimensions,
+            _qdrant_index_config(index_config, dtype), client_config
+        )
+    if backend == "numpy":
+        return open_numpy_store(os.path.join(numpy_dir, collection_name), dimensions, dtype)
+    raise ValueError(f"vector store backend must be one of {VECTOR_STORE_BACKENDS}, got {backend!r}")
+
+
+def make_async_vector_store(
+    backend: str,
+    collection_name: str,
+    dimensions: int,
+    index_config: IndexConfig,
+    qdrant_url: str,
+    numpy_dir: str,
+    dtype: str = "float32",
+    client_config: Optional[QdrantClientConfig] = None,
+) -> AsyncVectorStore:
+    """Async counterpart of make_vector_store."""
+    if backend == "qdrant":
+        client_config = _local_client_config(qdrant_url, client_config)
+        return AsyncQdrantVectorStore(
+            make_async_client(qdrant_url, client_config), collection_name, dimensions,
+            _qdrant_index_config(index_config, dtype), client_config
+        )
+    if backend == "numpy":
+        return AsyncNumpyVectorStore(open_numpy_store(os.path.join(numpy_dir, collection_name), dimensions, dtype))
+    raise ValueError(f"vector store backend must be one of {VECTOR_STORE_BACKENDS}, got {backend!r}")
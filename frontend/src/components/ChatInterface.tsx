@@ -34,8 +34,9 @@ const ChatInterface: React.FC = () => {
     setInputMessage("");
     setIsLoading(true);
 
+    let botMessageId: number | undefined;
     try {
-      const response = await fetch("http://localhost:8000/api/chat/", {
+      const response = await fetch("http://localhost:8000/api/chat/stream/", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -43,19 +44,53 @@ const ChatInterface: React.FC = () => {
         body: JSON.stringify({ message: inputMessage }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error("Failed to get response from server");
       }
 
-      const data = await response.json();
+      botMessageId = Date.now();
+      setMessages((prevMessages) => [
+        ...prevMessages,
+        { id: botMessageId, text: "", sender: "bot" },
+      ]);
 
-      const botMessage: Message = {
-        id: Date.now(),
-        text: data.response,
-        sender: "bot",
-      };
+      // Read Server-Sent Events and append tokens as they arrive
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
 
-      setMessages((prevMessages) => [...prevMessages, botMessage]);
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const rawEvent of events) {
+          const lines = rawEvent.split("\n");
+          const event = lines
+            .find((line) => line.startsWith("event: "))
+            ?.slice("event: ".length);
+          const data = lines
+            .find((line) => line.startsWith("data: "))
+            ?.slice("data: ".length);
+          if (!event || !data) continue;
+
+          if (event === "error") {
+            throw new Error(JSON.parse(data).error);
+          }
+          if (event === "token") {
+            const { content } = JSON.parse(data);
+            setIsLoading(false);
+            setMessages((prevMessages) =>
+              prevMessages.map((message) =>
+                message.id === botMessageId
+                  ? { ...message, text: message.text + content }
+                  : message
+              )
+            );
+          }
+        }
+      }
     } catch (error) {
       console.error("Error:", error);
       const errorMessage: Message = {
@@ -63,7 +98,13 @@ const ChatInterface: React.FC = () => {
         text: "Sorry, there was an error processing your message. Please try again.",
         sender: "bot",
       };
-      setMessages((prevMessages) => [...prevMessages, errorMessage]);
+      // Replace the answer bubble if the error came before its first token
+      setMessages((prevMessages) => [
+        ...prevMessages.filter(
+          (message) => message.id !== botMessageId || message.text !== ""
+        ),
+        errorMessage,
+      ]);
     } finally {
       setIsLoading(false);
     }
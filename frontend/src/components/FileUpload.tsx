@@ -27,9 +27,10 @@ function FileUpload() {
         if (!response.ok) {
           throw new Error("Failed to fetch files");
         }
-        const files = await response.json();
+        // The newest page of the file catalog; older files are behind `next`
+        const { results } = await response.json();
         setUploadedFiles(
-          files.map((file: FileResponse) => ({
+          results.map((file: FileResponse) => ({
             id: Math.random().toString(36).substr(2, 9),
             name: file.name,
             size: file.size,
@@ -85,6 +86,24 @@ function FileUpload() {
         throw new Error("Failed to ingest documents");
       }
 
+      // Ingestion runs as a background job; poll until it finishes
+      const { job_id } = await response.json();
+      let job = { status: "queued", error: null };
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const statusResponse = await fetch(
+          `http://localhost:8000/api/ingest-jobs/${job_id}/`
+        );
+        if (!statusResponse.ok) {
+          throw new Error("Failed to fetch ingest job status");
+        }
+        job = await statusResponse.json();
+      }
+
+      if (job.status !== "succeeded") {
+        throw new Error(job.error || `Ingest job ${job.status}`);
+      }
+
       alert("Files ingested successfully");
     } catch (error) {
       console.error("Error ingesting files:", error);